@@ -1,30 +1,421 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, send_from_directory, Response, stream_with_context # type: ignore
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, Response, stream_with_context # type: ignore
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import json
 import os
 import io
 import base64
 from uuid import uuid4
-import requests
 import zipfile
-from datetime import datetime, timezone
-
-app = Flask(__name__)
+import threading
+import copy
+import random
+import time
+import shutil
+import bisect
+import re
+import sqlite3
+import hashlib
+import gzip
+import mimetypes
+import stat
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ollama_client import (
+    OllamaClient,
+    OllamaError,
+    OllamaUnavailable,
+    OllamaBadStatus,
+    OllamaInvalidResponse,
+    OllamaOverloaded,
+    AdmissionLimiter,
+    extract_text,
+    extract_thinking,
+    SingleFlight,
+    StreamFanout,
+    AsyncSingleFlight,
+    AsyncStreamFanout
+)
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:  # without Pillow, /uploads always serves the original image
+    Image = None
+try:
+    import brotli
+except ImportError:  # static files are then only offered gzip-compressed
+    brotli = None
+
+# /static is served by static_file() below, with content ETags and compression.
+app = Flask(__name__, static_folder=None)
+STATIC_FOLDER = os.path.join(app.root_path, "static")
 
 DATA_FOLDER = "data"
 os.makedirs(DATA_FOLDER, exist_ok=True)
 UPLOAD_FOLDER = os.path.join(DATA_FOLDER, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 ALLOWED_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+# Block size for streaming backups to and from disk.
+EXPORT_CHUNK_SIZE = 256 * 1024
+# Resized copies of uploads, served for /uploads/<name>?w=<width>. Requested widths
+# round up to the next of THUMBNAIL_WIDTHS.
+THUMBNAIL_FOLDER = os.path.join(DATA_FOLDER, "thumbnails")
+os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+THUMBNAIL_WIDTHS = (480, 960, 1600)
+THUMBNAIL_QUALITY = 80
+# Names the app gives uploads (content hash, or random hex from older editor uploads).
+# A name is never reused for other bytes, so browsers may keep such images, and their
+# resized copies, for good.
+IMMUTABLE_IMAGE_RE = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{40})\.[a-z]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Static files up to this size are kept in memory with their gzip/brotli encodings.
+STATIC_CACHE_MAX_BYTES = 1024 * 1024
+STATIC_COMPRESS_MIN_BYTES = 1024
 
 DATA_FILE = os.path.join(DATA_FOLDER, "data.json")
-RESULT_CACHE = {}
+# Per-test summaries for data.json, so listing tests doesn't parse the whole bank.
+DATA_META_FILE = os.path.join(DATA_FOLDER, "data.meta.json")
+TESTS_FOLDER = os.path.join(DATA_FOLDER, "tests")
+# "json" keeps every test in data.json; "sharded" stores one file per test in TESTS_FOLDER;
+# "sqlite" keeps tests and attempts in SQLITE_FILE.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").strip().lower()
+SQLITE_FILE = os.getenv("SQLITE_PATH", os.path.join(DATA_FOLDER, "suvuu.db"))
+TEST_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
 ATTEMPTS_FILE = os.path.join(DATA_FOLDER, "attempts.json")
+ATTEMPTS_LOG_FILE = os.path.join(DATA_FOLDER, "attempts.jsonl")
+ATTEMPTS_INDEX_FILE = os.path.join(DATA_FOLDER, "attempts.index.jsonl")
+# Question text and options that attempts were taken on, one file per distinct version.
+SNAPSHOTS_FOLDER = os.path.join(DATA_FOLDER, "snapshots")
+SNAPSHOT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Read timeout for Ollama responses; connecting gets its own, much shorter timeout.
 OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "30"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
+# Admission control for model calls: how many run at once, how many more may wait,
+# and for how long, before AI endpoints answer 503 with Retry-After.
+AI_MAX_CONCURRENT = int(os.getenv("AI_MAX_CONCURRENT", "4"))
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "16"))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "30"))
+AI_IMPORT_OPTIONS = {"temperature": 0.1, "num_predict": 400, "top_p": 0.9}
+AI_SUMMARY_OPTIONS = {"temperature": 0.2, "num_predict": 180, "top_p": 0.9, "repeat_penalty": 1.1}
+# Bump when the image import prompts change so cached drafts are not reused.
+AI_IMPORT_PROMPT_VERSION = 1
+AI_IMPORT_CACHE_FOLDER = os.path.join(DATA_FOLDER, "ai-cache", "imports")
+AI_IMPORT_CACHE_MAX_MB = float(os.getenv("AI_IMPORT_CACHE_MAX_MB", "8"))
+AI_SUMMARY_CACHE_FOLDER = os.path.join(DATA_FOLDER, "ai-cache", "summaries")
+AI_SUMMARY_CACHE_MAX_MB = float(os.getenv("AI_SUMMARY_CACHE_MAX_MB", "16"))
 AI_CONFIG_FILE = os.path.join(DATA_FOLDER, "ai_config.json")
-MAX_STORED_ATTEMPTS = 2000
+AI_IMPORT_JOBS_FOLDER = os.path.join(DATA_FOLDER, "import-jobs")
+AI_IMPORT_WORKERS = int(os.getenv("AI_IMPORT_WORKERS", "2"))
+AI_IMPORT_MAX_IMAGES = int(os.getenv("AI_IMPORT_MAX_IMAGES", "500"))
+# Finished batch import jobs stay pollable for this many seconds.
+AI_IMPORT_JOB_RETENTION = 3600
+IMPORT_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# How often a worker re-reads the status file of a job running in another worker.
+IMPORT_JOB_POLL_INTERVAL = 0.5
+TEST_SESSIONS_FOLDER = os.path.join(DATA_FOLDER, "test-sessions")
+TEST_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# A shuffled test session can be paged through and submitted for this many seconds.
+TEST_SESSION_TTL = int(os.getenv("TEST_SESSION_TTL", str(24 * 3600)))
+TEST_SESSION_PAGE_SIZE = 50
+TEST_SESSION_MAX_PAGE_SIZE = 200
+# Question fields /api/tests/<id> leaves out unless asked for answers.
+ANSWER_FIELDS = ("correct_index", "explanation")
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "200"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "32"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "0"))
+TEST_CACHE_SIZE = int(os.getenv("TEST_CACHE_SIZE", "64"))
+TEST_CACHE_MAX_MB = float(os.getenv("TEST_CACHE_MAX_MB", "64"))
+SNAPSHOT_CACHE_MAX_MB = float(os.getenv("SNAPSHOT_CACHE_MAX_MB", "64"))
+# JSON responses this large or larger are gzip/brotli-compressed for clients that
+# accept it. Encoded bodies are cached by content, so a test or result is compressed
+# once, not per request.
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "1024"))
+COMPRESSED_CACHE_MAX_MB = float(os.getenv("COMPRESSED_CACHE_MAX_MB", "32"))
+MAX_STORED_ATTEMPTS = int(os.getenv("MAX_STORED_ATTEMPTS", "2000"))
+# Dead lines (tombstones, deleted or expired attempts) tolerated before compaction.
+ATTEMPTS_COMPACT_SLACK = 500
+
+_LOCAL_LOCKS = {}
+_LOCAL_LOCKS_GUARD = threading.Lock()
+_HELD_LOCKS = threading.local()
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on "<path>.lock", held across threads and across processes
+    # (e.g. several gunicorn workers sharing the data folder). Re-entrant per thread.
+    lock_path = f"{path}.lock"
+    held = getattr(_HELD_LOCKS, "paths", None)
+    if held is None:
+        held = _HELD_LOCKS.paths = set()
+    if lock_path in held:
+        yield
+        return
+
+    with _LOCAL_LOCKS_GUARD:
+        local_lock = _LOCAL_LOCKS.setdefault(lock_path, threading.Lock())
+    with local_lock:
+        with open(lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            held.add(lock_path)
+            try:
+                yield
+            finally:
+                held.discard(lock_path)
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class LRUCache:
+    # Thread-safe LRU cache bounded by entry count and total size in bytes, with an
+    # optional TTL (seconds, 0 = never expire). Values are usually encoded bodies,
+    # so their size is simply len(value).
+    def __init__(self, max_entries, max_bytes, ttl=0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = max(0.0, float(ttl))
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and self.ttl and entry[2] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = len(value)
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            if size > self.max_bytes or self.max_entries == 0:
+                return
+            expires = time.monotonic() + self.ttl if self.ttl else 0
+            self._items[key] = (value, size, expires)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value = self._items[key][0]
+            self._drop(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+RESULT_CACHE = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_MAX_MB * 1024 * 1024, RESULT_CACHE_TTL)
+TEST_PAYLOAD_CACHE = LRUCache(TEST_CACHE_SIZE, TEST_CACHE_MAX_MB * 1024 * 1024)
+COMPRESSED_CACHE = LRUCache(1024, COMPRESSED_CACHE_MAX_MB * 1024 * 1024)
+# Parsed test snapshots by id; ids are content hashes, so entries never go stale.
+SNAPSHOT_CACHE = LRUCache(256, SNAPSHOT_CACHE_MAX_MB * 1024 * 1024)
+
+
+def json_bytes(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype="application/json")
+
+def write_json_atomic(path, payload, indent=None):
+    # Write to a temp file in the same folder, fsync, then rename over the target so
+    # readers only ever see the old or the new document, never a truncated one.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            if indent is None:
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(payload, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fcntl is not None:
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+class DiskCache:
+    # Persistent content-addressed cache: each value is a small JSON file named by
+    # its key (a hex digest), bounded by total size in bytes with LRU eviction. File
+    # mtimes record recency, so the order survives restarts. Other processes may
+    # evict files this one still knows about; those read as misses.
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        found = []
+        for name in os.listdir(folder):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
+                continue
+            found.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _evict(self):
+        # Caller holds self._lock.
+        while self._entries and self._bytes > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            value = json.loads(raw)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key not in self._entries:
+                self._bytes += len(raw)
+            self._entries[key] = len(raw)
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        size = len(json_bytes(value))
+        if size > self.max_bytes:
+            return
+        try:
+            write_json_atomic(self._path(key), value)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+AI_SUMMARY_CACHE = DiskCache(AI_SUMMARY_CACHE_FOLDER, AI_SUMMARY_CACHE_MAX_MB * 1024 * 1024)
+AI_IMPORT_CACHE = DiskCache(AI_IMPORT_CACHE_FOLDER, AI_IMPORT_CACHE_MAX_MB * 1024 * 1024)
+
+
+def ai_summary_cache_key(system_prompt, user_prompt, model):
+    # Everything that determines the generated text.
+    material = {"system": system_prompt, "user": user_prompt, "model": model, "options": AI_SUMMARY_OPTIONS}
+    return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def ai_import_cache_key(image_hash, model):
+    material = {"image": image_hash, "model": model, "prompt_version": AI_IMPORT_PROMPT_VERSION, "options": AI_IMPORT_OPTIONS}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
 
 
 def load_ai_config():
@@ -51,25 +442,820 @@ def save_ai_config(cfg):
         "ollama_url": str(cfg.get("ollama_url", "")).strip(),
         "ollama_model": str(cfg.get("ollama_model", "")).strip()
     }
-    with open(AI_CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=4, ensure_ascii=False)
+    write_json_atomic(AI_CONFIG_FILE, payload, indent=4)
     return payload
 
 
-def load_data():
-    if os.path.exists(DATA_FILE):
+OLLAMA_CLIENT = OllamaClient(
+    pool_size=OLLAMA_POOL_SIZE,
+    connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+    read_timeout=OLLAMA_TIMEOUT,
+    retries=OLLAMA_RETRIES
+)
+AI_LIMITER = AdmissionLimiter(AI_MAX_CONCURRENT, AI_MAX_QUEUE, AI_QUEUE_TIMEOUT)
+AI_CALLS = SingleFlight(AI_LIMITER)
+AI_STREAMS = StreamFanout(AI_LIMITER)
+# Used instead of AI_CALLS / AI_STREAMS when serving through asgi.py.
+AI_ASYNC_CALLS = AsyncSingleFlight(AI_LIMITER)
+AI_ASYNC_STREAMS = AsyncStreamFanout(AI_LIMITER)
+
+
+def ai_error(exc):
+    # (body, status, headers) for a model call that raised OllamaError.
+    if isinstance(exc, OllamaOverloaded):
+        return {"error": "AI server is busy. Try again shortly."}, 503, {"Retry-After": str(exc.retry_after)}
+    if isinstance(exc, OllamaUnavailable):
+        return {"error": "AI server is unavailable."}, 502, {}
+    if isinstance(exc, OllamaInvalidResponse):
+        return {"error": f"AI server returned non-JSON response: {exc.preview}"}, 502, {}
+    return {"error": "AI server error."}, 502, {}
+
+
+def read_data_file(path):
+    # Raises ValueError when the file exists but cannot be parsed.
+    if not os.path.exists(path):
+        return {"tests": []}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError:
+        return {"tests": []}
+    if not isinstance(data, dict) or not isinstance(data.get("tests"), list):
+        raise ValueError(f"{path} does not contain a tests list")
+    return data
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def test_images(test):
+    questions = test.get("questions", []) if isinstance(test, dict) else []
+    if not isinstance(questions, list):
+        return []
+    return [str(q["image"]) for q in questions if isinstance(q, dict) and q.get("image")]
+
+def test_summary(test, previous=None, body=None):
+    # Listing metadata for one test, plus the names of the uploads it uses (for
+    # images_in_use; not listed). `previous` is the stored summary; it is kept as-is
+    # (including updated_at) when the content hash hasn't changed.
+    content_hash = hashlib.sha256(body if body is not None else json_bytes(test)).hexdigest()
+    if previous is not None and previous.get("content_hash") == content_hash:
+        if "images" in previous:
+            return previous
+        # Stored before summaries named their images.
+        return {**previous, "images": sorted(set(test_images(test)))}
+    questions = test.get("questions", [])
+    if not isinstance(questions, list):
+        questions = []
+    return {
+        "id": test.get("id"),
+        "title": str(test.get("title", "Untitled")),
+        "question_count": len(questions),
+        "has_images": any(isinstance(q, dict) and bool(q.get("image")) for q in questions),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "content_hash": content_hash,
+        "images": sorted(set(test_images(test)))
+    }
+
+def summary_images(summaries):
+    images = set()
+    for summary in summaries:
+        images.update(summary.get("images", ()))
+    return images
+
+def backup_unreadable_file(path):
+    app.logger.error("Could not parse %s", path)
+    backup = f"{path}.corrupt-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    try:
+        shutil.copy2(path, backup)
+    except OSError:
+        pass
+
+# Test storage backends. All expose the same methods: read/summaries/ids/get/
+# get_versioned/images_in_use for reads, and put/delete/replace_all for writes, which
+# callers make while holding lock(). Stored test dicts are shared with the caches; treat them as
+# read-only and write back a modified copy.
+
+class DataStore:
+    # Single data.json file. Keeps the parsed document in memory and re-reads it only
+    # when the file's mtime or size changes (e.g. another process or a manual edit
+    # replaced it). Also keeps a test id -> list position index for O(1) lookups.
+    def __init__(self, path, meta_path):
+        self.path = path
+        self.meta_path = meta_path
+        self._lock = threading.Lock()
+        self._data = None
+        self._positions = {}
+        self._summaries = None
+        self._summaries_signature = None
+        # id -> (test dict, summary) for the tests the current summaries were built from.
+        self._summarised = {}
+        self._image_index = (None, set())
+        self._signature = None
+        # Bumped whenever the cached document changes; used to key derived caches.
+        self.version = 0
+
+    def lock(self):
+        return file_lock(self.path)
+
+    def _set_data(self, data):
+        # Caller holds self._lock.
+        self._data = data
+        self._positions = {}
+        for idx, test in enumerate(data["tests"]):
+            if isinstance(test, dict) and test.get("id"):
+                self._positions.setdefault(str(test["id"]), idx)
+        self.version += 1
+
+    def _refresh(self):
+        # Caller holds self._lock.
+        signature = file_signature(self.path)
+        if self._data is None or signature != self._signature:
+            try:
+                data = read_data_file(self.path)
+            except ValueError:
+                # Never let an unreadable file turn into an empty bank that the next
+                # save writes back: keep the last good copy and set the bad file aside.
+                backup_unreadable_file(self.path)
+                data = self._data if self._data is not None else {"tests": []}
+            self._set_data(data)
+            self._signature = signature
+
+    def read(self):
+        with self._lock:
+            self._refresh()
+            return self._data
+
+    def summaries(self):
+        # Served from memory or the sidecar while it matches data.json; only a changed
+        # or missing sidecar falls back to parsing the bank.
+        with self._lock:
+            signature = file_signature(self.path)
+            if self._summaries is not None and self._summaries_signature == signature:
+                return self._summaries
+            meta = self._read_meta()
+            if (meta is not None and meta.get("signature") == list(signature or [])
+                    and all("images" in e for e in meta["tests"] if isinstance(e, dict))):
+                self._summaries = meta["tests"]
+                self._summaries_signature = signature
+                return self._summaries
+            self._refresh()
+            previous = {e.get("id"): e for e in (meta or {}).get("tests", []) if isinstance(e, dict)}
+            self._build_summaries(previous)
+            self._write_meta()
+            return self._summaries
+
+    def _read_meta(self):
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, OSError):
-            return {"tests": []}
-    return {"tests": []}
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or not isinstance(meta.get("tests"), list):
+            return None
+        return meta
+
+    def _build_summaries(self, previous):
+        # Caller holds self._lock. Summaries of test dicts that are unchanged since the
+        # last build are reused without re-hashing.
+        summaries = []
+        summarised = {}
+        for test in self._data["tests"]:
+            if not isinstance(test, dict):
+                continue
+            test_id = test.get("id")
+            known = self._summarised.get(test_id)
+            if known is not None and known[0] is test:
+                summary = known[1]
+            else:
+                summary = test_summary(test, previous.get(test_id))
+            summarised[test_id] = (test, summary)
+            summaries.append(summary)
+        self._summaries = summaries
+        self._summarised = summarised
+        self._summaries_signature = self._signature
+
+    def _write_meta(self):
+        # Caller holds self._lock. Best effort: a stale or missing sidecar is rebuilt.
+        if self._signature is None:
+            return
+        try:
+            write_json_atomic(self.meta_path, {"signature": list(self._signature), "tests": self._summaries})
+        except OSError:
+            app.logger.warning("Could not write %s", self.meta_path)
+
+    def ids(self):
+        return [s["id"] for s in self.summaries()]
+
+    def images_in_use(self, names):
+        # The names among `names` that a stored question uses. The set of all of them
+        # is built from the summaries once per change to the bank.
+        summaries = self.summaries()
+        with self._lock:
+            if self._image_index[0] is not summaries:
+                self._image_index = (summaries, summary_images(summaries))
+            index = self._image_index[1]
+        return {name for name in names if name in index}
+
+    def has(self, test_id):
+        with self._lock:
+            self._refresh()
+            return str(test_id) in self._positions
+
+    def get_versioned(self, test_id):
+        with self._lock:
+            self._refresh()
+            idx = self._positions.get(str(test_id))
+            if idx is None:
+                return None, None
+            return self._data["tests"][idx], self.version
+
+    def get(self, test_id):
+        return self.get_versioned(test_id)[0]
+
+    def replace_all(self, data):
+        write_json_atomic(self.path, data)
+        with self._lock:
+            summaries = self._summaries
+            if summaries is None:
+                summaries = (self._read_meta() or {}).get("tests", [])
+            previous = {e.get("id"): e for e in summaries if isinstance(e, dict)}
+            self._set_data(data)
+            self._signature = file_signature(self.path)
+            self._build_summaries(previous)
+            self._write_meta()
+
+    def put(self, test):
+        with self._lock:
+            self._refresh()
+            data = self._data
+            idx = self._positions.get(str(test["id"]))
+        tests = list(data["tests"])
+        if idx is None:
+            tests.append(test)
+        else:
+            tests[idx] = test
+        self.replace_all({**data, "tests": tests})
+
+    def delete(self, test_id):
+        with self._lock:
+            self._refresh()
+            data = self._data
+            idx = self._positions.get(str(test_id))
+        if idx is None:
+            return None
+        tests = list(data["tests"])
+        removed = tests.pop(idx)
+        self.replace_all({**data, "tests": tests})
+        return removed
+
+
+class ShardedDataStore:
+    # One <id>.json file per test under data/tests/, plus a small manifest.json with
+    # the ordered list of test summaries. Listing only reads the manifest, and a
+    # change to one test rewrites only that test's file (and the manifest).
+    def __init__(self, folder):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, "manifest.json")
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._positions = {}
+        self._manifest_signature = None
+        self._shards = {}
+        self._image_index = (None, set())
+
+    def lock(self):
+        return file_lock(self.manifest_path)
+
+    def _shard_path(self, test_id):
+        return os.path.join(self.folder, f"{test_id}.json")
+
+    def _set_manifest(self, entries):
+        # Caller holds self._lock.
+        self._manifest = entries
+        self._positions = {str(e["id"]): idx for idx, e in enumerate(entries)}
+
+    def _refresh(self):
+        # Caller holds self._lock.
+        signature = file_signature(self.manifest_path)
+        if self._manifest is not None and signature == self._manifest_signature:
+            return
+        entries = []
+        if signature is not None:
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                entries = [e for e in raw.get("tests", []) if isinstance(e, dict) and e.get("id")]
+            except (OSError, ValueError, AttributeError):
+                backup_unreadable_file(self.manifest_path)
+                entries = self._manifest if self._manifest is not None else []
+        self._set_manifest(entries)
+        self._manifest_signature = signature
+
+    def read(self):
+        tests = []
+        for test_id in self.ids():
+            test = self.get(test_id)
+            if test is not None:
+                tests.append(test)
+        return {"tests": tests}
+
+    def summaries(self):
+        with self._lock:
+            self._refresh()
+            return self._manifest
+
+    def ids(self):
+        return [e["id"] for e in self.summaries()]
+
+    def images_in_use(self, names):
+        # As DataStore.images_in_use, from the manifest.
+        with self._lock:
+            self._refresh()
+            if self._image_index[0] is not self._manifest:
+                self._image_index = (self._manifest, summary_images(self._manifest))
+            index = self._image_index[1]
+        return {name for name in names if name in index}
+
+    def has(self, test_id):
+        with self._lock:
+            self._refresh()
+            return str(test_id) in self._positions
+
+    def get_versioned(self, test_id):
+        test_id = str(test_id)
+        with self._lock:
+            self._refresh()
+            if test_id not in self._positions:
+                return None, None
+            path = self._shard_path(test_id)
+            signature = file_signature(path)
+            cached = self._shards.get(test_id)
+            if cached is not None and cached[0] == signature:
+                return cached[1], signature
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    test = json.load(f)
+            except (OSError, ValueError):
+                if cached is not None:
+                    return cached[1], cached[0]
+                return None, None
+            if not isinstance(test, dict):
+                return None, None
+            self._shards[test_id] = (signature, test)
+            return test, signature
+
+    def get(self, test_id):
+        return self.get_versioned(test_id)[0]
+
+    def _write_shard(self, test):
+        test_id = str(test["id"])
+        path = self._shard_path(test_id)
+        write_json_atomic(path, test)
+        with self._lock:
+            self._shards[test_id] = (file_signature(path), test)
+
+    def ensure_metadata(self):
+        # Manifests written before summaries carried metadata get it filled in once.
+        with self.lock():
+            entries = list(self.summaries())
+            if all("content_hash" in e and "images" in e for e in entries):
+                return
+            for idx, entry in enumerate(entries):
+                test = self.get(entry["id"])
+                if ("content_hash" not in entry or "images" not in entry) and test is not None:
+                    entries[idx] = test_summary(test, entry)
+            self._write_manifest(entries)
+
+    def _write_manifest(self, entries):
+        write_json_atomic(self.manifest_path, {"tests": entries})
+        with self._lock:
+            self._set_manifest(entries)
+            self._manifest_signature = file_signature(self.manifest_path)
+
+    def put(self, test):
+        self._write_shard(test)
+        with self._lock:
+            self._refresh()
+            entries = list(self._manifest)
+            idx = self._positions.get(str(test["id"]))
+        if idx is None:
+            entries.append(test_summary(test))
+        else:
+            entries[idx] = test_summary(test, entries[idx])
+        self._write_manifest(entries)
+
+    def delete(self, test_id):
+        test_id = str(test_id)
+        test = self.get(test_id)
+        if test is None:
+            return None
+        self._write_manifest([e for e in self.summaries() if str(e["id"]) != test_id])
+        with self._lock:
+            self._shards.pop(test_id, None)
+        try:
+            os.remove(self._shard_path(test_id))
+        except OSError:
+            pass
+        return test
+
+    def replace_all(self, data):
+        # Only tests that differ from what is stored get rewritten.
+        previous = {str(e["id"]): e for e in self.summaries()}
+        entries = []
+        for test in data["tests"]:
+            if not isinstance(test, dict) or not test.get("id"):
+                continue
+            stored = previous.get(str(test["id"]))
+            if stored is not None and "images" in stored and self.get(test["id"]) is test:
+                entries.append(stored)
+                continue
+            self._write_shard(test)
+            entries.append(test_summary(test, stored))
+        self._write_manifest(entries)
+        for test_id in set(previous) - {str(e["id"]) for e in entries}:
+            with self._lock:
+                self._shards.pop(test_id, None)
+            try:
+                os.remove(self._shard_path(test_id))
+            except OSError:
+                pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tests (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    question_count INTEGER NOT NULL,
+    has_images INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    content_hash TEXT,
+    revision TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tests_position ON tests (position);
+CREATE TABLE IF NOT EXISTS test_images (
+    name TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    PRIMARY KEY (name, test_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS test_images_test_id ON test_images (test_id);
+CREATE TABLE IF NOT EXISTS attempts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    test_id TEXT,
+    test_title TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    snapshot TEXT
+);
+CREATE INDEX IF NOT EXISTS attempts_created_at ON attempts (created_at);
+CREATE INDEX IF NOT EXISTS attempts_test_id ON attempts (test_id, seq);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+"""
+
+# Columns added to existing databases after the table was first created.
+SQLITE_ADDED_COLUMNS = {
+    "tests": [
+        ("has_images", "INTEGER NOT NULL DEFAULT 0"),
+        ("updated_at", "TEXT"),
+        ("content_hash", "TEXT")
+    ],
+    "attempts": [
+        ("snapshot", "TEXT")
+    ]
+}
+# Indexes on added columns, created once the columns exist.
+SQLITE_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS attempts_snapshot ON attempts (snapshot);
+"""
+
+class SqliteDatabase:
+    # One connection per thread (and per process, so forked workers don't share one).
+    # Connections run in autocommit mode; writes that must be atomic go through
+    # transaction(), which takes SQLite's write lock up front and nests.
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self.transaction() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            for table, columns in SQLITE_ADDED_COLUMNS.items():
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for name, definition in columns:
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            conn.executescript(SQLITE_ADDED_INDEXES)
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+class SqliteDataStore:
+    # Tests as JSON bodies in the tests table, ordered by position. Each write stamps a
+    # new revision; parsed bodies are cached per revision, so reads only fetch the
+    # body column when a test changed.
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._parsed = {}
+
+    def lock(self):
+        return self.db.transaction()
+
+    def _parse(self, test_id, revision, body):
+        test = json.loads(body)
+        with self._lock:
+            self._parsed[test_id] = (revision, test)
+        return test
+
+    def _cached(self, test_id, revision):
+        with self._lock:
+            cached = self._parsed.get(test_id)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        return None
+
+    def read(self):
+        conn = self.db.connect()
+        rows = conn.execute("SELECT id, revision FROM tests ORDER BY position").fetchall()
+        tests = []
+        for test_id, revision in rows:
+            test = self._cached(test_id, revision)
+            if test is None:
+                test, _ = self.get_versioned(test_id)
+            if test is not None:
+                tests.append(test)
+        return {"tests": tests}
+
+    def summaries(self):
+        rows = self.db.connect().execute(
+            "SELECT id, title, question_count, has_images, updated_at, content_hash FROM tests ORDER BY position"
+        ).fetchall()
+        return [
+            {"id": r[0], "title": r[1], "question_count": r[2], "has_images": bool(r[3]), "updated_at": r[4], "content_hash": r[5]}
+            for r in rows
+        ]
+
+    def ensure_metadata(self):
+        # Rows written before summaries carried metadata, or before test_images
+        # existed, get it filled in once.
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, position FROM tests WHERE content_hash IS NULL "
+                "OR (has_images = 1 AND id NOT IN (SELECT test_id FROM test_images))"
+            ).fetchall()
+            for test_id, position in rows:
+                test = self.get(test_id)
+                if test is not None:
+                    self._upsert(conn, test, position)
+
+    def ids(self):
+        return [r[0] for r in self.db.connect().execute("SELECT id FROM tests ORDER BY position")]
+
+    def has(self, test_id):
+        row = self.db.connect().execute("SELECT 1 FROM tests WHERE id = ?", (str(test_id),)).fetchone()
+        return row is not None
+
+    def images_in_use(self, names):
+        # One primary-key lookup per name in test_images.
+        conn = self.db.connect()
+        return {
+            name for name in set(names)
+            if conn.execute("SELECT 1 FROM test_images WHERE name = ? LIMIT 1", (name,)).fetchone() is not None
+        }
+
+    def get_versioned(self, test_id):
+        test_id = str(test_id)
+        conn = self.db.connect()
+        row = conn.execute("SELECT revision FROM tests WHERE id = ?", (test_id,)).fetchone()
+        if row is None:
+            return None, None
+        test = self._cached(test_id, row[0])
+        if test is not None:
+            return test, row[0]
+        row = conn.execute("SELECT revision, body FROM tests WHERE id = ?", (test_id,)).fetchone()
+        if row is None:
+            return None, None
+        return self._parse(test_id, row[0], row[1]), row[0]
+
+    def get(self, test_id):
+        return self.get_versioned(test_id)[0]
+
+    def _upsert(self, conn, test, position):
+        body = json_bytes(test)
+        summary = test_summary(test, body=body)
+        row = conn.execute("SELECT updated_at, content_hash FROM tests WHERE id = ?", (str(test["id"]),)).fetchone()
+        updated_at = row[0] if row is not None and row[1] == summary["content_hash"] else summary["updated_at"]
+        revision = uuid4().hex
+        conn.execute(
+            "INSERT INTO tests (id, position, title, question_count, has_images, updated_at, content_hash, revision, body) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET position = excluded.position, title = excluded.title, "
+            "question_count = excluded.question_count, has_images = excluded.has_images, "
+            "updated_at = excluded.updated_at, content_hash = excluded.content_hash, "
+            "revision = excluded.revision, body = excluded.body",
+            (str(test["id"]), position, summary["title"], summary["question_count"], int(summary["has_images"]),
+             updated_at, summary["content_hash"], revision, body.decode("utf-8"))
+        )
+        conn.execute("DELETE FROM test_images WHERE test_id = ?", (str(test["id"]),))
+        conn.executemany(
+            "INSERT INTO test_images (name, test_id) VALUES (?, ?)",
+            [(name, str(test["id"])) for name in summary["images"]]
+        )
+        with self._lock:
+            self._parsed[str(test["id"])] = (revision, test)
+
+    def put(self, test):
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT position FROM tests WHERE id = ?", (str(test["id"]),)).fetchone()
+            if row is None:
+                row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM tests").fetchone()
+            self._upsert(conn, test, row[0])
+
+    def delete(self, test_id):
+        test_id = str(test_id)
+        with self.db.transaction() as conn:
+            test = self.get(test_id)
+            if test is None:
+                return None
+            conn.execute("DELETE FROM tests WHERE id = ?", (test_id,))
+            conn.execute("DELETE FROM test_images WHERE test_id = ?", (test_id,))
+        with self._lock:
+            self._parsed.pop(test_id, None)
+        return test
+
+    def replace_all(self, data):
+        # Only tests that differ from what is stored get rewritten.
+        with self.db.transaction() as conn:
+            stored = {r[0]: (r[1], r[2]) for r in conn.execute("SELECT id, revision, position FROM tests")}
+            keep = set()
+            position = 0
+            for test in data["tests"]:
+                if not isinstance(test, dict) or not test.get("id"):
+                    continue
+                test_id = str(test["id"])
+                keep.add(test_id)
+                current = stored.get(test_id)
+                if current is not None and self._cached(test_id, current[0]) is test:
+                    if current[1] != position:
+                        conn.execute("UPDATE tests SET position = ? WHERE id = ?", (position, test_id))
+                else:
+                    self._upsert(conn, test, position)
+                position += 1
+            gone = [(test_id,) for test_id in stored if test_id not in keep]
+            conn.executemany("DELETE FROM tests WHERE id = ?", gone)
+            conn.executemany("DELETE FROM test_images WHERE test_id = ?", gone)
+        with self._lock:
+            for (test_id,) in gone:
+                self._parsed.pop(test_id, None)
+
+
+def migrate_to_sqlite(store):
+    # One-shot import of data.json (or sharded files) into an empty tests table.
+    with store.lock():
+        if store.db.connect().execute("SELECT 1 FROM tests LIMIT 1").fetchone() is not None:
+            return
+        if os.path.exists(DATA_FILE):
+            source_path = DATA_FILE
+            data = read_data_file(DATA_FILE)
+        elif os.path.exists(os.path.join(TESTS_FOLDER, "manifest.json")):
+            source_path = os.path.join(TESTS_FOLDER, "manifest.json")
+            data = ShardedDataStore(TESTS_FOLDER).read()
+        else:
+            return
+        tests = [t for t in data["tests"] if isinstance(t, dict)]
+        assign_test_ids(tests)
+        store.replace_all({"tests": tests})
+    os.replace(source_path, f"{source_path}.migrated")
+
+
+def migrate_to_sharded(store):
+    # One-shot conversion of data.json into per-test files.
+    if not os.path.exists(DATA_FILE) or os.path.exists(store.manifest_path):
+        return
+    with store.lock():
+        if not os.path.exists(DATA_FILE) or os.path.exists(store.manifest_path):
+            return
+        data = read_data_file(DATA_FILE)
+        tests = [t for t in data["tests"] if isinstance(t, dict)]
+        assign_test_ids(tests)
+        store.replace_all({"tests": tests})
+        os.replace(DATA_FILE, f"{DATA_FILE}.migrated")
+
+
+def create_data_store():
+    if STORAGE_BACKEND == "sqlite":
+        store = SqliteDataStore(SQLITE_DB)
+        migrate_to_sqlite(store)
+        store.ensure_metadata()
+        return store
+    if STORAGE_BACKEND == "sharded":
+        os.makedirs(TESTS_FOLDER, exist_ok=True)
+        store = ShardedDataStore(TESTS_FOLDER)
+        migrate_to_sharded(store)
+        store.ensure_metadata()
+        return store
+    return DataStore(DATA_FILE, DATA_META_FILE)
+
+
+def get_tests():
+    # Full test list; treat as read-only.
+    return DATA_STORE.read()["tests"]
+
+def get_test(test_id):
+    return DATA_STORE.get(test_id)
+
+def resolve_test_id(raw_id):
+    # Tests are addressed by their stable "id". Bare integers are the old positional
+    # ids, still accepted so bookmarked links and older clients keep working.
+    key = str(raw_id).strip()
+    if DATA_STORE.has(key):
+        return key
+    if key.isdigit():
+        ids = DATA_STORE.ids()
+        idx = int(key)
+        if idx < len(ids):
+            return str(ids[idx])
+    return None
+
+def new_test_id():
+    return uuid4().hex
+
+def assign_test_ids(tests):
+    # Gives every test a unique stable id, replacing (not mutating) the test dicts
+    # that need one. Ids double as file names in sharded storage, so anything that
+    # isn't a short [A-Za-z0-9_-] token is replaced too. Returns True when anything changed.
+    seen = set()
+    changed = False
+    for idx, test in enumerate(tests):
+        if not isinstance(test, dict):
+            continue
+        test_id = str(test.get("id") or "").strip()
+        if not TEST_ID_RE.match(test_id) or test_id in seen:
+            test_id = new_test_id()
+            tests[idx] = {**test, "id": test_id}
+            changed = True
+        seen.add(test_id)
+    return changed
+
+def load_data():
+    # Working copy for read-modify-write of the whole bank. The test dicts are still
+    # shared with the store, so replace a test instead of mutating it in place.
+    data = DATA_STORE.read()
+    return {**data, "tests": list(data["tests"])}
 
 def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    # Callers doing read-modify-write should hold DATA_STORE.lock() around the
+    # load_data()/save_data() pair so concurrent edits don't overwrite each other.
+    with DATA_STORE.lock():
+        DATA_STORE.replace_all(data)
+
+def migrate_test_ids():
+    # Older data.json files address tests only by list position.
+    if all(TEST_ID_RE.match(str(test_id or "")) for test_id in DATA_STORE.ids()):
+        return
+    with DATA_STORE.lock():
+        data = load_data()
+        if assign_test_ids(data["tests"]):
+            save_data(data)
+
+
+SQLITE_DB = SqliteDatabase(SQLITE_FILE) if STORAGE_BACKEND == "sqlite" else None
+DATA_STORE = create_data_store()
+migrate_test_ids()
 
 def load_attempts():
+    # Legacy attempts.json reader, only used to migrate into the attempt log.
     if os.path.exists(ATTEMPTS_FILE):
         try:
             with open(ATTEMPTS_FILE, "r", encoding="utf-8") as f:
@@ -80,66 +1266,713 @@ def load_attempts():
             pass
     return {"attempts": []}
 
-def save_attempts(data):
-    attempts = data.get("attempts", [])
-    if not isinstance(attempts, list):
-        attempts = []
-    with open(ATTEMPTS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"attempts": attempts}, f, indent=4, ensure_ascii=False)
+def encode_log_line(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
 
-def persist_attempt(payload):
-    attempts_data = load_attempts()
-    attempts = attempts_data.get("attempts", [])
-    if not isinstance(attempts, list):
-        attempts = []
-    attempts.append(payload)
-    if len(attempts) > MAX_STORED_ATTEMPTS:
-        attempts = attempts[-MAX_STORED_ATTEMPTS:]
-    attempts_data["attempts"] = attempts
-    save_attempts(attempts_data)
+def coerce_count(value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return max(number, 0)
 
-def get_attempt_by_token(token):
-    attempts_data = load_attempts()
-    attempts = attempts_data.get("attempts", [])
-    if not isinstance(attempts, list):
+def stable_test_id(test_id, ids):
+    # Attempts from before stable ids name their test by its list position.
+    if isinstance(test_id, int) and not isinstance(test_id, bool) and 0 <= test_id < len(ids):
+        return str(ids[test_id])
+    return test_id
+
+def attempt_summary(record):
+    return {
+        "id": str(record.get("id", "")).strip(),
+        "created_at": str(record.get("created_at", "")).strip(),
+        "test_id": record.get("test_id"),
+        "test_title": str(record.get("test_title", "Untitled Test")),
+        "score": coerce_count(record.get("score", 0)),
+        "total": coerce_count(record.get("total", 0))
+    }
+
+# An attempt line still holding full answers (written before snapshots), and the
+# snapshot reference of a compact one. Both keys are top-level; string values can't
+# contain the unescaped quotes.
+FULL_ANSWERS_MARKER = b'"answers":[{'
+SNAPSHOT_REF_RE = re.compile(rb'"snapshot":"([0-9a-f]{32})"')
+
+def compact_attempt(record, snapshots):
+    # Attempt as stored: answers cut down to [selected, correct] by question index,
+    # plus is_correct when it isn't selected == correct. The questions themselves go
+    # to `snapshots` once per distinct version, under the hash of their content.
+    answers = record.get("answers")
+    if not answers or not isinstance(answers, list) or not all(isinstance(a, dict) for a in answers):
+        return record
+    body = json_bytes([
+        {
+            "question": a.get("question", ""),
+            "options": a.get("options", []),
+            "explanation": a.get("explanation", ""),
+            "image": a.get("image", "")
+        }
+        for a in answers
+    ])
+    snapshot_id = hashlib.sha256(body).hexdigest()[:32]
+    snapshots.put(snapshot_id, body)
+    compact = []
+    for a in answers:
+        pair = [a.get("selected"), a.get("correct")]
+        if a.get("is_correct") != (pair[0] == pair[1]):
+            pair.append(a.get("is_correct"))
+        compact.append(pair)
+    return {**record, "answers": compact, "snapshot": snapshot_id}
+
+def load_snapshot(snapshot_id, snapshots):
+    questions = SNAPSHOT_CACHE.get(snapshot_id)
+    if questions is not None:
+        return questions
+    body = snapshots.get(snapshot_id) if SNAPSHOT_ID_RE.match(str(snapshot_id)) else None
+    try:
+        questions = json.loads(body) if body is not None else None
+    except ValueError:
+        questions = None
+    if not isinstance(questions, list):
+        return []
+    SNAPSHOT_CACHE.set(snapshot_id, questions, size=len(body))
+    return questions
+
+def expand_attempt(record, snapshots):
+    # Inverse of compact_attempt: the attempt as take_test built it.
+    snapshot_id = record.get("snapshot")
+    if not snapshot_id or not isinstance(record.get("answers"), list):
+        return record
+    questions = load_snapshot(snapshot_id, snapshots)
+    answers = []
+    for i, pair in enumerate(record["answers"]):
+        pair = pair if isinstance(pair, list) and len(pair) >= 2 else [None, None]
+        q = questions[i] if i < len(questions) and isinstance(questions[i], dict) else {}
+        answers.append({
+            "question": q.get("question", ""),
+            "options": q.get("options", []),
+            "selected": pair[0],
+            "correct": pair[1],
+            "is_correct": pair[2] if len(pair) > 2 else pair[0] == pair[1],
+            "explanation": q.get("explanation", ""),
+            "image": q.get("image", "")
+        })
+    return {k: (answers if k == "answers" else v) for k, v in record.items() if k != "snapshot"}
+
+
+class SnapshotStore:
+    # Write-once files named by the hash of their content, so a test version shared
+    # by many attempts is stored once and never rewritten.
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, snapshot_id):
+        return os.path.join(self.folder, f"{snapshot_id}.json")
+
+    def put(self, snapshot_id, body):
+        path = self._path(snapshot_id)
+        if not os.path.exists(path):
+            replace_file_lines(path, [body])
+
+    def get(self, snapshot_id):
+        try:
+            with open(self._path(snapshot_id), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def prune(self, keep):
+        # Caller holds the attempt log's lock, so no attempt can start using a
+        # snapshot while it is removed.
+        for name in os.listdir(self.folder):
+            snapshot_id, ext = os.path.splitext(name)
+            if ext == ".json" and SNAPSHOT_ID_RE.match(snapshot_id) and snapshot_id not in keep:
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+
+
+class AttemptLog:
+    # Append-only JSONL journal of attempts plus a small summary index next to it.
+    #
+    # The journal holds full attempts and {"deleted": "<id>"} tombstones. Every journal
+    # line gets a matching index line carrying its offset ("o") and length ("n") and,
+    # for attempts, the summary fields the history page needs. Readers only ever parse
+    # the index: it is caught up by reading the bytes appended since the last look and
+    # re-read when the file is replaced (compaction or clear). Full attempts are read
+    # from the journal by offset. Only the newest max_attempts live attempts are
+    # visible; compaction drops the rest from disk, along with the snapshots only
+    # they used. Attempts are stored compacted against `snapshots`.
+    def __init__(self, path, index_path, max_attempts, compact_slack, snapshots):
+        self.path = path
+        self.index_path = index_path
+        self.max_attempts = max_attempts
+        self.compact_slack = compact_slack
+        self.snapshots = snapshots
+        # Format of the journal's contents, bumped by the one-time upgrades below so
+        # that later startups skip them without reading the journal.
+        self.version_path = f"{path}.version"
+        self._lock = threading.Lock()
+        self._reset_index(None)
+
+    def _reset_index(self, inode):
+        self._entries = {}
+        # Parallel lists in append order; may contain ids that were since deleted.
+        self._seqs = []
+        self._tokens = []
+        self._next_seq = 0
+        self._inode = inode
+        self._indexed_size = 0
+        self._line_count = 0
+        self._journal_end = 0
+
+    def _apply_index_line(self, record):
+        if not isinstance(record, dict):
+            return
+        try:
+            self._journal_end = max(self._journal_end, int(record["o"]) + int(record["n"]))
+        except (KeyError, TypeError, ValueError):
+            return
+        if "id" not in record:
+            self._entries.pop(str(record.get("deleted", "")).strip(), None)
+            return
+        token = str(record["id"]).strip()
+        if not token:
+            return
+        self._entries.pop(token, None)
+        entry = dict(record, seq=self._next_seq)
+        self._entries[token] = entry
+        self._seqs.append(self._next_seq)
+        self._tokens.append(token)
+        self._next_seq += 1
+        while len(self._entries) > self.max_attempts:
+            del self._entries[next(iter(self._entries))]
+        if len(self._tokens) > 2 * len(self._entries) + 64:
+            self._tokens = list(self._entries)
+            self._seqs = [e["seq"] for e in self._entries.values()]
+
+    def _catch_up(self, f):
+        # Caller holds self._lock and passes the index opened in binary mode.
+        st = os.fstat(f.fileno())
+        if st.st_ino != self._inode or st.st_size < self._indexed_size:
+            self._reset_index(st.st_ino)
+        if st.st_size == self._indexed_size:
+            return
+        f.seek(self._indexed_size)
+        offset = self._indexed_size
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Partial line from a writer that is still appending.
+                break
+            try:
+                self._apply_index_line(json.loads(line))
+            except ValueError:
+                pass
+            offset += len(line)
+            self._line_count += 1
+        self._indexed_size = offset
+
+    @contextmanager
+    def _open_index(self):
+        try:
+            f = open(self.index_path, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self._reset_index(None)
+                yield
+            return
+        with f, self._lock:
+            self._catch_up(f)
+            yield
+
+    def _read_record(self, entry):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(entry["o"])
+                record = json.loads(f.read(entry["n"]))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(record, dict) or str(record.get("id", "")).strip() != entry["id"]:
+            # The journal was compacted after we read the index; caller retries.
+            return None
+        return record
+
+    def get(self, token):
+        for _ in range(2):
+            with self._open_index():
+                entry = self._entries.get(token)
+            if entry is None:
+                return None
+            record = self._read_record(entry)
+            if record is not None:
+                return expand_attempt(record, self.snapshots)
         return None
-    for attempt in reversed(attempts):
-        if isinstance(attempt, dict) and str(attempt.get("id", "")) == token:
-            return attempt
-    return None
 
-def delete_attempt_by_token(token):
-    attempts_data = load_attempts()
-    attempts = attempts_data.get("attempts", [])
-    if not isinstance(attempts, list):
-        attempts = []
+    def has(self, token):
+        with self._open_index():
+            return token in self._entries
+
+    def page(self, before=None, limit=50, test_id=None, created_from=None, created_to=None):
+        # Newest-first summaries older than the `before` id. Returns (items, has_more),
+        # or (None, False) when the cursor id is unknown.
+        with self._open_index():
+            end = len(self._tokens)
+            if before:
+                cursor = self._entries.get(before)
+                if cursor is None:
+                    return None, False
+                end = bisect.bisect_left(self._seqs, cursor["seq"])
+            items = []
+            for pos in range(end - 1, -1, -1):
+                entry = self._entries.get(self._tokens[pos])
+                if entry is None or entry["seq"] != self._seqs[pos]:
+                    continue
+                if test_id is not None and str(entry.get("test_id")) != test_id:
+                    continue
+                created_at = entry.get("created_at", "")
+                if created_from is not None and created_at < created_from:
+                    continue
+                if created_to is not None and created_at >= created_to:
+                    continue
+                if len(items) >= limit:
+                    return items, True
+                items.append({k: v for k, v in entry.items() if k not in ("o", "n", "seq")})
+            return items, False
+
+    def count(self):
+        with self._open_index():
+            return len(self._entries)
+
+    def _append(self, record, summary):
+        # Caller holds file_lock(self.path). Journal first, then index: a crash in
+        # between leaves an unindexed tail that ensure_index() picks up.
+        line = encode_log_line(record)
+        with open(self.path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path, "ab") as f:
+            f.write(encode_log_line({**summary, "o": offset, "n": len(line)}))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, record):
+        with file_lock(self.path):
+            self._append(compact_attempt(record, self.snapshots), attempt_summary(record))
+            self._maybe_compact()
+
+    def delete(self, token):
+        with file_lock(self.path):
+            if not self.has(token):
+                return 0
+            self._append({"deleted": token}, {"deleted": token})
+            self._maybe_compact()
+            return 1
+
+    def clear(self):
+        with file_lock(self.path):
+            removed = self.count()
+            replace_file_lines(self.path, [])
+            replace_file_lines(self.index_path, [])
+            self.snapshots.prune(set())
+            return removed
+
+    def _maybe_compact(self):
+        # Caller holds file_lock(self.path).
+        with self._open_index():
+            if self._line_count - len(self._entries) <= self.compact_slack:
+                return
+        self._rewrite()
+
+    def _rewrite(self, test_ids=None):
+        # Caller holds file_lock(self.path). Writes only the live attempts to a new
+        # journal and index, compacting any still stored with full answers, then
+        # drops snapshots no live attempt refers to. With `test_ids`, positional
+        # test ids are replaced by the stable ones.
+        with self._open_index():
+            entries = list(self._entries.values())
+        journal_lines = []
+        index_lines = []
+        referenced = set()
+        offset = 0
+        with open(self.path, "rb") as f:
+            for entry in entries:
+                f.seek(entry["o"])
+                line = f.read(entry["n"])
+                if FULL_ANSWERS_MARKER in line:
+                    try:
+                        line = encode_log_line(compact_attempt(json.loads(line), self.snapshots))
+                    except ValueError:
+                        pass
+                summary = {k: v for k, v in entry.items() if k != "seq"}
+                test_id = stable_test_id(summary.get("test_id"), test_ids or [])
+                if test_id != summary.get("test_id"):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if isinstance(record, dict):
+                        line = encode_log_line({**record, "test_id": test_id})
+                        summary["test_id"] = test_id
+                referenced.update(m.decode("ascii") for m in SNAPSHOT_REF_RE.findall(line))
+                journal_lines.append(line)
+                index_lines.append(encode_log_line({**summary, "o": offset, "n": len(line)}))
+                offset += len(line)
+        replace_file_lines(self.path, journal_lines)
+        replace_file_lines(self.index_path, index_lines)
+        self.snapshots.prune(referenced)
+
+    def _read_version(self):
+        try:
+            with open(self.version_path, "r", encoding="ascii") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_version(self, version):
+        replace_file_lines(self.version_path, [f"{version}\n".encode("ascii")])
+
+    def migrate_test_ids(self, ids):
+        # One-time rewrite of attempts that still name their test by list position.
+        with file_lock(self.path):
+            if self._read_version() >= 1:
+                return
+            with self._open_index():
+                legacy = any(
+                    stable_test_id(e.get("test_id"), ids) != e.get("test_id") for e in self._entries.values()
+                )
+            if legacy:
+                self._rewrite(test_ids=ids)
+            self._write_version(1)
+
+    def compact_legacy(self):
+        # One-time rewrite of a journal holding attempts with full answers, from
+        # before snapshots (version 2).
+        with file_lock(self.path):
+            if self._read_version() >= 2:
+                return
+            with self._open_index():
+                entries = list(self._entries.values())
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                f = None
+            if f is not None:
+                with f:
+                    for entry in entries:
+                        f.seek(entry["o"])
+                        if FULL_ANSWERS_MARKER in f.read(entry["n"]):
+                            self._rewrite()
+                            break
+            self._write_version(2)
+
+    def ensure_index(self):
+        # Rebuild the index from the journal when it is missing or doesn't cover the
+        # whole journal (older format, or a crash between the two appends).
+        with file_lock(self.path):
+            try:
+                journal_size = os.path.getsize(self.path)
+            except OSError:
+                journal_size = 0
+            with self._open_index():
+                covered = self._journal_end
+            if covered == journal_size and (journal_size == 0 or os.path.exists(self.index_path)):
+                return
+            index_lines = []
+            offset = 0
+            if journal_size:
+                with open(self.path, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            record = None
+                        if isinstance(record, dict) and "id" not in record and record.get("deleted") is not None:
+                            summary = {"deleted": str(record["deleted"]).strip()}
+                        elif isinstance(record, dict) and str(record.get("id", "")).strip():
+                            summary = attempt_summary(record)
+                        else:
+                            summary = {"deleted": ""}
+                        index_lines.append(encode_log_line({**summary, "o": offset, "n": len(line)}))
+                        offset += len(line)
+            replace_file_lines(self.index_path, index_lines)
+
+
+def replace_file_lines(path, lines):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".jsonl", dir=directory)
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as out:
+            out.writelines(lines)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-    token_str = str(token).strip()
-    kept = []
-    removed = 0
-    for attempt in attempts:
-        if not isinstance(attempt, dict):
-            continue
-        if str(attempt.get("id", "")).strip() == token_str:
-            removed += 1
-            continue
-        kept.append(attempt)
 
-    if removed > 0:
-        attempts_data["attempts"] = kept
-        save_attempts(attempts_data)
+class SqliteSnapshotStore:
+    # SnapshotStore in the snapshots table. Unused rows are dropped in the same
+    # transaction that removes their last attempt.
+    def __init__(self, db):
+        self.db = db
+
+    def put(self, snapshot_id, body):
+        self.db.connect().execute(
+            "INSERT OR IGNORE INTO snapshots (id, body) VALUES (?, ?)", (snapshot_id, body.decode("utf-8"))
+        )
+
+    def get(self, snapshot_id):
+        row = self.db.connect().execute("SELECT body FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        return None if row is None else row[0].encode("utf-8")
+
+    def prune(self, conn):
+        conn.execute(
+            "DELETE FROM snapshots WHERE NOT EXISTS (SELECT 1 FROM attempts WHERE attempts.snapshot = snapshots.id)"
+        )
+
+
+class SqliteAttemptStore:
+    # Same interface as AttemptLog, backed by the attempts table. Only the newest
+    # max_attempts rows are kept.
+    def __init__(self, db, max_attempts, snapshots):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.snapshots = snapshots
+
+    def get(self, token):
+        row = self.db.connect().execute("SELECT body FROM attempts WHERE id = ?", (token,)).fetchone()
+        if row is None:
+            return None
+        try:
+            record = json.loads(row[0])
+        except ValueError:
+            return None
+        return expand_attempt(record, self.snapshots) if isinstance(record, dict) else record
+
+    def has(self, token):
+        return self.db.connect().execute("SELECT 1 FROM attempts WHERE id = ?", (token,)).fetchone() is not None
+
+    def page(self, before=None, limit=50, test_id=None, created_from=None, created_to=None):
+        conn = self.db.connect()
+        clauses = []
+        params = []
+        if before:
+            row = conn.execute("SELECT seq FROM attempts WHERE id = ?", (before,)).fetchone()
+            if row is None:
+                return None, False
+            clauses.append("seq < ?")
+            params.append(row[0])
+        if test_id is not None:
+            clauses.append("test_id = ?")
+            params.append(test_id)
+        if created_from is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            clauses.append("created_at < ?")
+            params.append(created_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(
+            f"SELECT id, created_at, test_id, test_title, score, total FROM attempts {where} ORDER BY seq DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        items = [
+            {"id": r[0], "created_at": r[1], "test_id": r[2], "test_title": r[3], "score": r[4], "total": r[5]}
+            for r in rows[:limit]
+        ]
+        return items, len(rows) > limit
+
+    def count(self):
+        return self.db.connect().execute("SELECT COUNT(*) FROM attempts").fetchone()[0]
+
+    def _insert(self, conn, record):
+        summary = attempt_summary(record)
+        test_id = summary["test_id"]
+        record = compact_attempt(record, self.snapshots)
+        conn.execute(
+            "INSERT OR REPLACE INTO attempts (id, created_at, test_id, test_title, score, total, body, snapshot) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (summary["id"], summary["created_at"], None if test_id is None else str(test_id),
+             summary["test_title"], summary["score"], summary["total"], encode_log_line(record).decode("utf-8"),
+             record.get("snapshot"))
+        )
+
+    def _prune(self, conn):
+        if conn.execute(
+            "DELETE FROM attempts WHERE seq <= (SELECT seq FROM attempts ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+            (self.max_attempts,)
+        ).rowcount:
+            self.snapshots.prune(conn)
+
+    def append(self, record):
+        with self.db.transaction() as conn:
+            self._insert(conn, record)
+            self._prune(conn)
+
+    def delete(self, token):
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM attempts WHERE id = ?", (token,)).rowcount
+            self.snapshots.prune(conn)
+            return removed
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM attempts").rowcount
+            self.snapshots.prune(conn)
+            return removed
+
+    def ensure_index(self):
+        # Indexes are part of the schema; kept for interface parity with AttemptLog.
+        pass
+
+    def migrate_test_ids(self, ids):
+        # One-time rewrite of rows that still name their test by list position
+        # (user_version 1). The column holds str(test_id), so only all-digit ones can be.
+        with self.db.transaction() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+            rows = conn.execute("SELECT id, body FROM attempts WHERE test_id NOT GLOB '*[^0-9]*'").fetchall()
+            for token, body in rows:
+                try:
+                    record = json.loads(body)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                test_id = stable_test_id(record.get("test_id"), ids)
+                if test_id != record.get("test_id"):
+                    conn.execute(
+                        "UPDATE attempts SET test_id = ?, body = ? WHERE id = ?",
+                        (test_id, encode_log_line({**record, "test_id": test_id}).decode("utf-8"), token)
+                    )
+            conn.execute("PRAGMA user_version = 1")
+
+    def compact_legacy(self):
+        # One-time rewrite of rows holding full answers, from before snapshots
+        # (user_version 2).
+        with self.db.transaction() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+                return
+            tokens = [r[0] for r in conn.execute("SELECT id FROM attempts WHERE snapshot IS NULL")]
+            rewritten = 0
+            for token in tokens:
+                row = conn.execute("SELECT body FROM attempts WHERE id = ?", (token,)).fetchone()
+                try:
+                    record = json.loads(row[0])
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                record = compact_attempt(record, self.snapshots)
+                if record.get("snapshot"):
+                    conn.execute(
+                        "UPDATE attempts SET body = ?, snapshot = ? WHERE id = ?",
+                        (encode_log_line(record).decode("utf-8"), record["snapshot"], token)
+                    )
+                    rewritten += 1
+            conn.execute("PRAGMA user_version = 2")
+        if rewritten:
+            # Give the space the full answers took back to the filesystem.
+            conn = self.db.connect()
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def migrate_attempts_to_sqlite(store):
+    # One-shot import of the attempt journal (which attempts.json was already
+    # migrated into) into an empty attempts table.
+    if not os.path.exists(ATTEMPTS_LOG_FILE):
+        return
+    with file_lock(ATTEMPTS_LOG_FILE), store.db.transaction() as conn:
+        if not os.path.exists(ATTEMPTS_LOG_FILE):
+            return
+        if conn.execute("SELECT 1 FROM attempts LIMIT 1").fetchone() is None:
+            log = AttemptLog(
+                ATTEMPTS_LOG_FILE, ATTEMPTS_INDEX_FILE, MAX_STORED_ATTEMPTS, ATTEMPTS_COMPACT_SLACK,
+                SnapshotStore(SNAPSHOTS_FOLDER)
+            )
+            log.ensure_index()
+            summaries, _ = log.page(limit=max(log.count(), 1))
+            for summary in reversed(summaries):
+                record = log.get(summary["id"])
+                if record is not None:
+                    store._insert(conn, record)
+            store._prune(conn)
+            # The imported rows haven't been through the one-time upgrades yet.
+            conn.execute("PRAGMA user_version = 0")
+        os.replace(ATTEMPTS_LOG_FILE, f"{ATTEMPTS_LOG_FILE}.migrated")
+        for path in (ATTEMPTS_INDEX_FILE, f"{ATTEMPTS_LOG_FILE}.version"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def create_attempt_store():
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteAttemptStore(SQLITE_DB, MAX_STORED_ATTEMPTS, SqliteSnapshotStore(SQLITE_DB))
+    return AttemptLog(
+        ATTEMPTS_LOG_FILE, ATTEMPTS_INDEX_FILE, MAX_STORED_ATTEMPTS, ATTEMPTS_COMPACT_SLACK,
+        SnapshotStore(SNAPSHOTS_FOLDER)
+    )
+
+
+ATTEMPT_LOG = create_attempt_store()
+
 
+def migrate_legacy_attempts():
+    # One-time move from the old rewrite-everything attempts.json to the journal.
+    if not os.path.exists(ATTEMPTS_FILE):
+        return
+    with file_lock(ATTEMPTS_LOG_FILE):
+        if not os.path.exists(ATTEMPTS_FILE) or os.path.exists(ATTEMPTS_LOG_FILE):
+            return
+        attempts = [a for a in load_attempts()["attempts"] if isinstance(a, dict)]
+        replace_file_lines(ATTEMPTS_LOG_FILE, [encode_log_line(a) for a in attempts[-MAX_STORED_ATTEMPTS:]])
+        os.replace(ATTEMPTS_FILE, f"{ATTEMPTS_FILE}.migrated")
+        # The new journal hasn't been through the one-time upgrades below yet.
+        try:
+            os.remove(f"{ATTEMPTS_LOG_FILE}.version")
+        except OSError:
+            pass
+
+
+migrate_legacy_attempts()
+if STORAGE_BACKEND == "sqlite":
+    migrate_attempts_to_sqlite(ATTEMPT_LOG)
+# Make sure the summary index covers the journal; this also loads it into memory once
+# at startup, after which requests only read newly appended index lines.
+ATTEMPT_LOG.ensure_index()
+ATTEMPT_LOG.migrate_test_ids(DATA_STORE.ids())
+ATTEMPT_LOG.compact_legacy()
+
+
+def persist_attempt(payload):
+    ATTEMPT_LOG.append(payload)
+
+def get_attempt_by_token(token):
+    return ATTEMPT_LOG.get(str(token).strip())
+
+def delete_attempt_by_token(token):
+    token_str = str(token).strip()
+    removed = ATTEMPT_LOG.delete(token_str)
     RESULT_CACHE.pop(token_str, None)
     return removed
 
 def clear_attempts():
-    attempts_data = load_attempts()
-    attempts = attempts_data.get("attempts", [])
-    if not isinstance(attempts, list):
-        attempts = []
-    removed = len(attempts)
-    attempts_data["attempts"] = []
-    save_attempts(attempts_data)
+    removed = ATTEMPT_LOG.clear()
     RESULT_CACHE.clear()
     return removed
 
@@ -152,12 +1985,9 @@ def save_uploaded_image(file_storage):
         return None
     if not is_allowed_image(file_storage.filename):
         return None
+    # Stored by content like AI imports, so re-uploading an image adds no file.
     original = secure_filename(file_storage.filename)
-    _, ext = os.path.splitext(original)
-    filename = f"{uuid4().hex}{ext.lower()}"
-    path = os.path.join(UPLOAD_FOLDER, filename)
-    file_storage.save(path)
-    return filename
+    return store_image_stream(file_storage.stream, original)
 
 def parse_ai_generated_question(raw_text):
     text = str(raw_text or "").strip()
@@ -268,31 +2098,6 @@ def merge_split_option_fragments(options, correct_index):
         new_correct = 0
     return merged, new_correct
 
-def extract_ollama_text(payload):
-    if not isinstance(payload, dict):
-        return ""
-    message = payload.get("message")
-    if isinstance(message, dict):
-        content = str(message.get("content", "")).strip()
-        if content:
-            return content
-    response_text = str(payload.get("response", "")).strip()
-    if response_text:
-        return response_text
-    choices = payload.get("choices")
-    if isinstance(choices, list) and choices:
-        first = choices[0]
-        if isinstance(first, dict):
-            msg = first.get("message")
-            if isinstance(msg, dict):
-                content = str(msg.get("content", "")).strip()
-                if content:
-                    return content
-            text = str(first.get("text", "")).strip()
-            if text:
-                return text
-    return ""
-
 def build_ai_summary_prompts(question, options, correct_answer, selected_answer, explanation):
     option_lines = "\n".join([f"{idx + 1}. {opt}" for idx, opt in enumerate(options)])
     system_prompt = (
@@ -314,16 +2119,359 @@ def build_ai_summary_prompts(question, options, correct_answer, selected_answer,
     )
     return system_prompt, user_prompt
 
-def delete_image_file(filename):
-    if not filename:
-        return
+def prepare_ai_summary(payload):
+    # Validates an explanation request and builds its prompts. Returns
+    # (prepared, None, None) or (None, error message, HTTP status); prepared["cached"]
+    # holds the stored summary when this exact prompt has been answered before.
+    #
+    # The question is named by test_id and question_index, with selected_index
+    # counted in the stored option order, so the prompt (and the cache key) is the
+    # same whichever order the options were shown in. Requests carrying the
+    # question itself are still accepted.
+    selected_index = payload.get("selected_index")
+    if payload.get("test_id") is not None:
+        test_id = resolve_test_id(payload.get("test_id"))
+        test = get_test(test_id) if test_id is not None else None
+        if test is None:
+            return None, "Test not found.", 404
+        questions = test.get("questions", [])
+        question_index = payload.get("question_index")
+        if (not isinstance(question_index, int) or not 0 <= question_index < len(questions)
+                or not isinstance(questions[question_index], dict)):
+            return None, "Question not found.", 404
+        stored = questions[question_index]
+        question = str(stored.get("question", "")).strip()
+        options = stored.get("options", [])
+        correct_index = stored.get("correct_index")
+        explanation = str(stored.get("explanation", "")).strip()
+    else:
+        question = str(payload.get("question", "")).strip()
+        options = payload.get("options", [])
+        correct_index = payload.get("correct_index")
+        explanation = str(payload.get("explanation", "")).strip()
+
+    if not question or not isinstance(options, list) or not options:
+        return None, "Invalid question payload.", 400
+
+    if not isinstance(correct_index, int) or not (0 <= correct_index < len(options)):
+        return None, "Invalid correct index.", 400
+
+    correct_answer = options[correct_index]
+    selected_answer = ""
+    if isinstance(selected_index, int) and 0 <= selected_index < len(options):
+        selected_answer = options[selected_index]
+
+    cfg = load_ai_config()
+    ollama_url = str(cfg.get("ollama_url", OLLAMA_URL)).strip().rstrip("/")
+    ollama_model = str(cfg.get("ollama_model", OLLAMA_MODEL)).strip()
+    system_prompt, user_prompt = build_ai_summary_prompts(
+        question=question,
+        options=options,
+        correct_answer=correct_answer,
+        selected_answer=selected_answer,
+        explanation=explanation
+    )
+    cache_key = ai_summary_cache_key(system_prompt, user_prompt, ollama_model)
+    cached = AI_SUMMARY_CACHE.get(cache_key)
+    return {
+        "ollama_url": ollama_url,
+        "ollama_model": ollama_model,
+        "system_prompt": system_prompt,
+        "user_prompt": user_prompt,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "cache_key": cache_key,
+        "cached": cached["summary"] if cached is not None else None
+    }, None, None
+
+def ai_summary_result(prepared, data, fb_data):
+    # Summary text from a chat response (and the /api/generate fallback, if one was
+    # made). Returns (summary, None) or (None, error body).
+    if isinstance(data, dict) and data.get("error"):
+        return None, {"error": str(data.get("error"))}
+    summary = extract_text(data)
+    thinking = extract_thinking(data)
+    if fb_data is not None:
+        summary = extract_text(fb_data)
+        thinking = thinking or extract_thinking(fb_data)
+
+    if not summary and thinking:
+        return None, {
+            "error": "Model returned only 'thinking' without a usable answer.",
+            "debug": {
+                "provider": "ollama",
+                "model": prepared["ollama_model"],
+                "endpoint": f"{prepared['ollama_url']}/api/chat",
+                "hint": "This model may be configured to output chain-of-thought only. Try a model that returns a 'response' or 'message.content'."
+            }
+        }
+
+    if not summary:
+        keys = ", ".join(sorted([str(k) for k in data.keys()])) if isinstance(data, dict) else "unknown"
+        return None, {
+            "error": f"No summary returned. Response keys: {keys}",
+            "debug": {
+                "provider": "ollama",
+                "model": prepared["ollama_model"],
+                "endpoint": f"{prepared['ollama_url']}/api/chat",
+                "hint": "Expected 'message.content' (chat) or 'response' (generate)."
+            }
+        }
+    return summary, None
+
+def cache_ai_summary(cache_key, text):
+    # Stores a finished streamed summary so the next identical request skips the model.
+    summary = text.strip()
+    if summary:
+        AI_SUMMARY_CACHE.set(cache_key, {"summary": summary})
+
+class ZipSink:
+    # Write-only target for zipfile.ZipFile that collects the archive's bytes until
+    # drain() hands them out. It has no tell()/seek(), so zipfile writes each entry
+    # in one pass with a trailing data descriptor.
+    def __init__(self):
+        self._chunks = []
+        self.buffered = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.buffered += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.buffered = 0
+        return data
+
+def iter_backup_zip(data):
+    # Yields a backup zip (data.json plus every upload) piece by piece, reading
+    # uploads from disk in EXPORT_CHUNK_SIZE blocks. Images are already compressed,
+    # so they are stored as-is.
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        body = json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+        info = zipfile.ZipInfo("data.json", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.file_size = len(body)
+        with zf.open(info, "w") as dest:
+            for start in range(0, len(body), EXPORT_CHUNK_SIZE):
+                dest.write(body[start:start + EXPORT_CHUNK_SIZE])
+                if sink.buffered:
+                    yield sink.drain()
+        del body
+
+        names = sorted(os.listdir(UPLOAD_FOLDER)) if os.path.isdir(UPLOAD_FOLDER) else []
+        for filename in names:
+            src = os.path.join(UPLOAD_FOLDER, filename)
+            try:
+                if not os.path.isfile(src):
+                    continue
+                info = zipfile.ZipInfo.from_file(src, arcname=f"uploads/{filename}")
+                f = open(src, "rb")
+            except OSError:
+                # Deleted since the listing.
+                continue
+            _, ext = os.path.splitext(filename)
+            info.compress_type = zipfile.ZIP_STORED if ext.lower() in ALLOWED_IMAGE_EXTENSIONS else zipfile.ZIP_DEFLATED
+            with f, zf.open(info, "w") as dest:
+                while True:
+                    chunk = f.read(EXPORT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    if sink.buffered >= EXPORT_CHUNK_SIZE:
+                        yield sink.drain()
+            if sink.buffered >= EXPORT_CHUNK_SIZE:
+                yield sink.drain()
+    if sink.buffered:
+        yield sink.drain()
+
+def store_image_bytes(image_bytes, original_name):
+    # Content-addressed: the same image always maps to the same file, which is only
+    # written the first time.
+    _, ext = os.path.splitext(secure_filename(original_name))
+    filename = f"{hashlib.sha256(image_bytes).hexdigest()[:40]}{ext.lower()}"
     path = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(path):
+    if not os.path.exists(path):
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=ext.lower(), dir=UPLOAD_FOLDER)
+        try:
+            os.chmod(tmp_path, 0o644)
+            with os.fdopen(fd, "wb") as out:
+                out.write(image_bytes)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    return filename
+
+def store_image_stream(src, original_name):
+    # store_image_bytes for a file-like source: copied to a temp file in blocks and
+    # hashed on the way, then kept only if that content isn't stored yet.
+    _, ext = os.path.splitext(secure_filename(original_name))
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=ext.lower(), dir=UPLOAD_FOLDER)
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f"{digest.hexdigest()[:40]}{ext.lower()}"
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return filename
+
+def restore_backup_images(zf, archive_names, tests):
+    # Copies the uploads referenced by an imported backup out of the zip. A name the
+    # app gave an upload is never reused for other bytes, so one that is already here
+    # (a backup of this install) is neither read nor written again. Others are stored
+    # content-addressed. Returns {name in backup: stored name, or "" when the backup
+    # doesn't contain a usable image}.
+    image_map = {}
+    for test in tests:
+        questions = test.get("questions", []) if isinstance(test, dict) else []
+        if not isinstance(questions, list):
+            continue
+        for q in questions:
+            if not isinstance(q, dict):
+                continue
+            original_name = str(q.get("image", "")).strip()
+            if not original_name or original_name in image_map:
+                continue
+            normalized_name = secure_filename(os.path.basename(original_name))
+            upload_member = f"uploads/{normalized_name}"
+            if not normalized_name or not is_allowed_image(normalized_name) or upload_member not in archive_names:
+                image_map[original_name] = ""
+            elif IMMUTABLE_IMAGE_RE.match(normalized_name) and os.path.exists(os.path.join(UPLOAD_FOLDER, normalized_name)):
+                image_map[original_name] = normalized_name
+            else:
+                with zf.open(upload_member) as src:
+                    image_map[original_name] = store_image_stream(src, normalized_name)
+    return image_map
+
+def image_variant_names(filename, width):
+    # Possible names of one resized copy: WebP, or the original format when Pillow
+    # can't write WebP or the resized image wouldn't be any smaller.
+    _, ext = os.path.splitext(filename)
+    return [f"{filename}.{width}{suffix}" for suffix in dict.fromkeys((".webp", ".jpg", ".png", ext.lower()))]
+
+def image_variant(filename, width):
+    # Name in THUMBNAIL_FOLDER of `filename` scaled down to at most `width` (rounded
+    # up to a THUMBNAIL_WIDTHS entry) pixels wide, created on first request. None
+    # means serve the original: no Pillow, a GIF (may be animated), or unreadable.
+    if Image is None or secure_filename(filename) != filename or not is_allowed_image(filename):
+        return None
+    _, ext = os.path.splitext(filename)
+    if ext.lower() == ".gif":
+        return None
+    width = next((w for w in THUMBNAIL_WIDTHS if w >= width), THUMBNAIL_WIDTHS[-1])
+    names = image_variant_names(filename, width)
+    for name in names:
+        if os.path.exists(os.path.join(THUMBNAIL_FOLDER, name)):
+            return name
+    src = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.isfile(src):
+        return None
+    with file_lock(os.path.join(THUMBNAIL_FOLDER, filename)):
+        for name in names:
+            if os.path.exists(os.path.join(THUMBNAIL_FOLDER, name)):
+                return name
         try:
-            os.remove(path)
+            return write_image_variant(src, filename, width)
+        except Exception:
+            app.logger.exception("Could not resize %s", filename)
+            return None
+
+def write_image_variant(src, filename, width):
+    with Image.open(src) as original:
+        img = ImageOps.exif_transpose(original)
+        img.thumbnail((width, width * 100))
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        buffer = io.BytesIO()
+        if pil_features.check("webp"):
+            suffix = ".webp"
+            img.save(buffer, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+        elif has_alpha:
+            suffix = ".png"
+            img.save(buffer, "PNG", optimize=True)
+        else:
+            suffix = ".jpg"
+            img.save(buffer, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    if buffer.tell() >= os.path.getsize(src):
+        # Already small and well compressed; keep a copy of the original instead.
+        _, suffix = os.path.splitext(filename)
+        suffix = suffix.lower()
+        with open(src, "rb") as f:
+            data = f.read()
+    else:
+        data = buffer.getvalue()
+    name = f"{filename}.{width}{suffix}"
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=suffix, dir=THUMBNAIL_FOLDER)
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(tmp_path, os.path.join(THUMBNAIL_FOLDER, name))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return name
+
+def delete_image_variants(filename):
+    names = [name for width in THUMBNAIL_WIDTHS for name in image_variant_names(filename, width)]
+    for name in names + [f"{filename}.lock"]:
+        try:
+            os.remove(os.path.join(THUMBNAIL_FOLDER, name))
         except OSError:
             pass
 
+def delete_image_files(filenames):
+    # Removes the uploads among `filenames` that no stored question uses. Callers hold
+    # DATA_STORE.lock() and have already saved their change, so the check sees it and
+    # no other save can start using a file while it is removed.
+    filenames = [f for f in filenames if f]
+    if not filenames:
+        return
+    in_use = DATA_STORE.images_in_use(filenames)
+    for filename in filenames:
+        if filename in in_use:
+            continue
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        delete_image_variants(filename)
+
+def delete_image_file(filename):
+    delete_image_files([filename])
+
 def parse_test_form(form, files):
     title = form.get('title', '').strip()
     questions = []
@@ -369,32 +2517,505 @@ def parse_test_form(form, files):
         remove_image = form.get(f'remove_image_{idx}', '').strip().lower() == "on"
         uploaded_file = files.get(f'image_{idx}')
 
-        image_filename = existing_image or ""
-        if remove_image:
-            image_filename = ""
-            delete_image_file(existing_image)
+        # Images removed or replaced here are deleted by the caller once the test
+        # is saved without them.
+        image_filename = existing_image or ""
+        if remove_image:
+            image_filename = ""
+
+        if uploaded_file and uploaded_file.filename:
+            new_image = save_uploaded_image(uploaded_file)
+            if new_image:
+                image_filename = new_image
+
+        questions.append({
+            "question": q,
+            "options": opts,
+            "correct_index": correct,
+            "explanation": explanation,
+            "image": image_filename
+        })
+
+        idx += 1
+
+    return {
+        "title": title,
+        "questions": questions
+    }
+
+
+def extract_question_cached(image_bytes, ollama_url, ollama_model, background=False):
+    # extract_question_from_image, reusing the draft from an earlier import of the
+    # same image with the same model and prompts. Returns (question, error, status, cached).
+    # Raises OllamaOverloaded when admission control turns the call away; background
+    # callers queue for a model slot instead.
+    cache_key = ai_import_cache_key(hashlib.sha256(image_bytes).hexdigest(), ollama_model)
+    cached = AI_IMPORT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached, None, None, True
+    parsed, error, status = AI_CALLS.do(
+        ("import", cache_key),
+        lambda: extract_question_from_image(image_bytes, ollama_url, ollama_model),
+        wait=background
+    )
+    if parsed is not None:
+        AI_IMPORT_CACHE.set(cache_key, parsed)
+    return parsed, error, status, False
+
+def extract_question_from_image(image_bytes, ollama_url, ollama_model):
+    # Two-pass extraction: pass 1 reads the MCQ from the image, pass 2 OCR-corrects
+    # that draft against the image. Returns (question, None, None) or
+    # (None, error message, HTTP status).
+    system_prompt = (
+        "You extract one multiple-choice question from an image. "
+        "Return strict JSON only, with keys: question, options, correct_index, explanation. "
+        "Rules: options must be an array of strings (2+ items), correct_index is 0-based integer, "
+        "each option must be one complete choice exactly as shown, and never split one choice into multiple options. "
+        "explanation must be extracted verbatim from the image if present, with no paraphrasing or rewriting. "
+        "If no explanation text is present in the image, use an empty string for explanation. "
+        "Do not include markdown."
+    )
+    user_prompt = (
+        "Read the uploaded image and extract exactly one complete MCQ from it. "
+        "If the image has multiple items, pick the clearest single question. "
+        "Preserve option boundaries from labels like A/B/C/D or 1/2/3/4 and do not break one option into fragments. "
+        "Copy the explanation exactly as written in the image. "
+        "Output JSON only."
+    )
+
+    image_b64 = base64.b64encode(image_bytes).decode("ascii")
+
+    try:
+        first_payload = OLLAMA_CLIENT.chat(
+            ollama_url,
+            ollama_model,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt, "images": [image_b64]}
+            ],
+            AI_IMPORT_OPTIONS
+        )
+    except OllamaUnavailable:
+        return None, "AI server is unavailable.", 502
+    except OllamaBadStatus:
+        return None, "AI server error. Use a vision-capable Ollama model (e.g., llava).", 502
+    except OllamaInvalidResponse:
+        return None, "AI server returned invalid response.", 502
+
+    first_content = extract_text(first_payload)
+    first_parsed = parse_ai_generated_question(first_content)
+    if not first_parsed:
+        return None, "Could not parse a valid question from pass 1. Try a clearer image or different model.", 422
+
+    second_system_prompt = (
+        "You are correcting OCR mistakes in an extracted MCQ using the original image. "
+        "Return strict JSON only with keys: question, options, correct_index, explanation. "
+        "Keep text faithful to the image. Keep correct_index aligned with options. "
+        "Do not split one answer option into multiple options; preserve each choice as a complete unit. "
+        "Explanation must remain verbatim from the image (correct OCR only), with no paraphrasing."
+    )
+    second_user_prompt = (
+        "Re-read the image and correct spelling/wording mistakes in this extracted draft JSON. "
+        "If draft is already correct, return equivalent corrected JSON. "
+        "Do not rewrite explanation style; only OCR-correct it against the image.\n\n"
+        f"Draft JSON:\n{json.dumps(first_parsed, ensure_ascii=False)}"
+    )
+
+    try:
+        second_payload = OLLAMA_CLIENT.chat(
+            ollama_url,
+            ollama_model,
+            [
+                {"role": "system", "content": second_system_prompt},
+                {"role": "user", "content": second_user_prompt, "images": [image_b64]}
+            ],
+            AI_IMPORT_OPTIONS
+        )
+        second_parsed = parse_ai_generated_question(extract_text(second_payload))
+    except OllamaError:
+        second_parsed = None
+
+    return second_parsed or first_parsed, None, None
+
+class ImportJobs:
+    # Batch AI image imports. Submitted images are spooled to disk and run through
+    # extract_question_from_image on a bounded worker pool, independent of the request
+    # (or browser tab) that submitted them. When every image has been processed the
+    # extracted questions are appended to the test in one write. Jobs run in the
+    # process that accepted them; every change is also written to <folder>/<id>.json so
+    # other worker processes can answer status requests. A job whose process died
+    # reports as failed.
+    def __init__(self, folder, workers, retention):
+        self.folder = folder
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-import")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs = OrderedDict()
+        self._remove_stale_spool()
+
+    def _remove_stale_spool(self):
+        # Spool directories left behind by a previous run.
+        if not os.path.isdir(self.folder):
+            return
+        cutoff = time.time() - self.retention
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _status_path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    def submit(self, test_id, files, attach_images, ollama_url, ollama_model):
+        job_id = uuid4().hex
+        job_dir = os.path.join(self.folder, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        items = []
+        for idx, file_storage in enumerate(files):
+            name = secure_filename(file_storage.filename or "")
+            item = {"name": file_storage.filename or f"image {idx + 1}", "status": "queued", "error": None, "question": None, "path": None}
+            if not name or not is_allowed_image(name):
+                item.update(status="failed", error="Unsupported image format.")
+            else:
+                path = os.path.join(job_dir, f"{idx}{os.path.splitext(name)[1].lower()}")
+                file_storage.save(path)
+                if os.path.getsize(path) == 0:
+                    os.remove(path)
+                    item.update(status="failed", error="Image file is empty.")
+                else:
+                    item["path"] = path
+            items.append(item)
+
+        pending = [idx for idx, item in enumerate(items) if item["path"]]
+        job = {
+            "id": job_id,
+            "test_id": test_id,
+            "status": "running",
+            "error": None,
+            "added": 0,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "attach_images": attach_images,
+            "ollama_url": ollama_url,
+            "ollama_model": ollama_model,
+            "dir": job_dir,
+            "items": items,
+            "remaining": len(pending),
+            "version": 0
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+            self._touch(job)
+        if not pending:
+            self._commit(job)
+        for idx in pending:
+            self._executor.submit(self._run_item, job, idx)
+        return self.snapshot(job_id)
+
+    def _touch(self, job):
+        # Caller holds self._lock.
+        job["version"] += 1
+        self._changed.notify_all()
+        try:
+            write_json_atomic(
+                self._status_path(job["id"]),
+                {"job": self._snapshot(job), "version": job["version"], "pid": os.getpid()}
+            )
+        except OSError:
+            app.logger.warning("Could not write status of AI import job %s", job["id"])
+
+    def _run_item(self, job, idx):
+        item = job["items"][idx]
+        with self._lock:
+            item["status"] = "running"
+            self._touch(job)
+        try:
+            with open(item["path"], "rb") as f:
+                image_bytes = f.read()
+            parsed, error, _, _ = extract_question_cached(image_bytes, job["ollama_url"], job["ollama_model"], background=True)
+        except Exception:
+            app.logger.exception("AI import job %s failed on %s", job["id"], item["name"])
+            parsed, error = None, "Unexpected error."
+
+        image_name = ""
+        try:
+            if parsed is not None and job["attach_images"]:
+                image_name = store_image_bytes(image_bytes, item["path"])
+            os.remove(item["path"])
+        except OSError:
+            pass
+
+        with self._lock:
+            if parsed is not None:
+                item["status"] = "done"
+                item["question"] = {
+                    "question": parsed["question"],
+                    "options": parsed["options"],
+                    "correct_index": parsed["correct_index"],
+                    "explanation": parsed.get("explanation", ""),
+                    "image": image_name
+                }
+            else:
+                item["status"] = "failed"
+                item["error"] = error
+            job["remaining"] -= 1
+            last = job["remaining"] == 0
+            self._touch(job)
+        if last:
+            self._commit(job)
+
+    def _commit(self, job):
+        # One write for the whole batch, in submission order.
+        questions = [item["question"] for item in job["items"] if item["question"] is not None]
+        error = None
+        if questions:
+            try:
+                with DATA_STORE.lock():
+                    test = DATA_STORE.get(job["test_id"])
+                    if test is None:
+                        error = "Test not found"
+                    else:
+                        test = copy.deepcopy(test)
+                        if not isinstance(test.get("questions"), list):
+                            test["questions"] = []
+                        test["questions"].extend(questions)
+                        DATA_STORE.put(test)
+            except Exception:
+                app.logger.exception("Could not save AI import job %s", job["id"])
+                error = "Could not save imported questions."
+            if error:
+                with DATA_STORE.lock():
+                    delete_image_files([question["image"] for question in questions])
+        shutil.rmtree(job["dir"], ignore_errors=True)
+        with self._lock:
+            job["status"] = "failed" if error else "done"
+            job["error"] = error
+            job["added"] = 0 if error else len(questions)
+            job["finished_at"] = datetime.now(timezone.utc).isoformat()
+            job["finished"] = time.time()
+            self._touch(job)
+
+    def _prune(self):
+        # Caller holds self._lock.
+        cutoff = time.time() - self.retention
+        for job_id in [j["id"] for j in self._jobs.values() if j.get("finished", cutoff) < cutoff]:
+            del self._jobs[job_id]
+            try:
+                os.remove(self._status_path(job_id))
+            except OSError:
+                pass
+
+    def _snapshot(self, job):
+        # Caller holds self._lock.
+        items = [{"name": item["name"], "status": item["status"], "error": item["error"]} for item in job["items"]]
+        return {
+            "id": job["id"],
+            "test_id": job["test_id"],
+            "status": job["status"],
+            "error": job["error"],
+            "total": len(items),
+            "completed": sum(1 for item in items if item["status"] in ("done", "failed")),
+            "failed": sum(1 for item in items if item["status"] == "failed"),
+            "added": job["added"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "items": items
+        }
+
+    def _read_status(self, job_id):
+        # (snapshot, version) of a job run by another worker process.
+        if not IMPORT_JOB_ID_RE.match(job_id):
+            return None, None
+        path = self._status_path(job_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                status = json.load(f)
+            mtime = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None, None
+        if not isinstance(status, dict) or not isinstance(status.get("job"), dict):
+            return None, None
+        job = status["job"]
+        if job.get("status") == "running" and (
+            not process_alive(status.get("pid")) or mtime < time.time() - self.retention
+        ):
+            job = {**job, "status": "failed", "error": "The import was interrupted by a server restart."}
+        return job, status.get("version")
+
+    def snapshot(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        return self._read_status(job_id)[0]
+
+    def wait(self, job_id, seen_version, timeout):
+        # Blocks until the job changes past seen_version (or timeout); returns
+        # (snapshot, version), or (None, None) for an unknown job. Jobs owned by
+        # another process are polled through their status file.
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._changed.wait_for(lambda: job["version"] != seen_version, timeout=timeout)
+                return self._snapshot(job), job["version"]
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot, version = self._read_status(job_id)
+            if snapshot is None or version != seen_version or snapshot["status"] != "running":
+                return snapshot, version
+            if time.monotonic() >= deadline:
+                return snapshot, version
+            time.sleep(IMPORT_JOB_POLL_INTERVAL)
+
+
+def process_alive(pid):
+    if not isinstance(pid, int) or os.name != "posix":
+        # os.kill(pid, 0) would terminate the process on Windows.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+IMPORT_JOBS = ImportJobs(AI_IMPORT_JOBS_FOLDER, AI_IMPORT_WORKERS, AI_IMPORT_JOB_RETENTION)
+
+
+class TestSessions:
+    # Server-side shuffles for the test taker. A session fixes one order of a test's
+    # questions and of each question's options, drawn from its seed; the browser gets
+    # questions in that order, a page at a time and without answers, and take_test maps
+    # submitted positions back to the test. Sessions never change once created, so
+    # they are written once to <folder>/<id>.json (readable by every worker) and cached.
+    def __init__(self, folder, ttl):
+        self.folder = folder
+        self.ttl = ttl
+        self._cache = LRUCache(256, 64 * 1024 * 1024)
+        self._next_prune = 0.0
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.folder, f"{session_id}.json")
+
+    def create(self, test_id, test, seed):
+        rng = random.Random(seed)
+        questions = test.get("questions", [])
+        order = list(range(len(questions)))
+        rng.shuffle(order)
+        option_orders = []
+        for idx in order:
+            options = questions[idx].get("options") if isinstance(questions[idx], dict) else None
+            perm = list(range(len(options) if isinstance(options, list) else 0))
+            rng.shuffle(perm)
+            option_orders.append(perm)
+        session = {
+            "id": uuid4().hex,
+            "test_id": test_id,
+            "seed": seed,
+            "created_at": time.time(),
+            "order": order,
+            "options": option_orders
+        }
+        body = json_bytes(session)
+        replace_file_lines(self._path(session["id"]), [body])
+        self._cache.set(session["id"], session, size=len(body))
+        self._prune()
+        return session
+
+    def get(self, session_id):
+        session_id = str(session_id or "")
+        if not TEST_SESSION_ID_RE.match(session_id):
+            return None
+        session = self._cache.get(session_id)
+        if session is None:
+            try:
+                with open(self._path(session_id), "rb") as f:
+                    body = f.read()
+                session = json.loads(body)
+            except (OSError, ValueError):
+                return None
+            if not isinstance(session, dict):
+                return None
+            self._cache.set(session_id, session, size=len(body))
+        if session.get("created_at", 0) + self.ttl < time.time():
+            return None
+        return session
+
+    def _prune(self):
+        # Expired session files, looked for at most once a minute per worker.
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                if os.path.getmtime(path) + self.ttl < now:
+                    os.remove(path)
+            except OSError:
+                pass
+
 
-        if uploaded_file and uploaded_file.filename:
-            new_image = save_uploaded_image(uploaded_file)
-            if new_image:
-                if existing_image and existing_image != new_image:
-                    delete_image_file(existing_image)
-                image_filename = new_image
+def session_option_order(session, position, options):
+    # Original option indices in the order shown at `position`. If the question's
+    # options were edited to a different count mid-session, they are shown unshuffled.
+    perm = session["options"][position]
+    return perm if sorted(perm) == list(range(len(options))) else list(range(len(options)))
 
-        questions.append({
-            "question": q,
-            "options": opts,
-            "correct_index": correct,
-            "explanation": explanation,
-            "image": image_filename
+def session_questions(session, test, offset, limit):
+    # Answer-free questions at positions [offset, offset + limit) of the session.
+    questions = test.get("questions", [])
+    items = []
+    for position in range(offset, min(offset + limit, len(session["order"]))):
+        idx = session["order"][position]
+        q = questions[idx] if idx < len(questions) and isinstance(questions[idx], dict) else None
+        if q is None:
+            # Removed from the test since the session started.
+            items.append({"position": position, "index": idx, "question": "", "options": [], "image": ""})
+            continue
+        options = q.get("options", []) if isinstance(q.get("options"), list) else []
+        items.append({
+            "position": position,
+            "index": idx,
+            "question": q.get("question", ""),
+            "options": [options[i] for i in session_option_order(session, position, options)],
+            "image": q.get("image", "")
         })
+    return items
 
-        idx += 1
+def session_selections(session, test, form):
+    # {question index: original option index} from a session form, which names each
+    # answer s<position> and gives the option's position as shown.
+    questions = test.get("questions", [])
+    selections = {}
+    for position, idx in enumerate(session["order"]):
+        raw = form.get(f"s{position}")
+        if raw in (None, "") or idx >= len(questions) or not isinstance(questions[idx], dict):
+            continue
+        try:
+            shown = int(raw)
+        except ValueError:
+            continue
+        options = questions[idx].get("options", []) if isinstance(questions[idx].get("options"), list) else []
+        order = session_option_order(session, position, options)
+        if 0 <= shown < len(order):
+            selections[idx] = order[shown]
+    return selections
 
-    return {
-        "title": title,
-        "questions": questions
-    }
+
+TEST_SESSIONS = TestSessions(TEST_SESSIONS_FOLDER, TEST_SESSION_TTL)
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -407,45 +3028,65 @@ def index():
 @app.route("/new", methods=["GET", "POST"])
 def new_test():
     if request.method == "POST":
-        data = load_data()
-        test = parse_test_form(request.form, request.files)
-        data["tests"].append(test)
-        save_data(data)
+        test = {"id": new_test_id(), **parse_test_form(request.form, request.files)}
+        with DATA_STORE.lock():
+            DATA_STORE.put(test)
         return redirect(url_for("index"))
     return render_template("test_editor.html", test=None)
 
-@app.route("/edit/<int:test_id>", methods=["GET", "POST"])
+@app.route("/edit/<test_id>", methods=["GET", "POST"])
 def edit_test(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    resolved_id = resolve_test_id(test_id)
+    if resolved_id is None:
         return "Test not found", 404
+    if resolved_id != test_id and request.method == "GET":
+        return redirect(url_for("edit_test", test_id=resolved_id))
+    test_id = resolved_id
 
     if request.method == "POST":
-        test = parse_test_form(request.form, request.files)
-        data["tests"][test_id] = test
-        save_data(data)
+        test = {"id": test_id, **parse_test_form(request.form, request.files)}
+        with DATA_STORE.lock():
+            previous = DATA_STORE.get(test_id)
+            if previous is None:
+                delete_image_files(test_images(test))
+                return "Test not found", 404
+            DATA_STORE.put(test)
+            delete_image_files(test_images(previous))
         return redirect(url_for("index"))
 
-    return render_template("test_editor.html", test=data["tests"][test_id])
+    return render_template("test_editor.html", test=get_test(test_id))
 
-@app.route("/take/<int:test_id>", methods=["GET", "POST"])
+@app.route("/take/<test_id>", methods=["GET", "POST"])
 def take_test(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    resolved_id = resolve_test_id(test_id)
+    if resolved_id is None:
         return "Test not found", 404
-
-    test = data["tests"][test_id]
+    if resolved_id != test_id and request.method == "GET":
+        return redirect(url_for("take_test", test_id=resolved_id))
+    test_id = resolved_id
+    test = get_test(test_id)
 
     if request.method == "POST":
         user_answers = []
         correct_count = 0
+        # Answers come by shown position from a shuffled session (test.js), or by
+        # question and option index.
+        session = None
+        if request.form.get("session"):
+            session = TEST_SESSIONS.get(request.form.get("session"))
+            if session is None or session["test_id"] != test_id:
+                return "Test session expired. Please retake the test.", 400
+            selections = session_selections(session, test, request.form)
 
         for i, q in enumerate(test["questions"]):
-            selected_raw = request.form.get(f"q{i}")
-            try:
-                selected = int(selected_raw) if selected_raw not in (None, "") else None
-            except ValueError:
-                selected = None
+            if session is not None:
+                selected = selections.get(i)
+            else:
+                selected_raw = request.form.get(f"q{i}")
+                try:
+                    selected = int(selected_raw) if selected_raw not in (None, "") else None
+                except ValueError:
+                    selected = None
 
             correct = q["correct_index"]
             is_correct = selected == correct
@@ -474,54 +3115,167 @@ def take_test(test_id):
             "answers": user_answers
         }
         persist_attempt(result_payload)
-        RESULT_CACHE[token] = result_payload
-        # Basic cleanup to prevent unlimited growth
-        while len(RESULT_CACHE) > 50:
-            oldest_key = next(iter(RESULT_CACHE))
-            RESULT_CACHE.pop(oldest_key, None)
+        RESULT_CACHE.set(token, json_bytes(result_payload))
         return redirect(url_for("results_page", token=token))
 
     return render_template("test_taker.html", test=test, test_id=test_id)
 
-@app.route("/flashcards/<int:test_id>")
+@app.route("/flashcards/<test_id>")
 def flashcards_page(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    resolved_id = resolve_test_id(test_id)
+    if resolved_id is None:
         return "Test not found", 404
+    if resolved_id != test_id:
+        return redirect(url_for("flashcards_page", test_id=resolved_id))
     return render_template("flashcards.html", test_id=test_id)
 
 
 @app.route("/api/tests", methods=["GET"])
 def api_list_tests():
-    data = load_data()
-    tests = [
-        {
-            "id": idx,
-            "title": test.get("title", "Untitled"),
-            "question_count": len(test.get("questions", [])) if isinstance(test.get("questions", []), list) else 0
-        }
-        for idx, test in enumerate(data["tests"])
-    ]
-    return jsonify({"tests": tests})
-
-
-@app.route("/api/tests/<int:test_id>")
+    # Summaries come from write-time metadata, never from the question bodies.
+    summaries = [{k: v for k, v in s.items() if k != "images"} for s in DATA_STORE.summaries()]
+    body = json_bytes({"tests": summaries})
+    response = json_response(body)
+    response.set_etag(hashlib.sha256(body).hexdigest())
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def test_payload(test_id, answers=True):
+    # (test, JSON body for /api/tests/<id>, hash of the full body), or None. The hash
+    # names this snapshot of the test in normalized results; store versions can't,
+    # since they differ by backend and worker. Without answers, the body leaves out
+    # every question's correct_index and explanation.
+    test, version = DATA_STORE.get_versioned(test_id)
+    if test is None:
+        return None
+    cache_key = (test_id, version)
+    cached = TEST_PAYLOAD_CACHE.get(cache_key)
+    if cached is None:
+        # include id for reference on the client
+        body = json_bytes({**test, "id": test_id})
+        cached = (body, hashlib.sha256(body).hexdigest()[:16])
+        TEST_PAYLOAD_CACHE.set(cache_key, cached, size=len(body))
+    if answers:
+        return test, cached[0], cached[1]
+    body = TEST_PAYLOAD_CACHE.get((*cache_key, "no-answers"))
+    if body is None:
+        questions = test.get("questions", [])
+        body = json_bytes({**test, "id": test_id, "questions": [
+            {k: v for k, v in q.items() if k not in ANSWER_FIELDS} if isinstance(q, dict) else q
+            for q in (questions if isinstance(questions, list) else [])
+        ]})
+        TEST_PAYLOAD_CACHE.set((*cache_key, "no-answers"), body, size=len(body))
+    return test, body, cached[1]
+
+@app.route("/api/tests/<test_id>")
 def api_get_test(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    test_id = resolve_test_id(test_id)
+    # Answers only for the views that show them (flashcards, results); the test page
+    # uses a session instead. This keeps them out of casual view, not from a client
+    # that asks: the app has no accounts to tell takers from authors.
+    answers = request.args.get("answers") == "1"
+    payload = test_payload(test_id, answers) if test_id is not None else None
+    if payload is None:
         return jsonify({"error": "Test not found"}), 404
+    _, body, content_hash = payload
+    # ?v=<hash> asks for one snapshot (see normalized_result); that URL never changes
+    # meaning, so the browser may keep it.
+    requested = request.args.get("v")
+    if requested and requested != content_hash:
+        return jsonify({"error": "Test has changed"}), 409
+    response = json_response(body)
+    response.set_etag(content_hash if answers else f"{content_hash}-no-answers")
+    if requested:
+        response.cache_control.private = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/api/tests/<test_id>/sessions", methods=["POST"])
+def api_create_test_session(test_id):
+    test_id = resolve_test_id(test_id)
+    test = get_test(test_id) if test_id is not None else None
+    if test is None:
+        return jsonify({"error": "Test not found"}), 404
+    payload = request.get_json(silent=True) or {}
+    # A given seed reproduces the same order for the same test.
+    seed = str(payload.get("seed") or uuid4().hex[:16])[:64]
+    session = TEST_SESSIONS.create(test_id, test, seed)
+    return jsonify({
+        "session_id": session["id"],
+        "test_id": test_id,
+        "title": test.get("title", ""),
+        "seed": seed,
+        "total": len(session["order"]),
+        "page_size": TEST_SESSION_PAGE_SIZE,
+        "questions": session_questions(session, test, 0, TEST_SESSION_PAGE_SIZE)
+    }), 201
+
+def load_test_session(session_id):
+    # (session, test) or (None, error response).
+    session = TEST_SESSIONS.get(session_id)
+    if session is None:
+        return None, (jsonify({"error": "Test session not found or expired."}), 404)
+    test = get_test(session["test_id"])
+    if test is None:
+        return None, (jsonify({"error": "Test not found"}), 404)
+    return session, test
+
+@app.route("/api/sessions/<session_id>/questions")
+def api_test_session_questions(session_id):
+    session, test = load_test_session(session_id)
+    if session is None:
+        return test
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(max(1, request.args.get("limit", TEST_SESSION_PAGE_SIZE, type=int)), TEST_SESSION_MAX_PAGE_SIZE)
+    return jsonify({
+        "offset": offset,
+        "total": len(session["order"]),
+        "questions": session_questions(session, test, offset, limit)
+    })
 
-    test = data["tests"][test_id]
-    # include id for reference on the client
-    return jsonify({"id": test_id, **test})
+@app.route("/api/sessions/<session_id>/check", methods=["POST"])
+def api_test_session_check(session_id):
+    # Answer key and explanation for one question, for the taker's "Check Answer".
+    session, test = load_test_session(session_id)
+    if session is None:
+        return test
+    payload = request.get_json(silent=True) or {}
+    position = payload.get("position")
+    if not isinstance(position, int) or not 0 <= position < len(session["order"]):
+        return jsonify({"error": "Question not found"}), 404
+    questions = test.get("questions", [])
+    idx = session["order"][position]
+    q = questions[idx] if idx < len(questions) and isinstance(questions[idx], dict) else None
+    if q is None:
+        return jsonify({"error": "Question not found"}), 404
+    options = q.get("options", []) if isinstance(q.get("options"), list) else []
+    # Nothing is revealed until the taker has picked one of the shown options.
+    selected = payload.get("selected")
+    if not isinstance(selected, int) or isinstance(selected, bool) or not 0 <= selected < len(options):
+        return jsonify({"error": "Select an answer first."}), 400
+    order = session_option_order(session, position, options)
+    correct = q.get("correct_index")
+    correct_index = order.index(correct) if correct in order else None
+    return jsonify({
+        "position": position,
+        "correct_index": correct_index,
+        "is_correct": selected == correct_index,
+        "explanation": q.get("explanation", ""),
+        # Stored option index per shown option, for requests that name options by it.
+        "option_order": order
+    })
 
-@app.route("/api/tests/<int:test_id>/questions/<int:question_idx>/append-explanation", methods=["POST"])
+@app.route("/api/tests/<test_id>/questions/<int:question_idx>/append-explanation", methods=["POST"])
 def api_append_explanation(test_id, question_idx):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    test_id = resolve_test_id(test_id)
+    test = get_test(test_id) if test_id is not None else None
+    if test is None:
         return jsonify({"error": "Test not found"}), 404
 
-    test = data["tests"][test_id]
     questions = test.get("questions", [])
     if not isinstance(questions, list) or question_idx < 0 or question_idx >= len(questions):
         return jsonify({"error": "Question not found"}), 404
@@ -533,20 +3287,27 @@ def api_append_explanation(test_id, question_idx):
     if len(ai_summary) > 4000:
         return jsonify({"error": "Summary is too long."}), 400
 
-    question = questions[question_idx]
-    if not isinstance(question, dict):
+    if not isinstance(questions[question_idx], dict):
         return jsonify({"error": "Invalid question format."}), 400
 
     # Replace existing explanation with the AI summary.
     updated = ai_summary
-    question["explanation"] = updated
-    save_data(data)
+    with DATA_STORE.lock():
+        test = DATA_STORE.get(test_id)
+        if test is None:
+            return jsonify({"error": "Test not found"}), 404
+        test = copy.deepcopy(test)
+        questions = test.get("questions", [])
+        if not isinstance(questions, list) or question_idx >= len(questions) or not isinstance(questions[question_idx], dict):
+            return jsonify({"error": "Question not found"}), 404
+        questions[question_idx]["explanation"] = updated
+        DATA_STORE.put(test)
     return jsonify({"success": True, "explanation": updated})
 
-@app.route("/api/tests/<int:test_id>/ai-import-question", methods=["POST"])
+@app.route("/api/tests/<test_id>/ai-import-question", methods=["POST"])
 def api_ai_import_question_from_image(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    test_id = resolve_test_id(test_id)
+    if test_id is None:
         return jsonify({"error": "Test not found"}), 404
 
     image_file = request.files.get("image")
@@ -562,117 +3323,24 @@ def api_ai_import_question_from_image(test_id):
     attach_source_image = str(request.form.get("attach_source_image", "on")).strip().lower() in ("on", "true", "1", "yes")
     source_image_name = ""
     if attach_source_image:
-        image_file.stream.seek(0)
-        saved = save_uploaded_image(image_file)
-        if saved:
-            source_image_name = saved
+        source_image_name = store_image_bytes(image_bytes, image_file.filename)
 
     cfg = load_ai_config()
     ollama_url = str(cfg.get("ollama_url", OLLAMA_URL)).strip().rstrip("/")
     ollama_model = str(cfg.get("ollama_model", OLLAMA_MODEL)).strip()
 
-    system_prompt = (
-        "You extract one multiple-choice question from an image. "
-        "Return strict JSON only, with keys: question, options, correct_index, explanation. "
-        "Rules: options must be an array of strings (2+ items), correct_index is 0-based integer, "
-        "each option must be one complete choice exactly as shown, and never split one choice into multiple options. "
-        "explanation must be extracted verbatim from the image if present, with no paraphrasing or rewriting. "
-        "If no explanation text is present in the image, use an empty string for explanation. "
-        "Do not include markdown."
-    )
-    user_prompt = (
-        "Read the uploaded image and extract exactly one complete MCQ from it. "
-        "If the image has multiple items, pick the clearest single question. "
-        "Preserve option boundaries from labels like A/B/C/D or 1/2/3/4 and do not break one option into fragments. "
-        "Copy the explanation exactly as written in the image. "
-        "Output JSON only."
-    )
-
-    image_b64 = base64.b64encode(image_bytes).decode("ascii")
-
-    try:
-        first_response = requests.post(
-            f"{ollama_url}/api/chat",
-            json={
-                "model": ollama_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt, "images": [image_b64]}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "num_predict": 400,
-                    "top_p": 0.9
-                }
-            },
-            timeout=OLLAMA_TIMEOUT
-        )
-    except requests.RequestException:
-        if source_image_name:
-            delete_image_file(source_image_name)
-        return jsonify({"error": "AI server is unavailable."}), 502
-
-    if first_response.status_code != 200:
-        if source_image_name:
-            delete_image_file(source_image_name)
-        return jsonify({"error": "AI server error. Use a vision-capable Ollama model (e.g., llava)."}), 502
-
     try:
-        first_payload = first_response.json() if first_response.content else {}
-    except ValueError:
-        if source_image_name:
+        final_parsed, error, status, cached = extract_question_cached(image_bytes, ollama_url, ollama_model)
+    except OllamaOverloaded as exc:
+        with DATA_STORE.lock():
             delete_image_file(source_image_name)
-        return jsonify({"error": "AI server returned invalid response."}), 502
-
-    first_content = extract_ollama_text(first_payload)
-    first_parsed = parse_ai_generated_question(first_content)
-    if not first_parsed:
-        if source_image_name:
+        body, status, headers = ai_error(exc)
+        return jsonify(body), status, headers
+    if final_parsed is None:
+        with DATA_STORE.lock():
             delete_image_file(source_image_name)
-        return jsonify({"error": "Could not parse a valid question from pass 1. Try a clearer image or different model."}), 422
-
-    second_system_prompt = (
-        "You are correcting OCR mistakes in an extracted MCQ using the original image. "
-        "Return strict JSON only with keys: question, options, correct_index, explanation. "
-        "Keep text faithful to the image. Keep correct_index aligned with options. "
-        "Do not split one answer option into multiple options; preserve each choice as a complete unit. "
-        "Explanation must remain verbatim from the image (correct OCR only), with no paraphrasing."
-    )
-    second_user_prompt = (
-        "Re-read the image and correct spelling/wording mistakes in this extracted draft JSON. "
-        "If draft is already correct, return equivalent corrected JSON. "
-        "Do not rewrite explanation style; only OCR-correct it against the image.\n\n"
-        f"Draft JSON:\n{json.dumps(first_parsed, ensure_ascii=False)}"
-    )
-
-    second_parsed = None
-    try:
-        second_response = requests.post(
-            f"{ollama_url}/api/chat",
-            json={
-                "model": ollama_model,
-                "messages": [
-                    {"role": "system", "content": second_system_prompt},
-                    {"role": "user", "content": second_user_prompt, "images": [image_b64]}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "num_predict": 400,
-                    "top_p": 0.9
-                }
-            },
-            timeout=OLLAMA_TIMEOUT
-        )
-        if second_response.status_code == 200:
-            second_payload = second_response.json() if second_response.content else {}
-            second_content = extract_ollama_text(second_payload)
-            second_parsed = parse_ai_generated_question(second_content)
-    except (requests.RequestException, ValueError):
-        second_parsed = None
+        return jsonify({"error": error}), status
 
-    final_parsed = second_parsed or first_parsed
     question_obj = {
         "question": final_parsed["question"],
         "options": final_parsed["options"],
@@ -683,16 +3351,16 @@ def api_ai_import_question_from_image(test_id):
 
     return jsonify({
         "success": True,
-        "message": "AI ran 2 passes and generated a draft. Review before saving.",
+        "message": "Reused the draft from an earlier import of this image. Review before saving." if cached else "AI ran 2 passes and generated a draft. Review before saving.",
         "question": question_obj,
         "test_id": test_id,
-        "passes": 2
+        "passes": 0 if cached else 2
     })
 
-@app.route("/api/tests/<int:test_id>/ai-import-question/commit", methods=["POST"])
+@app.route("/api/tests/<test_id>/ai-import-question/commit", methods=["POST"])
 def api_ai_import_question_commit(test_id):
-    data = load_data()
-    if test_id < 0 or test_id >= len(data["tests"]):
+    test_id = resolve_test_id(test_id)
+    if test_id is None:
         return jsonify({"error": "Test not found"}), 404
 
     payload = request.get_json(silent=True) or {}
@@ -739,14 +3407,65 @@ def api_ai_import_question_commit(test_id):
         "image": image_name
     }
 
-    data["tests"][test_id].setdefault("questions", [])
-    if not isinstance(data["tests"][test_id]["questions"], list):
-        data["tests"][test_id]["questions"] = []
-    data["tests"][test_id]["questions"].append(question_obj)
-    save_data(data)
+    with DATA_STORE.lock():
+        test = DATA_STORE.get(test_id)
+        if test is None:
+            return jsonify({"error": "Test not found"}), 404
+        test = copy.deepcopy(test)
+        test.setdefault("questions", [])
+        if not isinstance(test["questions"], list):
+            test["questions"] = []
+        test["questions"].append(question_obj)
+        DATA_STORE.put(test)
 
     return jsonify({"success": True, "message": "Question saved to test.", "question": question_obj})
 
+@app.route("/api/tests/<test_id>/ai-import-jobs", methods=["POST"])
+def api_ai_import_job_submit(test_id):
+    test_id = resolve_test_id(test_id)
+    if test_id is None:
+        return jsonify({"error": "Test not found"}), 404
+
+    files = [f for f in request.files.getlist("images") if f and f.filename]
+    if not files:
+        return jsonify({"error": "At least one image is required."}), 400
+    if len(files) > AI_IMPORT_MAX_IMAGES:
+        return jsonify({"error": f"At most {AI_IMPORT_MAX_IMAGES} images per batch."}), 400
+
+    attach_source_image = str(request.form.get("attach_source_image", "on")).strip().lower() in ("on", "true", "1", "yes")
+    cfg = load_ai_config()
+    ollama_url = str(cfg.get("ollama_url", OLLAMA_URL)).strip().rstrip("/")
+    ollama_model = str(cfg.get("ollama_model", OLLAMA_MODEL)).strip()
+
+    job = IMPORT_JOBS.submit(test_id, files, attach_source_image, ollama_url, ollama_model)
+    return jsonify(job), 202
+
+@app.route("/api/ai-import-jobs/<job_id>")
+def api_ai_import_job_status(job_id):
+    job = IMPORT_JOBS.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/api/ai-import-jobs/<job_id>/events")
+def api_ai_import_job_events(job_id):
+    # Newline-delimited JSON: one job snapshot per change, ending once the job finishes.
+    job, version = IMPORT_JOBS.wait(job_id, None, 0)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        current, seen = job, version
+        while True:
+            yield json.dumps(current, ensure_ascii=False) + "\n"
+            if current["status"] != "running":
+                return
+            current, seen = IMPORT_JOBS.wait(job_id, seen, 15)
+            if current is None:
+                return
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 @app.route("/api/ai-config", methods=["GET", "POST"])
 def api_ai_config():
     if request.method == "GET":
@@ -770,282 +3489,83 @@ def api_ai_config():
 
 @app.route("/api/ai-summary", methods=["POST"])
 def api_ai_summary():
-    payload = request.get_json(silent=True) or {}
-    question = str(payload.get("question", "")).strip()
-    options = payload.get("options", [])
-    correct_index = payload.get("correct_index")
-    selected_index = payload.get("selected_index")
-    explanation = str(payload.get("explanation", "")).strip()
-
-    if not question or not isinstance(options, list) or not options:
-        return jsonify({"error": "Invalid question payload."}), 400
-
-    if not isinstance(correct_index, int) or not (0 <= correct_index < len(options)):
-        return jsonify({"error": "Invalid correct index."}), 400
-
-    correct_answer = options[correct_index]
-    selected_answer = ""
-    if isinstance(selected_index, int) and 0 <= selected_index < len(options):
-        selected_answer = options[selected_index]
-
-    cfg = load_ai_config()
-    ollama_url = str(cfg.get("ollama_url", OLLAMA_URL)).strip().rstrip("/")
-    ollama_model = str(cfg.get("ollama_model", OLLAMA_MODEL)).strip()
-    system_prompt, user_prompt = build_ai_summary_prompts(
-        question=question,
-        options=options,
-        correct_answer=correct_answer,
-        selected_answer=selected_answer,
-        explanation=explanation
-    )
-
-    try:
-        response = requests.post(
-            f"{ollama_url}/api/chat",
-            json={
-                "model": ollama_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "num_predict": 180,
-                    "top_p": 0.9,
-                    "repeat_penalty": 1.1
-                }
-            },
-            timeout=OLLAMA_TIMEOUT
+    prepared, error, status = prepare_ai_summary(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), status
+    if prepared["cached"] is not None:
+        return jsonify({"summary": prepared["cached"]})
+
+    ollama_url = prepared["ollama_url"]
+    ollama_model = prepared["ollama_model"]
+    messages = prepared["messages"]
+
+    def ask_model():
+        # Chat first, /api/generate when chat gave no answer text.
+        data = OLLAMA_CLIENT.chat(ollama_url, ollama_model, messages, AI_SUMMARY_OPTIONS)
+        if (isinstance(data, dict) and data.get("error")) or extract_text(data):
+            return data, None
+        return data, OLLAMA_CLIENT.generate(
+            ollama_url, ollama_model, prepared["user_prompt"], prepared["system_prompt"], AI_SUMMARY_OPTIONS
         )
-    except requests.RequestException:
-        return jsonify({"error": "AI server is unavailable."}), 502
-
-    if response.status_code != 200:
-        return jsonify({"error": "AI server error."}), 502
 
     try:
-        data = response.json() if response.content else {}
-    except ValueError:
-        preview = response.text[:200] if response.text else "Empty response"
-        return jsonify({"error": f"AI server returned non-JSON response: {preview}"}), 502
-
-    if isinstance(data, dict) and data.get("error"):
-        return jsonify({"error": str(data.get('error'))}), 502
-
-    summary = ""
-    thinking = ""
-    if isinstance(data, dict):
-        msg = data.get("message")
-        if isinstance(msg, dict):
-            summary = str(msg.get("content", "")).strip()
-        if not summary:
-            choices = data.get("choices")
-            if isinstance(choices, list) and choices:
-                first = choices[0]
-                if isinstance(first, dict):
-                    msg = first.get("message")
-                    if isinstance(msg, dict):
-                        summary = str(msg.get("content", "")).strip()
-                    if not summary:
-                        summary = str(first.get("text", "")).strip()
-        if not summary:
-            summary = str(data.get("response", "")).strip()
-        thinking = str(data.get("thinking", "")).strip()
-
-    if not summary and isinstance(data, dict):
-        message = data.get("message")
-        if isinstance(message, dict):
-            summary = str(message.get("content", "")).strip()
-
-    if not summary and isinstance(data, dict):
-        choices = data.get("choices")
-        if isinstance(choices, list) and choices:
-            first = choices[0]
-            if isinstance(first, dict):
-                msg = first.get("message")
-                if isinstance(msg, dict):
-                    summary = str(msg.get("content", "")).strip()
-                if not summary:
-                    summary = str(first.get("text", "")).strip()
-
-    if not summary:
-        try:
-            fallback = requests.post(
-                f"{ollama_url}/api/generate",
-                json={
-                    "model": ollama_model,
-                    "prompt": user_prompt,
-                    "system": system_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.2,
-                        "num_predict": 180,
-                        "top_p": 0.9,
-                        "repeat_penalty": 1.1
-                    }
-                },
-                timeout=OLLAMA_TIMEOUT
-            )
-        except requests.RequestException:
-            return jsonify({"error": "AI server is unavailable."}), 502
-
-        if fallback.status_code != 200:
-            return jsonify({"error": "AI server error."}), 502
-
-        try:
-            fb_data = fallback.json() if fallback.content else {}
-        except ValueError:
-            preview = fallback.text[:200] if fallback.text else "Empty response"
-            return jsonify({"error": f"AI server returned non-JSON response: {preview}"}), 502
-
-        if isinstance(fb_data, dict):
-            summary = str(fb_data.get("response", "")).strip()
-            if not summary:
-                msg = fb_data.get("message")
-                if isinstance(msg, dict):
-                    summary = str(msg.get("content", "")).strip()
-            if not thinking:
-                thinking = str(fb_data.get("thinking", "")).strip()
-
-    if not summary and thinking:
-        return jsonify({
-            "error": "Model returned only 'thinking' without a usable answer.",
-            "debug": {
-                "provider": "ollama",
-                "model": ollama_model,
-                "endpoint": f"{ollama_url}/api/chat",
-                "hint": "This model may be configured to output chain-of-thought only. Try a model that returns a 'response' or 'message.content'."
-            }
-        }), 502
-
-    if not summary:
-        keys = ", ".join(sorted([str(k) for k in data.keys()])) if isinstance(data, dict) else "unknown"
-        return jsonify({
-            "error": f"No summary returned. Response keys: {keys}",
-            "debug": {
-                "provider": "ollama",
-                "model": ollama_model,
-                "endpoint": f"{ollama_url}/api/chat",
-                "hint": "Expected 'message.content' (chat) or 'response' (generate)."
-            }
-        }), 502
-
+        # Identical requests already in flight share one generation.
+        data, fb_data = AI_CALLS.do(("summary", prepared["cache_key"]), ask_model)
+    except OllamaError as exc:
+        body, status, headers = ai_error(exc)
+        return jsonify(body), status, headers
+
+    summary, error_body = ai_summary_result(prepared, data, fb_data)
+    if error_body:
+        return jsonify(error_body), 502
+    AI_SUMMARY_CACHE.set(prepared["cache_key"], {"summary": summary})
     return jsonify({"summary": summary})
 
 @app.route("/api/ai-summary-stream", methods=["POST"])
 def api_ai_summary_stream():
-    payload = request.get_json(silent=True) or {}
-    question = str(payload.get("question", "")).strip()
-    options = payload.get("options", [])
-    correct_index = payload.get("correct_index")
-    selected_index = payload.get("selected_index")
-    explanation = str(payload.get("explanation", "")).strip()
-
-    if not question or not isinstance(options, list) or not options:
-        return jsonify({"error": "Invalid question payload."}), 400
-
-    if not isinstance(correct_index, int) or not (0 <= correct_index < len(options)):
-        return jsonify({"error": "Invalid correct index."}), 400
-
-    correct_answer = options[correct_index]
-    selected_answer = ""
-    if isinstance(selected_index, int) and 0 <= selected_index < len(options):
-        selected_answer = options[selected_index]
-
-    cfg = load_ai_config()
-    ollama_url = str(cfg.get("ollama_url", OLLAMA_URL)).strip().rstrip("/")
-    ollama_model = str(cfg.get("ollama_model", OLLAMA_MODEL)).strip()
-    system_prompt, user_prompt = build_ai_summary_prompts(
-        question=question,
-        options=options,
-        correct_answer=correct_answer,
-        selected_answer=selected_answer,
-        explanation=explanation
-    )
+    prepared, error, status = prepare_ai_summary(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), status
+    if prepared["cached"] is not None:
+        return Response(prepared["cached"], mimetype="text/plain; charset=utf-8")
 
     try:
-        upstream = requests.post(
-            f"{ollama_url}/api/chat",
-            json={
-                "model": ollama_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "stream": True,
-                "options": {
-                    "temperature": 0.2,
-                    "num_predict": 180,
-                    "top_p": 0.9,
-                    "repeat_penalty": 1.1
-                }
-            },
-            timeout=OLLAMA_TIMEOUT,
-            stream=True
+        # Identical requests already streaming subscribe to the same generation.
+        deltas = AI_STREAMS.join(
+            prepared["cache_key"],
+            lambda: OLLAMA_CLIENT.open_chat_stream(
+                prepared["ollama_url"], prepared["ollama_model"], prepared["messages"], AI_SUMMARY_OPTIONS
+            ),
+            lambda text: cache_ai_summary(prepared["cache_key"], text)
         )
-    except requests.RequestException:
-        return jsonify({"error": "AI server is unavailable."}), 502
-
-    if upstream.status_code != 200:
-        return jsonify({"error": "AI server error."}), 502
+    except OllamaError as exc:
+        body, status, headers = ai_error(exc)
+        return jsonify(body), status, headers
 
     @stream_with_context
     def generate():
-        for raw_line in upstream.iter_lines(decode_unicode=True):
-            if not raw_line:
-                continue
-            try:
-                chunk = json.loads(raw_line)
-            except ValueError:
-                continue
-            if isinstance(chunk, dict) and chunk.get("error"):
-                continue
-            delta = ""
-            if isinstance(chunk, dict):
-                msg = chunk.get("message")
-                if isinstance(msg, dict):
-                    delta = str(msg.get("content", ""))
-                if not delta:
-                    delta = str(chunk.get("response", ""))
-            if delta:
-                yield delta
+        yield from deltas
 
     return Response(generate(), mimetype="text/plain; charset=utf-8")
 
-@app.route("/delete/<int:test_id>")
+@app.route("/delete/<test_id>")
 def delete_test(test_id):
-    data = load_data()
-    if 0 <= test_id < len(data["tests"]):
-        test = data["tests"][test_id]
-        for q in test.get("questions", []):
-            delete_image_file(q.get("image", ""))
-        del data["tests"][test_id]
-        save_data(data)
+    test_id = resolve_test_id(test_id)
+    if test_id is not None:
+        with DATA_STORE.lock():
+            test = DATA_STORE.delete(test_id)
+            delete_image_files(test_images(test))
     return redirect(url_for("index"))
 
 # NEW: Export all tests as data.json
 @app.route("/export")
 def export_tests():
-    data = load_data()
-    buffer = io.BytesIO()
+    data = DATA_STORE.read()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("data.json", json.dumps(data, indent=4, ensure_ascii=False))
-
-        if os.path.isdir(UPLOAD_FOLDER):
-            for filename in os.listdir(UPLOAD_FOLDER):
-                src = os.path.join(UPLOAD_FOLDER, filename)
-                if os.path.isfile(src):
-                    zf.write(src, arcname=f"uploads/{filename}")
-
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f"suvuu_backup_{timestamp}.zip",
-        mimetype="application/zip"
+    return Response(
+        iter_backup_zip(data),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=suvuu_backup_{timestamp}.zip"}
     )
 
 @app.route("/import", methods=["POST"])
@@ -1068,22 +3588,25 @@ def import_tests():
         if filename_lower.endswith('.json'):
             uploaded_data = json.load(file)
         else:
-            archive_bytes = file.read()
-            with zipfile.ZipFile(io.BytesIO(archive_bytes), "r") as zf:
-                names = set(zf.namelist())
-                if "data.json" not in names:
+            # Werkzeug has already spooled a large upload to a temporary file; members
+            # are streamed out of it one block at a time.
+            file.stream.seek(0)
+            with zipfile.ZipFile(file.stream, "r") as zf:
+                archive_names = set(zf.namelist())
+                if "data.json" not in archive_names:
                     return jsonify({"success": False, "error": "Backup zip missing data.json"}), 400
 
-                uploaded_data = json.loads(zf.read("data.json").decode("utf-8"))
+                with zf.open("data.json") as f:
+                    uploaded_data = json.loads(f.read().decode("utf-8"))
+                if isinstance(uploaded_data, dict) and isinstance(uploaded_data.get("tests"), list):
+                    image_map = restore_backup_images(zf, archive_names, uploaded_data["tests"])
 
         if not isinstance(uploaded_data, dict) or "tests" not in uploaded_data or not isinstance(uploaded_data["tests"], list):
             return jsonify({"success": False, "error": "Invalid data.json format"}), 400
 
-        current_data = load_data()
         imported_tests = uploaded_data["tests"]
 
         if filename_lower.endswith(".zip"):
-            referenced_images = set()
             for test in imported_tests:
                 if not isinstance(test, dict):
                     continue
@@ -1093,90 +3616,49 @@ def import_tests():
                 for q in questions:
                     if not isinstance(q, dict):
                         continue
-                    image_name = str(q.get("image", "")).strip()
-                    if image_name:
-                        referenced_images.add(image_name)
-
-            with zipfile.ZipFile(io.BytesIO(archive_bytes), "r") as zf:
-                archive_names = set(zf.namelist())
-                restored_images = 0
-                missing_images = 0
-                for original_name in referenced_images:
-                    normalized_name = secure_filename(os.path.basename(original_name))
-                    if not normalized_name or not is_allowed_image(normalized_name):
-                        image_map[original_name] = ""
-                        missing_images += 1
-                        continue
-
-                    upload_member = f"uploads/{normalized_name}"
-                    if upload_member not in archive_names:
-                        image_map[original_name] = ""
-                        missing_images += 1
+                    original_name = str(q.get("image", "")).strip()
+                    if not original_name:
                         continue
+                    q["image"] = image_map.get(original_name, "")
 
-                    payload = zf.read(upload_member)
-                    target_name = normalized_name
-                    target_path = os.path.join(UPLOAD_FOLDER, target_name)
+        with DATA_STORE.lock():
+            current_data = load_data()
 
-                    if os.path.exists(target_path):
-                        try:
-                            with open(target_path, "rb") as existing_file:
-                                existing_payload = existing_file.read()
-                        except OSError:
-                            existing_payload = b""
-                        if existing_payload != payload:
-                            _, ext = os.path.splitext(normalized_name)
-                            target_name = f"{uuid4().hex}{ext.lower()}"
-                            target_path = os.path.join(UPLOAD_FOLDER, target_name)
-
-                    with open(target_path, "wb") as out:
-                        out.write(payload)
-                    image_map[original_name] = target_name
-                    restored_images += 1
-
-                for test in imported_tests:
-                    if not isinstance(test, dict):
-                        continue
-                    questions = test.get("questions", [])
-                    if not isinstance(questions, list):
-                        continue
-                    for q in questions:
-                        if not isinstance(q, dict):
-                            continue
-                        original_name = str(q.get("image", "")).strip()
-                        if not original_name:
-                            continue
-                        q["image"] = image_map.get(original_name, "")
-
-        # Track existing titles (case-insensitive)
-        title_to_index = {}
-        for i, t in enumerate(current_data["tests"]):
-            title_val = t.get("title")
-            if isinstance(title_val, str) and title_val.strip():
-                title_to_index[title_val.strip().lower()] = i
-
-        added = 0
-        updated = 0
-        skipped_invalid = 0
-
-        for test in imported_tests:
-            if not isinstance(test, dict) or "title" not in test or "questions" not in test:
-                skipped_invalid += 1
-                continue
+            # Track existing titles (case-insensitive)
+            title_to_index = {}
+            for i, t in enumerate(current_data["tests"]):
+                title_val = t.get("title")
+                if isinstance(title_val, str) and title_val.strip():
+                    title_to_index[title_val.strip().lower()] = i
 
-            title_key = test["title"].strip().lower()
+            added = 0
+            updated = 0
+            skipped_invalid = 0
+            replaced_images = []
 
-            if title_key in title_to_index:
-                # UPDATE existing test (same title = newer version)
-                current_data["tests"][title_to_index[title_key]] = test
-                updated += 1
-            else:
-                # ADD new test
-                current_data["tests"].append(test)
-                title_to_index[title_key] = len(current_data["tests"]) - 1
-                added += 1
+            for test in imported_tests:
+                if not isinstance(test, dict) or "title" not in test or "questions" not in test:
+                    skipped_invalid += 1
+                    continue
 
-        save_data(current_data)
+                title_key = test["title"].strip().lower()
+
+                if title_key in title_to_index:
+                    # UPDATE existing test (same title = newer version), keeping its id
+                    position = title_to_index[title_key]
+                    replaced_images.extend(test_images(current_data["tests"][position]))
+                    current_data["tests"][position] = {**test, "id": current_data["tests"][position].get("id")}
+                    updated += 1
+                else:
+                    # ADD new test
+                    current_data["tests"].append(test)
+                    title_to_index[title_key] = len(current_data["tests"]) - 1
+                    added += 1
+
+            assign_test_ids(current_data["tests"])
+            save_data(current_data)
+            # Images of the replaced versions, and restored ones only skipped tests used.
+            delete_image_files(replaced_images + [name for name in image_map.values() if name])
 
         message_parts = []
         if added:   message_parts.append(f"added {added} new")
@@ -1218,54 +3700,57 @@ def results_page(token=None):
 def history_page():
     return render_template("history.html")
 
+def parse_history_date(value, end_of_range=False):
+    # Accepts a date ("2024-05-01") or an ISO timestamp and returns a UTC ISO string
+    # comparable with stored created_at values. Dates used as the end of a range are
+    # inclusive of that whole day.
+    text = str(value).strip()
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_range and len(text) == 10:
+        parsed += timedelta(days=1)
+    return parsed.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
 @app.route("/api/attempts")
 def api_attempts():
-    attempts_data = load_attempts()
-    attempts = attempts_data.get("attempts", [])
-    if not isinstance(attempts, list):
-        attempts = []
-
     try:
         limit = int(request.args.get("limit", "200"))
     except ValueError:
         limit = 200
     limit = max(1, min(limit, 1000))
 
-    items = []
-    for attempt in reversed(attempts):
-        if not isinstance(attempt, dict):
-            continue
-
-        score_raw = attempt.get("score", 0)
-        total_raw = attempt.get("total", 0)
-        try:
-            score = int(score_raw)
-        except (TypeError, ValueError):
-            score = 0
-        try:
-            total = int(total_raw)
-        except (TypeError, ValueError):
-            total = 0
-        if score < 0:
-            score = 0
-        if total < 0:
-            total = 0
+    before = request.args.get("before", "").strip() or None
+    test_id = request.args.get("test_id", "").strip() or None
+    try:
+        created_from = parse_history_date(request.args["from"]) if request.args.get("from") else None
+        created_to = parse_history_date(request.args["to"], end_of_range=True) if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "Invalid date filter."}), 400
+
+    summaries, has_more = ATTEMPT_LOG.page(
+        before=before,
+        limit=limit,
+        test_id=test_id,
+        created_from=created_from,
+        created_to=created_to
+    )
+    if summaries is None:
+        return jsonify({"error": "Unknown cursor."}), 400
 
+    items = []
+    for summary in summaries:
+        score = summary.get("score", 0)
+        total = summary.get("total", 0)
         percent = round((score / total) * 100, 1) if total > 0 else 0.0
-        items.append({
-            "id": str(attempt.get("id", "")).strip(),
-            "created_at": str(attempt.get("created_at", "")).strip(),
-            "test_id": attempt.get("test_id"),
-            "test_title": str(attempt.get("test_title", "Untitled Test")),
-            "score": score,
-            "total": total,
-            "percent": percent
-        })
-
-        if len(items) >= limit:
-            break
+        items.append({**summary, "percent": percent})
 
-    return jsonify({"attempts": items, "total": len(items)})
+    return jsonify({
+        "attempts": items,
+        "total": len(items),
+        "has_more": has_more,
+        "next_before": items[-1]["id"] if has_more and items else None
+    })
 
 @app.route("/api/attempts/<token>", methods=["DELETE"])
 def api_delete_attempt(token):
@@ -1285,16 +3770,209 @@ def api_clear_attempts():
 
 @app.route("/api/results/<token>")
 def api_results(token):
-    payload = RESULT_CACHE.get(token)
-    if payload is None:
+    body = RESULT_CACHE.get(token)
+    if body is not None and not ATTEMPT_LOG.has(token):
+        # Deleted, possibly by another worker process, since it was cached.
+        RESULT_CACHE.pop(token, None)
+        body = None
+    if body is None:
         payload = get_attempt_by_token(token)
-    if payload is None:
-        return jsonify({"error": "Results not found"}), 404
-    return jsonify(payload)
+        if payload is None:
+            return jsonify({"error": "Results not found"}), 404
+        body = json_bytes(payload)
+        RESULT_CACHE.set(token, body)
+    if request.args.get("normalized") == "1":
+        body = json_bytes(normalized_result(json.loads(body)))
+    return json_response(body)
+
+def normalized_result(payload):
+    # The attempt with each answer whose question is unchanged in the current test cut
+    # down to a "question_index" into /api/tests/<test_id>?v=<test_version>, instead of
+    # repeating its text, options and explanation. Answers to questions edited or
+    # removed since stay inline.
+    current = test_payload(payload.get("test_id")) if payload.get("test_id") else None
+    if current is None:
+        return payload
+    test, _, content_hash = current
+    questions = test.get("questions", [])
+    answers = []
+    referenced = False
+    for i, answer in enumerate(payload.get("answers", [])):
+        q = questions[i] if i < len(questions) else None
+        if (isinstance(answer, dict) and isinstance(q, dict)
+                and answer.get("question") == q.get("question")
+                and answer.get("options") == q.get("options")
+                and answer.get("explanation", "") == q.get("explanation", "")
+                and answer.get("image", "") == q.get("image", "")):
+            answers.append({
+                "question_index": i,
+                "selected": answer.get("selected"),
+                "correct": answer.get("correct"),
+                "is_correct": answer.get("is_correct")
+            })
+            referenced = True
+        else:
+            answers.append(answer)
+    if not referenced:
+        return payload
+    return {**payload, "answers": answers, "test_version": content_hash}
+
+
+@app.route("/api/metrics")
+def api_metrics():
+    return jsonify({
+        "caches": {
+            "results": RESULT_CACHE.stats(),
+            "tests": TEST_PAYLOAD_CACHE.stats(),
+            "compressed": COMPRESSED_CACHE.stats(),
+            "ai_summaries": AI_SUMMARY_CACHE.stats(),
+            "ai_imports": AI_IMPORT_CACHE.stats()
+        },
+        "ai_admission": AI_LIMITER.stats(),
+        "coalescing": {
+            "calls": AI_CALLS.stats(),
+            "streams": AI_STREAMS.stats(),
+            "async_calls": AI_ASYNC_CALLS.stats(),
+            "async_streams": AI_ASYNC_STREAMS.stats()
+        }
+    })
+
+@app.after_request
+def compress_json(response):
+    # Negotiated compression for JSON bodies (tests, results, lists). Streamed, small
+    # and already encoded responses pass through unchanged.
+    if (response.status_code != 200 or response.mimetype != "application/json"
+            or response.is_streamed or response.direct_passthrough or response.content_encoding):
+        return response
+    body = response.get_data()
+    if len(body) < JSON_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = preferred_encoding(("br", "gzip") if brotli is not None else ("gzip",))
+    if encoding == "identity":
+        return response
+    cache_key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    data = COMPRESSED_CACHE.get(cache_key)
+    if data is None:
+        # About gzip's speed at level 6 and smaller; paid once per distinct body.
+        if encoding == "br":
+            data = brotli.compress(body, quality=8)
+        else:
+            data = gzip.compress(body, compresslevel=6, mtime=0)
+        COMPRESSED_CACHE.set(cache_key, data)
+    response.set_data(data)
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # Each encoding is its own representation; re-check If-None-Match against it.
+        response.set_etag(f"{etag}-{encoding}", weak)
+        return response.make_conditional(request)
+    return response
+
+STATIC_ASSETS = {}
+STATIC_ASSETS_LOCK = threading.Lock()
+
+def static_asset(filename):
+    # {"etag", "identity", "gzip", "br"} for a file under static/: its bytes, a hash of
+    # them, and the compressed encodings that are smaller. Built once per file version
+    # (mtime and size). None for missing or large files.
+    path = safe_join(STATIC_FOLDER, filename)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode) or st.st_size > STATIC_CACHE_MAX_BYTES:
+        return None
+    version = (st.st_mtime_ns, st.st_size)
+    with STATIC_ASSETS_LOCK:
+        cached = STATIC_ASSETS.get(filename)
+    if cached is not None and cached["version"] == version:
+        return cached
+
+    with open(path, "rb") as f:
+        body = f.read()
+    asset = {
+        "version": version,
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "identity": body
+    }
+    if len(body) >= STATIC_COMPRESS_MIN_BYTES:
+        encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encoded["br"] = brotli.compress(body, quality=11)
+        for encoding, data in encoded.items():
+            if len(data) < len(body):
+                asset[encoding] = data
+    with STATIC_ASSETS_LOCK:
+        STATIC_ASSETS[filename] = asset
+    return asset
+
+def preferred_encoding(available):
+    # Best of the `available` content codings the client accepts; "identity" if none.
+    accept = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in available and accept[encoding] > 0:
+            return encoding
+    return "identity"
+
+@app.context_processor
+def static_url_helper():
+    def static_url(filename):
+        # Versioned URL, so the page picks up changes while the file itself is cached
+        # for good.
+        asset = static_asset(filename)
+        return f"/static/{filename}?v={asset['etag'][:12]}" if asset else f"/static/{filename}"
+    return {"static_url": static_url}
+
+@app.route("/static/<path:filename>", endpoint="static")
+def static_file(filename):
+    asset = static_asset(filename)
+    if asset is None:
+        return send_from_directory(STATIC_FOLDER, filename)
+    encoding = preferred_encoding(asset)
+    response = Response(asset[encoding], mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    response.vary.add("Accept-Encoding")
+    if encoding != "identity":
+        response.content_encoding = encoding
+        response.set_etag(f"{asset['etag']}-{encoding}")
+    else:
+        response.set_etag(asset["etag"])
+    if request.args.get("v") == asset["etag"][:12]:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    if encoding == "identity":
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(asset[encoding]))
+    return response.make_conditional(request)
 
 @app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    # send_from_directory answers If-None-Match/If-Modified-Since and Range itself.
+    # The ETag of an immutable image is its name, the same in every worker and after
+    # a restore; other files get one from their mtime, size and name.
+    immutable = bool(IMMUTABLE_IMAGE_RE.match(filename))
+    max_age = IMMUTABLE_MAX_AGE if immutable else None
+    width = request.args.get("w", type=int)
+    variant = image_variant(filename, width) if width and width > 0 else None
+    if variant is not None:
+        response = send_from_directory(THUMBNAIL_FOLDER, variant, max_age=max_age, etag=variant if immutable else True)
+    else:
+        response = send_from_directory(UPLOAD_FOLDER, filename, max_age=max_age, etag=filename if immutable else True)
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+def create_app():
+    # Entry point for production servers (see wsgi.py and asgi.py). Storage is opened
+    # and migrated when this module is imported, so with gunicorn's preload_app that
+    # happens once in the master process. FLASK_* environment variables become config
+    # keys, e.g. FLASK_MAX_CONTENT_LENGTH=104857600 caps uploads at 100 MB.
+    app.config.from_prefixed_env()
+    return app
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
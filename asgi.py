@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+
+from a2wsgi import WSGIMiddleware
+
+import app as flask_app
+from ollama_client import AsyncOllamaClient, OllamaError, extract_text
+
+# Async serving mode: run with `uvicorn asgi:application --host 0.0.0.0 --port 5000`.
+# The AI explanation endpoints run on the event loop, so a streaming explanation
+# costs a coroutine instead of a thread. Every other route is the unchanged Flask
+# app, served on a thread pool of ASGI_WSGI_THREADS.
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))
+MAX_JSON_BODY = 1024 * 1024
+
+WSGI_APP = WSGIMiddleware(flask_app.create_app(), workers=ASGI_WSGI_THREADS)
+OLLAMA = {}
+
+
+def ollama_client():
+    # Created on first use so it belongs to the server's event loop.
+    client = OLLAMA.get("client")
+    if client is None:
+        client = OLLAMA["client"] = AsyncOllamaClient(
+            connect_timeout=flask_app.OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=flask_app.OLLAMA_TIMEOUT,
+            retries=flask_app.OLLAMA_RETRIES
+        )
+    return client
+
+
+async def read_json(receive):
+    # Request body parsed as a JSON object; {} for anything else, like get_json(silent=True).
+    # None if the client disconnected, False if the body is over MAX_JSON_BODY.
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.extend(message.get("body", b""))
+        if len(body) > MAX_JSON_BODY:
+            return False
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+async def send_json(send, payload, status=200, headers=None):
+    body = flask_app.json_bytes(payload)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ] + [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_text(send, chunks):
+    # Relays text deltas as a chunked text/plain response. Stops quietly if the
+    # client goes away; the shared generation carries on for other subscribers.
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8")]
+    })
+    try:
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        return
+
+async def prepare(receive, send):
+    payload = await read_json(receive)
+    if payload is None:
+        return None
+    if payload is False:
+        await send_json(send, {"error": "Request body too large."}, 413)
+        return None
+    # Reads the AI config and the summary cache from disk, so off the loop.
+    prepared, error, status = await asyncio.to_thread(flask_app.prepare_ai_summary, payload)
+    if error:
+        await send_json(send, {"error": error}, status)
+        return None
+    return prepared
+
+async def ai_summary(scope, receive, send):
+    prepared = await prepare(receive, send)
+    if prepared is None:
+        return
+    if prepared["cached"] is not None:
+        await send_json(send, {"summary": prepared["cached"]})
+        return
+
+    client = ollama_client()
+    ollama_url = prepared["ollama_url"]
+    ollama_model = prepared["ollama_model"]
+
+    async def ask_model():
+        data = await client.chat(ollama_url, ollama_model, prepared["messages"], flask_app.AI_SUMMARY_OPTIONS)
+        if (isinstance(data, dict) and data.get("error")) or extract_text(data):
+            return data, None
+        return data, await client.generate(
+            ollama_url, ollama_model, prepared["user_prompt"], prepared["system_prompt"], flask_app.AI_SUMMARY_OPTIONS
+        )
+
+    try:
+        data, fb_data = await flask_app.AI_ASYNC_CALLS.do(("summary", prepared["cache_key"]), ask_model)
+    except OllamaError as exc:
+        body, status, headers = flask_app.ai_error(exc)
+        await send_json(send, body, status, headers)
+        return
+
+    summary, error_body = flask_app.ai_summary_result(prepared, data, fb_data)
+    if error_body:
+        await send_json(send, error_body, 502)
+        return
+    await asyncio.to_thread(flask_app.cache_ai_summary, prepared["cache_key"], summary)
+    await send_json(send, {"summary": summary})
+
+async def ai_summary_stream(scope, receive, send):
+    prepared = await prepare(receive, send)
+    if prepared is None:
+        return
+    if prepared["cached"] is not None:
+        await send_text(send, aiter_once(prepared["cached"]))
+        return
+
+    client = ollama_client()
+    try:
+        deltas = await flask_app.AI_ASYNC_STREAMS.join(
+            prepared["cache_key"],
+            lambda: client.open_chat_stream(
+                prepared["ollama_url"], prepared["ollama_model"], prepared["messages"], flask_app.AI_SUMMARY_OPTIONS
+            ),
+            lambda text: flask_app.cache_ai_summary(prepared["cache_key"], text)
+        )
+    except OllamaError as exc:
+        body, status, headers = flask_app.ai_error(exc)
+        await send_json(send, body, status, headers)
+        return
+    await send_text(send, deltas)
+
+async def aiter_once(text):
+    yield text
+
+ASYNC_ROUTES = {
+    "/api/ai-summary": ai_summary,
+    "/api/ai-summary-stream": ai_summary_stream
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if "client" in OLLAMA:
+                await OLLAMA.pop("client").aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    handler = ASYNC_ROUTES.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "POST" else None
+    if handler is not None:
+        await handler(scope, receive, send)
+        return
+    await WSGI_APP(scope, receive, send)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(application, host="0.0.0.0", port=5000)
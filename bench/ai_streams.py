@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from common import ROOT, scratch_dir, start_server, stop_server
+
+# Capacity for concurrent streamed AI explanations: N distinct /api/ai-summary-stream
+# requests at once against a stub model that answers after --delay seconds and then
+# streams a few words. The async server (uvicorn asgi:application) is compared with
+# the threaded ones. Admission limits are lifted, so the server is the only limit.
+# Linux only: server threads are counted from /proc.
+
+WORDS = ["Two ", "plus ", "two ", "is four."]
+
+MODES = {
+    "asgi": ["uvicorn", "asgi:application", "--app-dir", ROOT, "--port", "{port}", "--log-level", "warning"],
+    "gthread": ["gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"), "--pythonpath", ROOT, "wsgi:app"],
+    "dev": [sys.executable, os.path.join(ROOT, "wsgi.py")]
+}
+MODE_ENV = {
+    "gthread": {"WEB_CONCURRENCY": "1", "GUNICORN_THREADS": "32", "GUNICORN_GRACEFUL_TIMEOUT": "1"},
+    "dev": {"SERVER": "dev"}
+}
+
+
+async def stub_model(reader, writer, delay):
+    # Minimal Ollama /api/chat: waits `delay`, then streams WORDS as NDJSON.
+    try:
+        while True:
+            if not await reader.readline():
+                return
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, _, value = line.decode().partition(":")
+                headers[key.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers.get("content-length", 0)))
+            await asyncio.sleep(delay)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for word in WORDS + [None]:
+                chunk = json.dumps({"message": {"content": word}, "done": False} if word else {"done": True})
+                chunk = (chunk + "\n").encode()
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+                await asyncio.sleep(0.05)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def thread_count(pid):
+    # Threads of pid and all its descendants (gunicorn's workers are children).
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            total += next(int(line.split()[1]) for line in f if line.startswith("Threads:"))
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children", "r") as f:
+                total += sum(thread_count(int(child)) for child in f.read().split())
+    except (OSError, StopIteration):
+        pass
+    return total
+
+
+async def one_stream(port, question):
+    start = time.perf_counter()
+    body = json.dumps({"question": question, "options": ["3", "4"], "correct_index": 1}).encode()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            b"POST /api/ai-summary-stream HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(body), body)
+        )
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+        ok = data.startswith(b"HTTP/1.1 200") and b"four." in data
+    except OSError:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+async def load(port, pid, count, tag):
+    peak = 0
+    done = asyncio.Event()
+
+    async def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, thread_count(pid))
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.ensure_future(sample())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one_stream(port, f"{tag} question {i}?") for i in range(count)])
+    wall = time.perf_counter() - start
+    done.set()
+    await sampler
+    latencies = sorted(r[1] for r in results)
+    return sum(r[0] for r in results), wall, latencies[len(latencies) // 2], peak
+
+
+async def main_async(args):
+    model = await asyncio.start_server(lambda r, w: stub_model(r, w, args.delay), "127.0.0.1", 0, backlog=4096)
+    model_port = model.sockets[0].getsockname()[1]
+    counts = [int(n) for n in args.streams.split(",")]
+    modes = args.modes.split(",")
+    results = {}
+    for mode in modes:
+        process, port = await asyncio.to_thread(
+            start_server, MODES[mode], scratch_dir(f"ai-streams-{mode}"), OLLAMA_URL=f"http://127.0.0.1:{model_port}",
+            AI_MAX_CONCURRENT=100000, AI_MAX_QUEUE=100000, **MODE_ENV.get(mode, {})
+        )
+        try:
+            for count in counts:
+                results[mode, count] = await load(port, process.pid, count, f"{mode}-{count}-{time.time()}")
+        finally:
+            await asyncio.to_thread(stop_server, process)
+    model.close()
+
+    print(f"{'streams':>7} " + " ".join(f"{mode:>26}" for mode in modes))
+    for count in counts:
+        cells = []
+        for mode in modes:
+            ok, wall, p50, peak = results[mode, count]
+            cells.append(f"{wall:6.1f}s p50 {p50:4.1f}s {peak:4d} thr" + ("" if ok == count else f" ({count - ok} failed)"))
+        print(f"{count:>7} " + " ".join(f"{cell:>26}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent streamed AI explanations per serving mode.")
+    parser.add_argument("--streams", default="50,200,500", help="comma separated numbers of concurrent streams")
+    parser.add_argument("--modes", default="asgi,gthread,dev", help=f"comma separated, from {', '.join(MODES)}")
+    parser.add_argument("--delay", type=float, default=2.0, help="seconds the stub model waits before answering")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
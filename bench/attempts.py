@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from uuid import uuid4
+
+from common import load_app, make_test, mb, median_ms, scratch_dir, timed
+
+# Opening a results page that is not in RESULT_CACHE, with 2k, 20k and 200k stored
+# attempts: the attempt journal and its id index against what api_results used to do,
+# parse attempts.json and scan it for the token.
+
+
+def child(workdir, size, lookups):
+    # Runs in a fresh interpreter, so the timings include startup as a restarted
+    # worker sees it.
+    start = time.perf_counter()
+    app = load_app(workdir, STORAGE_BACKEND="json", MAX_STORED_ATTEMPTS=size)
+    startup = time.perf_counter() - start
+    with open(os.path.join(workdir, "tokens.json"), "r", encoding="utf-8") as f:
+        tokens = json.load(f)
+    client = app.app.test_client()
+    samples = []
+    for token in tokens[:lookups]:
+        start = time.perf_counter()
+        response = client.get(f"/api/results/{token}")
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (token, response.status_code)
+    print(json.dumps({"startup": startup, "lookup_ms": median_ms(samples)}))
+
+
+def run_child(workdir, size, lookups):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", workdir, str(size), str(lookups)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Results lookups against the number of stored attempts.")
+    parser.add_argument("--sizes", default="2000,20000,200000", help="comma separated attempt counts")
+    parser.add_argument("--questions", type=int, default=3, help="questions per attempt")
+    parser.add_argument("--runs", type=int, default=3, help="attempts.json scans per size")
+    parser.add_argument("--lookups", type=int, default=200, help="distinct tokens looked up per size")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child[0], int(args.child[1]), int(args.child[2]))
+
+    test = {"id": uuid4().hex, **make_test(args.questions)}
+    print(f"{'attempts':>8} {'attempts.json':>13} {'scan':>10} {'migration':>10} {'startup':>10} {'lookup':>9}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        workdir = scratch_dir(f"attempts-{size}")
+        data_dir = os.path.join(workdir, "data")
+        os.makedirs(data_dir)
+        with open(os.path.join(data_dir, "data.json"), "w", encoding="utf-8") as f:
+            json.dump({"tests": [test]}, f)
+
+        # attempts.json as take_test used to write it: full answers in every attempt.
+        rng = random.Random(size)
+        attempts = []
+        for _ in range(size):
+            answers = []
+            for q in test["questions"]:
+                selected = rng.randrange(len(q["options"]))
+                answers.append({
+                    "question": q["question"], "options": q["options"], "selected": selected,
+                    "correct": q["correct_index"], "is_correct": selected == q["correct_index"],
+                    "explanation": q["explanation"], "image": ""
+                })
+            attempts.append({
+                "id": str(uuid4()), "created_at": "2024-01-01T00:00:00+00:00", "test_id": test["id"],
+                "test_title": test["title"], "score": sum(a["is_correct"] for a in answers),
+                "total": len(answers), "answers": answers
+            })
+        attempts_file = os.path.join(data_dir, "attempts.json")
+        with open(attempts_file, "w", encoding="utf-8") as f:
+            json.dump({"attempts": attempts}, f)
+        tokens = [a["id"] for a in rng.sample(attempts, min(args.lookups, size))]
+        with open(os.path.join(workdir, "tokens.json"), "w", encoding="utf-8") as f:
+            json.dump(tokens, f)
+        del attempts
+
+        # Before: get_attempt_by_token() loaded attempts.json and scanned it.
+        def scan():
+            with open(attempts_file, "r", encoding="utf-8") as f:
+                attempts = json.load(f)["attempts"]
+            wanted = rng.choice(tokens)
+            return next(a for a in attempts if a["id"] == wanted)
+
+        json_size = os.path.getsize(attempts_file)
+        before = median_ms(timed(scan, args.runs))
+        # The first start moves attempts.json into the journal and builds the index;
+        # every later start only reads the index.
+        migration = run_child(workdir, size, 1)["startup"]
+        after = run_child(workdir, size, args.lookups)
+        print(f"{size:>8} {mb(json_size):>10.1f} MB {before:>7.0f} ms {migration:>8.1f} s "
+              f"{after['startup'] * 1000:>7.0f} ms {after['lookup_ms']:>6.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
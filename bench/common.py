@@ -0,0 +1,101 @@
+import atexit
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Shared helpers for the benchmark scripts in this folder. Every script runs the app
+# in a scratch working directory, so the data/ folder it creates never touches the
+# real one. Run them from anywhere with the project's requirements installed, e.g.
+# `python bench/data_store.py`.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "the of and to in is for that with as on by this are be it from or an at which network protocol "
+    "layer packet router switch address subnet mask gateway server client request response cache memory "
+    "process thread kernel file system disk storage database index query table column row key value "
+    "security encryption certificate authority signature hash function algorithm complexity sorting "
+    "searching binary tree graph node edge weight path"
+).split()
+
+
+def scratch_dir(name):
+    # Removed again when the script exits.
+    path = tempfile.mkdtemp(prefix=f"suvuu-bench-{name}-")
+    atexit.register(shutil.rmtree, path, True)
+    return path
+
+def load_app(workdir, **env):
+    # Imports app.py with `workdir` as the working directory; settings app.py reads
+    # at import (storage paths, limits) must be passed here as environment variables.
+    os.environ.update({key: str(value) for key, value in env.items()})
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app
+    return app
+
+def start_server(command, workdir, **env):
+    # Starts a server process on a free port, with "{port}" in `command` and PORT in
+    # its environment set to it, and waits until it answers. Returns (process, port).
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = {**os.environ, "PORT": str(port), "PYTHONPATH": ROOT, **{k: str(v) for k, v in env.items()}}
+    process = subprocess.Popen([arg.format(port=port) for arg in command], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/tests", timeout=1).read()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{command[0]} did not start")
+
+def stop_server(process):
+    process.terminate()
+    process.wait()
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def make_test(questions, seed=0, title="Benchmark test"):
+    # A test whose questions look like real ones: 4 options, a paragraph of explanation.
+    rng = random.Random(seed)
+    return {
+        "title": title,
+        "questions": [
+            {
+                "question": sentence(rng, rng.randint(12, 30)) + "?",
+                "options": [sentence(rng, rng.randint(3, 12)) for _ in range(4)],
+                "correct_index": rng.randrange(4),
+                "explanation": sentence(rng, rng.randint(30, 70)) + ".",
+                "image": ""
+            }
+            for _ in range(questions)
+        ]
+    }
+
+def timed(fn, runs):
+    # Seconds taken by each of `runs` calls.
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def mb(size):
+    return size / (1024 * 1024)
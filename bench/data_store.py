@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import sys
+from uuid import uuid4
+
+from common import load_app, make_test, mb, median_ms, scratch_dir, timed
+
+# Latency of listing tests and fetching one test from a large data.json, with the
+# in-memory DATA_STORE against what every request used to do: parse the whole file.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DATA_STORE against parsing data.json per request.")
+    parser.add_argument("--mb", type=float, default=50, help="approximate size of data.json")
+    parser.add_argument("--questions", type=int, default=300, help="questions per test")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = scratch_dir("data-store")
+    data_file = os.path.join(workdir, "data", "data.json")
+    os.makedirs(os.path.dirname(data_file))
+    tests = []
+    size = 0
+    while size < args.mb * 1024 * 1024:
+        test = {"id": uuid4().hex, **make_test(args.questions, seed=len(tests), title=f"Test {len(tests)}")}
+        tests.append(test)
+        size += len(json.dumps(test, ensure_ascii=False, separators=(",", ":")))
+    with open(data_file, "w", encoding="utf-8") as f:
+        json.dump({"tests": tests}, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"data.json: {mb(os.path.getsize(data_file)):.1f} MB, {len(tests)} tests x {args.questions} questions")
+    middle = len(tests) // 2
+    test_id = tests[middle]["id"]
+    del tests
+
+    def parse_bank():
+        with open(data_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # Before: load_data() on every request.
+    before_list = timed(lambda: [{"id": t["id"], "title": t["title"]} for t in parse_bank()["tests"]], args.runs)
+    before_get = timed(lambda: json.dumps(parse_bank()["tests"][middle]), args.runs)
+
+    # After: the app reads data.json once at startup (import) and serves from memory.
+    app = load_app(workdir, STORAGE_BACKEND="json")
+    client = app.app.test_client()
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    after_list = timed(lambda: get("/api/tests"), args.runs)
+    after_get = timed(lambda: get(f"/api/tests/{test_id}"), args.runs)
+
+    print(f"{'median of ' + str(args.runs):<18} {'parse per request':>18} {'DATA_STORE':>12}")
+    print(f"{'/api/tests':<18} {median_ms(before_list):>15.1f} ms {median_ms(after_list):>9.2f} ms")
+    print(f"{'/api/tests/<id>':<18} {median_ms(before_get):>15.1f} ms {median_ms(after_get):>9.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
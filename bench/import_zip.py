@@ -0,0 +1,95 @@
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+import zipfile
+from uuid import uuid4
+
+from common import ROOT, make_test, mb, scratch_dir, start_server, stop_server
+
+# Restoring a large backup zip through POST /import: MB/s and the server's peak
+# memory, for a first import and for importing the same backup again (every image
+# already stored). The backup's images carry another install's upload names, so
+# each one is streamed and hashed. Linux only: peak memory is read from /proc.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_backup(path, images, image_kb):
+    with zipfile.ZipFile(path, "w") as zf:
+        tests = []
+        for start in range(0, images, 100):
+            test = make_test(min(100, images - start), seed=start, title=f"Imported {start // 100}")
+            for q in test["questions"]:
+                q["image"] = f"{uuid4().hex}.png"
+                with zf.open(f"uploads/{q['image']}", "w") as dest:
+                    for _ in range(image_kb // 64):
+                        dest.write(os.urandom(64 * 1024))
+            tests.append(test)
+        zf.writestr("data.json", json.dumps({"tests": tests}))
+
+
+def post_file(port, path):
+    # multipart/form-data upload streamed from disk, so the client never holds it.
+    boundary = uuid4().hex
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"backup.zip\"\r\n"
+        "Content-Type: application/zip\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    conn.putrequest("POST", "/import")
+    conn.putheader("Content-Type", f"multipart/form-data; boundary={boundary}")
+    conn.putheader("Content-Length", str(len(head) + os.path.getsize(path) + len(tail)))
+    conn.endheaders()
+    conn.send(head)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            conn.send(chunk)
+    conn.send(tail)
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    conn.close()
+    return body
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status", "r") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup zip import speed and memory.")
+    parser.add_argument("--images", type=int, default=600)
+    parser.add_argument("--image-kb", type=int, default=1024, help="size of each image, a multiple of 64")
+    args = parser.parse_args()
+
+    workdir = scratch_dir("import-zip")
+    backup = os.path.join(workdir, "backup.zip")
+    write_backup(backup, args.images, args.image_kb)
+    size = os.path.getsize(backup)
+    server_dir = os.path.join(workdir, "server")
+    os.makedirs(server_dir)
+    process, port = start_server([sys.executable, os.path.join(ROOT, "wsgi.py")], server_dir, SERVER="dev")
+    uploads = os.path.join(server_dir, "data", "uploads")
+    try:
+        print(f"backup: {mb(size):.0f} MB, {args.images} images of {args.image_kb} KB")
+        print(f"{'run':<10} {'time':>8} {'MB/s':>7} {'peak RSS':>10} {'uploads':>8}")
+        for run in ("first", "again"):
+            start = time.perf_counter()
+            result = post_file(port, backup)
+            elapsed = time.perf_counter() - start
+            assert result.get("success"), result
+            print(f"{run:<10} {elapsed:>7.2f}s {mb(size) / elapsed:>7.0f} {peak_rss_mb(process.pid):>7.0f} MB "
+                  f"{len(os.listdir(uploads)):>8}")
+    finally:
+        stop_server(process)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
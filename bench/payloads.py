@@ -0,0 +1,53 @@
+import argparse
+import json
+import random
+import sys
+
+from common import load_app, make_test, scratch_dir
+
+# Bytes on the wire for a large test and one attempt at it: /api/tests/<id>, the full
+# /api/results/<token> and the normalized results the results page asks for, each
+# uncompressed, gzip and br. br needs the optional `brotli` package. "pretty" is the
+# payload dumped with json.dumps' default separators, for scale.
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON payload sizes per encoding.")
+    parser.add_argument("--questions", type=int, default=500, help="questions in the test")
+    args = parser.parse_args()
+
+    app = load_app(scratch_dir("payloads"))
+    client = app.app.test_client()
+    test = {"id": app.new_test_id(), **make_test(args.questions)}
+    with app.DATA_STORE.lock():
+        app.DATA_STORE.put(test)
+
+    rng = random.Random(1)
+    form = {f"q{i}": str(rng.randrange(4)) for i in range(args.questions)}
+    response = client.post(f"/take/{test['id']}", data=form)
+    assert response.status_code == 302, response.status_code
+    token = response.headers["Location"].rstrip("/").rsplit("/", 1)[-1]
+
+    urls = [
+        ("test", f"/api/tests/{test['id']}"),
+        ("results", f"/api/results/{token}"),
+        ("normalized results", f"/api/results/{token}?normalized=1")
+    ]
+    print(f"{args.questions}-question test, one attempt")
+    print(f"{'payload':<20} {'pretty':>9} " + " ".join(f"{e:>9}" for e in ENCODINGS))
+    for label, url in urls:
+        plain = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert plain.status_code == 200, (url, plain.status_code)
+        pretty = len(json.dumps(json.loads(plain.data)).encode())
+        cells = []
+        for encoding in ENCODINGS:
+            response = client.get(url, headers={"Accept-Encoding": encoding})
+            served = response.headers.get("Content-Encoding", "identity")
+            cells.append(f"{len(response.data):>9,}" if served == encoding else f"{'-':>9}")
+        print(f"{label:<20} {pretty:>9,} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
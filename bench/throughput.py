@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from common import ROOT, make_test, scratch_dir, start_server, stop_server
+
+# Requests per second for GET /api/tests/<id> under gunicorn at 1, 2, 4 and 8 workers
+# (gunicorn.conf.py, gthread), and on the development server for reference. The load
+# generator keeps --connections keep-alive connections busy for --seconds. It runs on
+# the same machine, so leave it a core when comparing worker counts.
+
+GUNICORN = ["gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"), "--pythonpath", ROOT, "wsgi:app"]
+DEV = [sys.executable, os.path.join(ROOT, "wsgi.py")]
+
+
+async def connection(port, path, stop, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        status = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers.get("content-length", 0)))
+        latencies.append(time.perf_counter() - start)
+        if not status.startswith(b"HTTP/1.1 200"):
+            errors.append(status)
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.close()
+
+
+async def load(port, path, connections, seconds):
+    latencies = []
+    errors = []
+    stop = time.perf_counter() + seconds
+    await asyncio.gather(*[connection(port, path, stop, latencies, errors) for _ in range(connections)])
+    latencies.sort()
+    return len(latencies) / seconds, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GET /api/tests/<id> throughput per gunicorn worker count.")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated gunicorn worker counts")
+    parser.add_argument("--threads", type=int, default=8, help="gthread threads per worker")
+    parser.add_argument("--questions", type=int, default=200, help="questions in the served test")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--no-dev", action="store_true", help="skip the development server run")
+    args = parser.parse_args()
+
+    workdir = scratch_dir("throughput")
+    os.makedirs(os.path.join(workdir, "data"))
+    test = {"id": "bench", **make_test(args.questions)}
+    with open(os.path.join(workdir, "data", "data.json"), "w", encoding="utf-8") as f:
+        json.dump({"tests": [test]}, f)
+    path = "/api/tests/bench"
+
+    runs = [] if args.no_dev else [("dev server", DEV, {"SERVER": "dev"})]
+    for workers in [int(w) for w in args.workers.split(",")]:
+        runs.append((f"{workers} worker{'s' if workers > 1 else ''} x{args.threads}", GUNICORN, {
+            "WEB_CONCURRENCY": workers, "GUNICORN_THREADS": args.threads, "GUNICORN_GRACEFUL_TIMEOUT": 1
+        }))
+
+    print(f"{os.cpu_count()} CPUs, {args.connections} keep-alive connections, {args.seconds:g}s per run")
+    print(f"{'server':<16} {'req/s':>8} {'p50':>9} {'p99':>9}")
+    for label, command, env in runs:
+        process, port = start_server(command, workdir, **env)
+        try:
+            rate, p50, p99, errors = asyncio.run(load(port, path, args.connections, args.seconds))
+        finally:
+            stop_server(process)
+        print(f"{label:<16} {rate:>8.0f} {p50 * 1000:>6.1f} ms {p99 * 1000:>6.1f} ms" + (f"  {errors} errors" if errors else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+
+# Read by gunicorn from the working directory (see wsgi.py). Every setting can be
+# overridden with the environment variable next to it.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Threads per worker. Streamed AI explanations and import job progress streams each
+# hold a thread while they run, so keep this well above the expected number of them.
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+# Import the app (and open/migrate storage) once in the master before forking.
+# Code changes then need a full restart; SIGHUP only replaces the workers.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# A worker that stops heartbeating for this long is killed and replaced.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# On SIGHUP or SIGTERM, workers get this long to finish in-flight requests (and
+# batch import jobs) before they are killed.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle each worker after this many requests (0 = never). Jitter keeps workers
+# from restarting at the same moment.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
@@ -0,0 +1,635 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from urllib3.util.retry import Retry
+try:
+    import aiohttp
+except ImportError:  # only needed by the async (ASGI) server
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Server errors worth another try: Ollama answers these while a model is (re)loading
+# or behind a restarting proxy.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class OllamaError(Exception):
+    pass
+
+class OllamaUnavailable(OllamaError):
+    # Could not connect, or the server didn't answer within the read timeout.
+    pass
+
+class OllamaBadStatus(OllamaError):
+    def __init__(self, status_code, text=""):
+        super().__init__(f"Ollama returned HTTP {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+class OllamaOverloaded(OllamaError):
+    # Rejected by admission control; retry_after is a hint in whole seconds.
+    def __init__(self, retry_after):
+        super().__init__("Too many AI requests in progress")
+        self.retry_after = retry_after
+
+class OllamaInvalidResponse(OllamaError):
+    # Body that isn't JSON; `preview` holds the start of it for error messages.
+    def __init__(self, preview):
+        super().__init__("Ollama returned a non-JSON response")
+        self.preview = preview
+
+
+def extract_text(payload, strip=True):
+    # Answer text from any of the response shapes we accept: /api/chat
+    # (message.content), /api/generate (response) and OpenAI-style choices. Used for
+    # whole responses and, with strip=False, for streamed chunks.
+    if not isinstance(payload, dict):
+        return ""
+    candidates = []
+    message = payload.get("message")
+    if isinstance(message, dict):
+        candidates.append(message.get("content"))
+    candidates.append(payload.get("response"))
+    choices = payload.get("choices")
+    if isinstance(choices, list) and choices and isinstance(choices[0], dict):
+        first = choices[0]
+        for key in ("message", "delta"):
+            if isinstance(first.get(key), dict):
+                candidates.append(first[key].get("content"))
+        candidates.append(first.get("text"))
+    for value in candidates:
+        if value is None:
+            continue
+        text = str(value)
+        if strip:
+            text = text.strip()
+        if text:
+            return text
+    return ""
+
+def extract_thinking(payload):
+    # Reasoning models may return only "thinking" text and no answer.
+    if not isinstance(payload, dict):
+        return ""
+    message = payload.get("message")
+    if isinstance(message, dict) and str(message.get("thinking") or "").strip():
+        return str(message["thinking"]).strip()
+    return str(payload.get("thinking") or "").strip()
+
+
+class _ConnectionRetry(Retry):
+    # urllib3 treats read timeouts and dropped connections alike as read errors. Only
+    # the second is retried here: a dropped connection (reset, or a stale keep-alive
+    # socket) never got an answer, while after a read timeout the server may still be
+    # working on the (expensive) request.
+    def _is_read_error(self, err):
+        return isinstance(err, ProtocolError)
+
+
+class OllamaClient:
+    # One pooled keep-alive session shared by every Ollama call in the process.
+    # Connection failures, dropped connections and 5xx answers are retried with
+    # exponential backoff; read timeouts and 4xx answers are not.
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=30.0, retries=2, backoff=0.5):
+        self.timeout = (connect_timeout, read_timeout)
+        retry = _ConnectionRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            other=0,
+            status_forcelist=RETRY_STATUSES,
+            backoff_factor=backoff,
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, base_url, path, payload, stream=False):
+        try:
+            response = self.session.post(f"{base_url}{path}", json=payload, timeout=self.timeout, stream=stream)
+        except requests.RequestException as exc:
+            raise OllamaUnavailable(str(exc)) from exc
+        if response.status_code != 200:
+            text = "" if stream else response.text
+            response.close()
+            raise OllamaBadStatus(response.status_code, text)
+        return response
+
+    def post_json(self, base_url, path, payload):
+        response = self._post(base_url, path, {**payload, "stream": False})
+        try:
+            return response.json() if response.content else {}
+        except ValueError:
+            raise OllamaInvalidResponse(response.text[:200] if response.text else "Empty response")
+        except requests.RequestException as exc:
+            raise OllamaUnavailable(str(exc)) from exc
+
+    def chat(self, base_url, model, messages, options):
+        return self.post_json(base_url, "/api/chat", {"model": model, "messages": messages, "options": options})
+
+    def generate(self, base_url, model, prompt, system, options):
+        return self.post_json(base_url, "/api/generate", {"model": model, "prompt": prompt, "system": system, "options": options})
+
+    def open_chat_stream(self, base_url, model, messages, options):
+        # Returns the streaming response; pass it to iter_stream_text and close it
+        # when done so the connection goes back to the pool.
+        return self._post(base_url, "/api/chat", {"model": model, "messages": messages, "options": options, "stream": True}, stream=True)
+
+
+def iter_stream_text(response):
+    # Text deltas from an NDJSON streaming response. Chunks that carry an error or
+    # aren't JSON are skipped. Sets response.complete once the final "done" chunk
+    # has been read, so callers can tell a finished answer from a cut-off one.
+    response.complete = False
+    try:
+        for raw_line in response.iter_lines(decode_unicode=True):
+            if not raw_line:
+                continue
+            try:
+                chunk = json.loads(raw_line)
+            except ValueError:
+                continue
+            if not isinstance(chunk, dict) or chunk.get("error"):
+                continue
+            if chunk.get("done"):
+                response.complete = True
+            delta = extract_text(chunk, strip=False)
+            if delta:
+                yield delta
+    except requests.RequestException:
+        return
+    finally:
+        response.close()
+
+
+
+class AsyncOllamaClient:
+    # Event-loop counterpart of OllamaClient for the ASGI server: same timeouts,
+    # retries and exceptions, one pooled aiohttp session. Create it inside the
+    # running loop and aclose() it on shutdown.
+    def __init__(self, connect_timeout=5.0, read_timeout=30.0, retries=2, backoff=0.5):
+        if aiohttp is None:
+            raise RuntimeError("The async server needs aiohttp (pip install aiohttp).")
+        self.retries = retries
+        self.backoff = backoff
+        # Failed connects and dropped connections; read timeouts (SocketTimeoutError)
+        # are left out, as in OllamaClient.
+        self.retry_errors = (aiohttp.ClientOSError, aiohttp.ServerDisconnectedError, aiohttp.ConnectionTimeoutError)
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout),
+            connector=aiohttp.TCPConnector(limit=0)
+        )
+
+    async def aclose(self):
+        await self.session.close()
+
+    async def _post(self, base_url, path, payload, stream=False):
+        attempt = 0
+        while True:
+            try:
+                response = await self.session.post(f"{base_url}{path}", json=payload)
+            except self.retry_errors as exc:
+                if attempt >= self.retries:
+                    raise OllamaUnavailable(str(exc)) from exc
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                raise OllamaUnavailable(str(exc)) from exc
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    break
+                response.release()
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+        if response.status != 200:
+            text = ""
+            if not stream:
+                try:
+                    text = await response.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+                    pass
+            response.release()
+            raise OllamaBadStatus(response.status, text)
+        return response
+
+    async def post_json(self, base_url, path, payload):
+        response = await self._post(base_url, path, {**payload, "stream": False})
+        try:
+            body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            raise OllamaUnavailable(str(exc)) from exc
+        finally:
+            response.release()
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            text = body.decode("utf-8", "replace")
+            raise OllamaInvalidResponse(text[:200] if text else "Empty response")
+
+    async def chat(self, base_url, model, messages, options):
+        return await self.post_json(base_url, "/api/chat", {"model": model, "messages": messages, "options": options})
+
+    async def generate(self, base_url, model, prompt, system, options):
+        return await self.post_json(base_url, "/api/generate", {"model": model, "prompt": prompt, "system": system, "options": options})
+
+    async def open_chat_stream(self, base_url, model, messages, options):
+        # Pass the response to aiter_stream_text, which releases it.
+        return await self._post(base_url, "/api/chat", {"model": model, "messages": messages, "options": options, "stream": True}, stream=True)
+
+
+async def aiter_stream_text(response):
+    # Async version of iter_stream_text for aiohttp responses.
+    response.complete = False
+    try:
+        async for raw_line in response.content:
+            try:
+                chunk = json.loads(raw_line)
+            except ValueError:
+                continue
+            if not isinstance(chunk, dict) or chunk.get("error"):
+                continue
+            if chunk.get("done"):
+                response.complete = True
+            delta = extract_text(chunk, strip=False)
+            if delta:
+                yield delta
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return
+    finally:
+        response.release()
+
+
+class AdmissionLimiter:
+    # Caps concurrent model calls at max_active. Up to max_queue more callers wait
+    # (at most max_wait seconds) for a slot; anyone beyond that, or who times out, gets
+    # OllamaOverloaded straight away instead of tying up a request thread.
+    # Background work (wait=True) queues without those limits.
+    def __init__(self, max_active, max_queue, max_wait):
+        self.max_active = max(1, int(max_active))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max(0.0, float(max_wait))
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self.max_wait_seen = 0.0
+        self._hold_total = 0.0
+        self._released = 0
+
+    def retry_after(self):
+        # Caller holds self._cond. Rough time until a queued request would run.
+        if not self._released:
+            return 5
+        avg_hold = self._hold_total / self._released
+        return max(1, min(60, math.ceil(avg_hold * (self._waiting / self.max_active + 1))))
+
+    def acquire(self, wait=False):
+        start = time.monotonic()
+        with self._cond:
+            if self._active >= self.max_active:
+                if not wait and self._waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise OllamaOverloaded(self.retry_after())
+                self._waiting += 1
+                try:
+                    ready = self._cond.wait_for(
+                        lambda: self._active < self.max_active,
+                        timeout=None if wait else self.max_wait
+                    )
+                finally:
+                    self._waiting -= 1
+                if not ready:
+                    self.rejected += 1
+                    raise OllamaOverloaded(self.retry_after())
+            self._active += 1
+            self.admitted += 1
+            waited = time.monotonic() - start
+            self._wait_total += waited
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+        return time.monotonic()
+
+    def release(self, acquired_at):
+        with self._cond:
+            self._active -= 1
+            self._hold_total += time.monotonic() - acquired_at
+            self._released += 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, wait=False):
+        acquired_at = self.acquire(wait)
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+    async def acquire_async(self, wait=False):
+        # Same limits as acquire. A free slot is taken on the loop, unless callers are
+        # already queued for it; callers that have to queue wait on a pool thread, so
+        # at most max_queue threads are ever used.
+        with self._cond:
+            if self._active < self.max_active and self._waiting == 0:
+                self._active += 1
+                self.admitted += 1
+                return time.monotonic()
+        future = asyncio.get_running_loop().run_in_executor(None, self.acquire, wait)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The caller went away while queued; hand back the slot once it's granted.
+            future.add_done_callback(lambda f: f.exception() is None and self.release(f.result()))
+            raise
+
+    @asynccontextmanager
+    async def slot_async(self, wait=False):
+        acquired_at = await self.acquire_async(wait)
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "max_active": self.max_active,
+                "queue_depth": self._waiting,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / self.admitted * 1000, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_wait_seen * 1000, 1)
+            }
+
+
+@contextmanager
+def _no_limit(wait=False):
+    yield
+
+@asynccontextmanager
+async def _no_limit_async(wait=False):
+    yield
+
+
+class SingleFlight:
+    # Coalesces identical concurrent calls: the first caller for a key runs fn, and
+    # callers arriving while it runs wait and share its result (or exception). The
+    # shared result must be treated as read-only. With a limiter, only the leader
+    # takes a slot.
+    def __init__(self, limiter=None):
+        self._slot = limiter.slot if limiter is not None else _no_limit
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, wait=False):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            with self._slot(wait):
+                call["result"] = fn()
+            return call["result"]
+        except Exception as exc:
+            call["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
+
+
+class _Stream:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.parts = []
+        self.started = False
+        self.finished = False
+        self.error = None
+
+    def subscribe(self):
+        # Replays everything received so far, then follows the live stream.
+        idx = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.parts) > idx or self.finished)
+                chunk = self.parts[idx:]
+                idx = len(self.parts)
+                done = self.finished
+            yield from chunk
+            if done:
+                return
+
+
+class StreamFanout:
+    # One upstream streaming generation per key, read by a background thread and fanned
+    # out to every subscriber (late joiners get a replay of the text so far). The
+    # upstream is read to the end even if every subscriber disconnects, and
+    # on_complete(text) runs once for a stream that finished cleanly.
+    def __init__(self, limiter=None):
+        self._slot = limiter.slot if limiter is not None else _no_limit
+        self._lock = threading.Lock()
+        self._streams = {}
+        self.streams = 0
+        self.shared = 0
+
+    def join(self, key, opener, on_complete=None):
+        # Returns a generator of text deltas. Raises the opener's OllamaError when
+        # the upstream request could not be started.
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = _Stream()
+                self._streams[key] = stream
+                self.streams += 1
+                threading.Thread(target=self._pump, args=(key, stream, opener, on_complete), daemon=True).start()
+            else:
+                self.shared += 1
+        with stream.cond:
+            stream.cond.wait_for(lambda: stream.started)
+            if stream.error is not None:
+                raise stream.error
+        return stream.subscribe()
+
+    def _pump(self, key, stream, opener, on_complete):
+        try:
+            try:
+                with self._slot():
+                    response = opener()
+                    with stream.cond:
+                        stream.started = True
+                        stream.cond.notify_all()
+                    for delta in iter_stream_text(response):
+                        with stream.cond:
+                            stream.parts.append(delta)
+                            stream.cond.notify_all()
+            except OllamaError as exc:
+                with stream.cond:
+                    stream.error = exc
+                    stream.started = True
+                    stream.finished = True
+                    stream.cond.notify_all()
+                return
+            if on_complete is not None and response.complete:
+                on_complete("".join(stream.parts))
+        except Exception as exc:
+            logger.exception("Streaming generation failed")
+            # A join() still waiting for the start raises this rather than returning
+            # an empty stream.
+            with stream.cond:
+                if stream.error is None:
+                    stream.error = OllamaError(f"Streaming generation failed: {exc}")
+        finally:
+            with stream.cond:
+                stream.started = True
+                stream.finished = True
+                stream.cond.notify_all()
+            with self._lock:
+                if self._streams.get(key) is stream:
+                    del self._streams[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._streams), "streams": self.streams, "shared": self.shared}
+
+
+class AsyncSingleFlight:
+    # SingleFlight for coroutines on one event loop. The leader's call runs as its own
+    # task, so it finishes (and can be cached) even if the leader disconnects.
+    def __init__(self, limiter=None):
+        self._slot = limiter.slot_async if limiter is not None else _no_limit_async
+        self._tasks = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn, wait=False):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(fn, wait))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, fn, wait):
+        async with self._slot(wait):
+            return await fn()
+
+    def stats(self):
+        return {"in_flight": len(self._tasks), "calls": self.calls, "shared": self.shared}
+
+
+class _AsyncStream:
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.parts = []
+        self.started = False
+        self.finished = False
+        self.error = None
+        self.task = None
+
+    async def update(self, **changes):
+        async with self.cond:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.cond.notify_all()
+
+    async def append(self, delta):
+        async with self.cond:
+            self.parts.append(delta)
+            self.cond.notify_all()
+
+    async def subscribe(self):
+        idx = 0
+        while True:
+            async with self.cond:
+                await self.cond.wait_for(lambda: len(self.parts) > idx or self.finished)
+                chunk = self.parts[idx:]
+                idx = len(self.parts)
+                done = self.finished
+            for delta in chunk:
+                yield delta
+            if done:
+                return
+
+
+class AsyncStreamFanout:
+    # StreamFanout for coroutines: the upstream is pumped by a task on the event loop
+    # rather than a thread. opener is a coroutine function returning an aiohttp streaming
+    # response; on_complete(text) is a plain function and runs on a pool thread.
+    def __init__(self, limiter=None):
+        self._slot = limiter.slot_async if limiter is not None else _no_limit_async
+        self._streams = {}
+        self.streams = 0
+        self.shared = 0
+
+    async def join(self, key, opener, on_complete=None):
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = _AsyncStream()
+            self._streams[key] = stream
+            self.streams += 1
+            stream.task = asyncio.ensure_future(self._pump(key, stream, opener, on_complete))
+        else:
+            self.shared += 1
+        async with stream.cond:
+            await stream.cond.wait_for(lambda: stream.started)
+            if stream.error is not None:
+                raise stream.error
+        return stream.subscribe()
+
+    async def _pump(self, key, stream, opener, on_complete):
+        try:
+            try:
+                async with self._slot():
+                    response = await opener()
+                    await stream.update(started=True)
+                    async for delta in aiter_stream_text(response):
+                        await stream.append(delta)
+            except OllamaError as exc:
+                await stream.update(error=exc, started=True, finished=True)
+                return
+            if on_complete is not None and response.complete:
+                await asyncio.get_running_loop().run_in_executor(None, on_complete, "".join(stream.parts))
+        except Exception as exc:
+            logger.exception("Streaming generation failed")
+            if stream.error is None:
+                await stream.update(error=OllamaError(f"Streaming generation failed: {exc}"))
+        finally:
+            if self._streams.get(key) is stream:
+                del self._streams[key]
+            await stream.update(started=True, finished=True)
+
+    def stats(self):
+        return {"in_flight": len(self._streams), "streams": self.streams, "shared": self.shared}
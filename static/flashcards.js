@@ -23,8 +23,8 @@ function cacheDom() {
 }
 
 function getTestId() {
-  const match = window.location.pathname.match(/\/flashcards\/(\d+)/);
-  return match ? parseInt(match[1], 10) : null;
+  const match = window.location.pathname.match(/\/flashcards\/([^/]+)/);
+  return match ? decodeURIComponent(match[1]) : null;
 }
 
 function showError(message) {
@@ -82,7 +82,7 @@ function renderCard() {
   }
 
   if (q.image) {
-    dom.image.src = `/uploads/${encodeURIComponent(q.image)}`;
+    dom.image.src = uploadedImageUrl(q.image, Math.min(window.innerWidth, 1200));
     dom.image.classList.remove("d-none");
   } else {
     dom.image.src = "";
@@ -128,11 +128,9 @@ async function generateAiSummary() {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
-        question: q.question,
-        options: q.options,
-        correct_index: q.correct_index,
-        selected_index: null,
-        explanation: q.explanation || ""
+        test_id: TEST_DATA.id,
+        question_index: q.__origIdx,
+        selected_index: null
       })
     });
 
@@ -169,11 +167,9 @@ async function generateAiSummary() {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
-          question: q.question,
-          options: q.options,
-          correct_index: q.correct_index,
-          selected_index: null,
-          explanation: q.explanation || ""
+          test_id: TEST_DATA.id,
+          question_index: q.__origIdx,
+          selected_index: null
         })
       });
       if (!fallback.ok) {
@@ -203,7 +199,7 @@ async function generateAiSummary() {
 }
 
 async function appendAiSummaryToExplanation() {
-  if (!TEST_DATA || typeof TEST_DATA.id !== "number") return;
+  if (!TEST_DATA || TEST_DATA.id === undefined || TEST_DATA.id === null) return;
   if (!lastAiSummary || !QUESTIONS.length) return;
   const q = QUESTIONS[currentIndex];
   const originalIndex = Number(q.__origIdx);
@@ -214,7 +210,7 @@ async function appendAiSummaryToExplanation() {
   dom.appendAiBtn.textContent = "Appending...";
 
   try {
-    const response = await fetch(`/api/tests/${TEST_DATA.id}/questions/${originalIndex}/append-explanation`, {
+    const response = await fetch(`/api/tests/${encodeURIComponent(TEST_DATA.id)}/questions/${originalIndex}/append-explanation`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ summary: lastAiSummary })
@@ -243,7 +239,7 @@ async function appendAiSummaryToExplanation() {
 
 async function loadTest(testId) {
   try {
-    const response = await fetch(`/api/tests/${testId}`);
+    const response = await fetch(`/api/tests/${encodeURIComponent(testId)}?answers=1`);
     if (!response.ok) {
       throw new Error(response.status === 404 ? "Test not found." : "Failed to load test.");
     }
@@ -1,4 +1,6 @@
 const dom = {};
+const PAGE_SIZE = 50;
+let nextBefore = null;
 
 function cacheDom() {
   dom.list = document.getElementById("history-list");
@@ -6,6 +8,7 @@ function cacheDom() {
   dom.error = document.getElementById("history-error");
   dom.status = document.getElementById("history-status");
   dom.clearBtn = document.getElementById("clear-history-btn");
+  dom.moreBtn = document.getElementById("history-more-btn");
 }
 
 function showError(message) {
@@ -86,28 +89,46 @@ function renderAttempt(attempt) {
   return wrapper;
 }
 
-function renderHistory(items) {
+function renderHistory(items, append = false) {
   if (!dom.list || !dom.empty) return;
-  dom.list.innerHTML = "";
-  if (!items.length) {
+  if (!append) {
+    dom.list.innerHTML = "";
+  }
+  if (!items.length && !append) {
     dom.empty.classList.remove("d-none");
     return;
   }
   dom.empty.classList.add("d-none");
-  items.forEach((item) => dom.list.appendChild(renderAttempt(item)));
+  const fragment = document.createDocumentFragment();
+  items.forEach((item) => fragment.appendChild(renderAttempt(item)));
+  dom.list.appendChild(fragment);
+}
+
+function setMoreVisible(visible) {
+  if (!dom.moreBtn) return;
+  dom.moreBtn.classList.toggle("d-none", !visible);
+  dom.moreBtn.disabled = false;
 }
 
-async function loadHistory() {
+async function loadHistory(append = false) {
   clearError();
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  if (append && nextBefore) {
+    params.set("before", nextBefore);
+  }
+  if (dom.moreBtn) dom.moreBtn.disabled = true;
   try {
-    const response = await fetch("/api/attempts");
+    const response = await fetch(`/api/attempts?${params.toString()}`);
     if (!response.ok) {
       throw new Error("Failed to load history.");
     }
     const data = await response.json();
     const items = Array.isArray(data.attempts) ? data.attempts : [];
-    renderHistory(items);
+    nextBefore = data.has_more ? data.next_before : null;
+    renderHistory(items, append);
+    setMoreVisible(Boolean(nextBefore));
   } catch (err) {
+    setMoreVisible(Boolean(nextBefore));
     showError(err.message || "Failed to load history.");
   }
 }
@@ -159,5 +180,8 @@ document.addEventListener("DOMContentLoaded", () => {
   if (dom.clearBtn) {
     dom.clearBtn.addEventListener("click", clearHistory);
   }
+  if (dom.moreBtn) {
+    dom.moreBtn.addEventListener("click", () => loadHistory(true));
+  }
   loadHistory();
 });
@@ -0,0 +1,8 @@
+// Helpers for question images, shared by the test, results and flashcards pages.
+
+function uploadedImageUrl(name, cssWidth) {
+  // The server resizes to the next of 480/960/1600 px wide; larger images are
+  // only fetched in full for the zoom viewer.
+  const width = Math.ceil(cssWidth * (window.devicePixelRatio || 1));
+  return `/uploads/${encodeURIComponent(name)}?w=${width}`;
+}
@@ -252,17 +252,17 @@ function createTestListItem(test) {
   actions.className = "action-buttons d-flex flex-wrap gap-2 justify-content-end justify-content-md-start w-100 w-md-auto";
 
   const takeLink = document.createElement("a");
-  takeLink.href = `/take/${test.id}`;
+  takeLink.href = `/take/${encodeURIComponent(test.id)}`;
   takeLink.className = "btn btn-sm btn-primary flex-grow-1 flex-md-grow-0 test-take";
   takeLink.textContent = "Take";
 
   const flashcardsLink = document.createElement("a");
-  flashcardsLink.href = `/flashcards/${test.id}`;
+  flashcardsLink.href = `/flashcards/${encodeURIComponent(test.id)}`;
   flashcardsLink.className = "btn btn-sm btn-info flex-grow-1 flex-md-grow-0 test-flashcards";
   flashcardsLink.textContent = "Flashcards";
 
   const editLink = document.createElement("a");
-  editLink.href = `/edit/${test.id}`;
+  editLink.href = `/edit/${encodeURIComponent(test.id)}`;
   editLink.className = "btn btn-sm btn-warning flex-grow-1 flex-md-grow-0 test-edit";
   editLink.textContent = "Edit";
 
@@ -294,15 +294,15 @@ function updateTestListItem(li, test) {
   }
   const takeLink = li.querySelector(".test-take");
   if (takeLink) {
-    takeLink.href = `/take/${test.id}`;
+    takeLink.href = `/take/${encodeURIComponent(test.id)}`;
   }
   const editLink = li.querySelector(".test-edit");
   if (editLink) {
-    editLink.href = `/edit/${test.id}`;
+    editLink.href = `/edit/${encodeURIComponent(test.id)}`;
   }
   const flashcardsLink = li.querySelector(".test-flashcards");
   if (flashcardsLink) {
-    flashcardsLink.href = `/flashcards/${test.id}`;
+    flashcardsLink.href = `/flashcards/${encodeURIComponent(test.id)}`;
   }
   const deleteBtn = li.querySelector(".test-delete");
   if (deleteBtn) {
@@ -324,7 +324,7 @@ function setSkeletonVisible(visible) {
 function showDeleteModal(test) {
   if (!dom.deleteModalInstance || !dom.deleteTitle || !dom.deleteConfirm) return;
   dom.deleteTitle.textContent = test.title || "Untitled Test";
-  dom.deleteConfirm.href = `/delete/${test.id}`;
+  dom.deleteConfirm.href = `/delete/${encodeURIComponent(test.id)}`;
   dom.deleteModalInstance.show();
 }
 
@@ -388,7 +388,7 @@ async function runAiImageImport() {
     }
 
     aiDraft = {
-      testId: Number(selectedTest),
+      testId: selectedTest,
       question: data.question?.question || "",
       options: Array.isArray(data.question?.options) ? data.question.options : [],
       correct_index: Number(data.question?.correct_index ?? 0),
@@ -427,69 +427,102 @@ async function runAiImageBatchImport() {
   dom.aiImportBtn.disabled = true;
   if (dom.aiPreviewSave) dom.aiPreviewSave.disabled = true;
 
-  let added = 0;
-  let failed = 0;
-  const failures = [];
+  const formData = new FormData();
+  files.forEach(file => formData.append("images", file));
+  formData.append("attach_source_image", dom.aiImportAttachImage && dom.aiImportAttachImage.checked ? "on" : "off");
 
-  for (let i = 0; i < files.length; i++) {
-    const file = files[i];
+  try {
     dom.aiImportStatus.className = "text-info small mt-2";
-    dom.aiImportStatus.textContent = `Batch ${i + 1}/${files.length}: processing ${file.name}...`;
-
-    const formData = new FormData();
-    formData.append("image", file);
-    formData.append("attach_source_image", dom.aiImportAttachImage && dom.aiImportAttachImage.checked ? "on" : "off");
-
-    try {
-      const draftRes = await fetch(`/api/tests/${encodeURIComponent(selectedTest)}/ai-import-question`, {
-        method: "POST",
-        body: formData
-      });
-      const draftData = await draftRes.json().catch(() => ({}));
-      if (!draftRes.ok || !draftData.question) {
-        throw new Error(draftData.error || "AI draft failed");
-      }
+    dom.aiImportStatus.textContent = `Uploading ${files.length} images...`;
+    const response = await fetch(`/api/tests/${encodeURIComponent(selectedTest)}/ai-import-jobs`, {
+      method: "POST",
+      body: formData
+    });
+    const job = await response.json().catch(() => ({}));
+    if (!response.ok || !job.id) {
+      throw new Error(job.error || "Batch import failed to start.");
+    }
+
+    // The server keeps working if this page is closed; the questions still get saved.
+    dom.aiImportImage.value = "";
+    clearAiDraft();
+    const finalJob = await followAiImportJob(job);
+    await loadTests();
+    showAiImportJobResult(finalJob);
+  } catch (err) {
+    dom.aiImportStatus.className = "text-danger small mt-2";
+    dom.aiImportStatus.textContent = err.message || "Batch import failed.";
+  } finally {
+    dom.aiImportBatchBtn.disabled = false;
+    dom.aiImportBtn.disabled = false;
+    if (dom.aiPreviewSave) dom.aiPreviewSave.disabled = false;
+  }
+}
 
-      const commitRes = await fetch(`/api/tests/${encodeURIComponent(selectedTest)}/ai-import-question/commit`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          question: draftData.question.question || "",
-          options: Array.isArray(draftData.question.options) ? draftData.question.options : [],
-          correct_index: Number(draftData.question.correct_index ?? 0),
-          explanation: draftData.question.explanation || "",
-          image: draftData.question.image || ""
-        })
-      });
-      const commitData = await commitRes.json().catch(() => ({}));
-      if (!commitRes.ok) {
-        throw new Error(commitData.error || "Save failed");
+async function followAiImportJob(job) {
+  showAiImportJobProgress(job);
+  try {
+    const response = await fetch(`/api/ai-import-jobs/${encodeURIComponent(job.id)}/events`);
+    if (!response.ok || !response.body) throw new Error("Progress stream unavailable.");
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      let newline = buffered.indexOf("\n");
+      while (newline !== -1) {
+        const line = buffered.slice(0, newline).trim();
+        buffered = buffered.slice(newline + 1);
+        if (line) {
+          job = JSON.parse(line);
+          showAiImportJobProgress(job);
+        }
+        newline = buffered.indexOf("\n");
       }
+    }
+  } catch (err) {
+    console.warn("Falling back to polling:", err);
+  }
 
-      added += 1;
-    } catch (err) {
-      failed += 1;
-      failures.push(`${file.name}: ${err.message || "Unknown error"}`);
+  while (job.status === "running") {
+    await new Promise(resolve => setTimeout(resolve, 2000));
+    const response = await fetch(`/api/ai-import-jobs/${encodeURIComponent(job.id)}`);
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      throw new Error(data.error || "Lost track of the batch import.");
     }
+    job = data;
+    showAiImportJobProgress(job);
   }
+  return job;
+}
 
-  dom.aiImportImage.value = "";
-  clearAiDraft();
-  await loadTests();
+function showAiImportJobProgress(job) {
+  if (!dom.aiImportStatus || job.status !== "running") return;
+  dom.aiImportStatus.className = "text-info small mt-2";
+  dom.aiImportStatus.textContent = `Batch ${job.completed}/${job.total} processed (${job.failed} failed)...`;
+}
 
-  if (failed === 0) {
+function showAiImportJobResult(job) {
+  if (!dom.aiImportStatus) return;
+  const failures = (job.items || [])
+    .filter(item => item.status === "failed")
+    .map(item => `${item.name}: ${item.error || "Unknown error"}`);
+
+  if (job.status === "failed") {
+    dom.aiImportStatus.className = "text-danger small mt-2";
+    dom.aiImportStatus.textContent = `Batch failed: ${job.error || "Save failed"}`;
+  } else if (failures.length === 0) {
     dom.aiImportStatus.className = "text-success small mt-2";
-    dom.aiImportStatus.textContent = `Batch complete: added ${added}/${files.length} questions.`;
+    dom.aiImportStatus.textContent = `Batch complete: added ${job.added}/${job.total} questions.`;
   } else {
     const preview = failures.slice(0, 3).join(" | ");
     const more = failures.length > 3 ? ` (+${failures.length - 3} more)` : "";
     dom.aiImportStatus.className = "text-warning small mt-2";
-    dom.aiImportStatus.textContent = `Batch complete: added ${added}, failed ${failed}. ${preview}${more}`;
+    dom.aiImportStatus.textContent = `Batch complete: added ${job.added}, failed ${failures.length}. ${preview}${more}`;
   }
-
-  dom.aiImportBatchBtn.disabled = false;
-  dom.aiImportBtn.disabled = false;
-  if (dom.aiPreviewSave) dom.aiPreviewSave.disabled = false;
 }
 
 function clearAiDraft() {
@@ -50,7 +50,8 @@ function renderAnswer(answer, idx) {
   if (imageBlock) {
     imageBlock.className = "question-image mb-3";
     imageBlock.alt = "Question image";
-    imageBlock.src = `/uploads/${encodeURIComponent(answer.image)}`;
+    imageBlock.loading = "lazy";
+    imageBlock.src = uploadedImageUrl(answer.image, 480);
   }
 
   const yourAnswerBlock = document.createElement("div");
@@ -159,13 +160,53 @@ function renderResults(payload) {
   answers.forEach((answer, idx) => dom.questionsContainer.appendChild(renderAnswer(answer, idx)));
 }
 
+async function fetchResultsPayload(url) {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(response.status === 404 ? "Results not found." : "Failed to load results.");
+  }
+  return response.json();
+}
+
+async function inlineTestQuestions(payload) {
+  // Normalized results refer to questions of one snapshot of the test, which the
+  // browser caches across attempts. Null if that snapshot is gone (test edited).
+  const response = await fetch(
+    `/api/tests/${encodeURIComponent(payload.test_id)}?v=${encodeURIComponent(payload.test_version)}&answers=1`
+  );
+  if (!response.ok) {
+    return null;
+  }
+  const test = await response.json();
+  const questions = Array.isArray(test.questions) ? test.questions : [];
+  const answers = [];
+  for (const answer of payload.answers || []) {
+    if (typeof answer.question_index !== "number") {
+      answers.push(answer);
+      continue;
+    }
+    const q = questions[answer.question_index];
+    if (!q) {
+      return null;
+    }
+    answers.push({
+      ...answer,
+      question: q.question,
+      options: q.options,
+      explanation: q.explanation || "",
+      image: q.image || ""
+    });
+  }
+  return { ...payload, answers };
+}
+
 async function fetchResults(token) {
+  const url = `/api/results/${encodeURIComponent(token)}`;
   try {
-    const response = await fetch(`/api/results/${encodeURIComponent(token)}`);
-    if (!response.ok) {
-      throw new Error(response.status === 404 ? "Results not found." : "Failed to load results.");
+    let payload = await fetchResultsPayload(`${url}?normalized=1`);
+    if (payload && payload.test_version) {
+      payload = (await inlineTestQuestions(payload)) || (await fetchResultsPayload(url));
     }
-    const payload = await response.json();
     renderResults(payload);
   } catch (err) {
     console.error("Failed to load results:", err);
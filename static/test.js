@@ -1,7 +1,7 @@
-let TEST_DATA = null;
+let SESSION = null;
+// Questions by position in the session's shuffled order, filled in a page at a time.
 let QUESTIONS = [];
-let indexMap = [];
-let optionMap = [];
+const pageRequests = {};
 let currentQuestionIndex = 0;
 let userAnswers = {};
 let zoomScale = 1;
@@ -31,7 +31,7 @@ document.addEventListener("DOMContentLoaded", () => {
     return;
   }
 
-  dom.form.action = `/take/${testId}`;
+  dom.form.action = `/take/${encodeURIComponent(testId)}`;
   attachEventListeners();
   loadTest(testId);
 });
@@ -129,19 +129,24 @@ function attachEventListeners() {
 }
 
 function extractTestId() {
-  const match = window.location.pathname.match(/\/take\/(\d+)/);
-  return match ? parseInt(match[1], 10) : null;
+  const match = window.location.pathname.match(/\/take\/([^/]+)/);
+  return match ? decodeURIComponent(match[1]) : null;
 }
 
 async function loadTest(testId) {
   try {
-    const response = await fetch(`/api/tests/${testId}`);
+    // The server shuffles questions and options and sends them without answers.
+    const response = await fetch(`/api/tests/${encodeURIComponent(testId)}/sessions`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: "{}"
+    });
     if (!response.ok) {
       throw new Error(response.status === 404 ? "Test not found." : "Failed to fetch test data.");
     }
 
     const data = await response.json();
-    setupTestData(data);
+    setupSession(data);
 
     dom.testTitle.textContent = data.title || "Untitled Test";
     document.title = data.title ? `${data.title} - TestMaker` : "TestMaker";
@@ -159,89 +164,98 @@ async function loadTest(testId) {
   }
 }
 
-function setupTestData(data) {
-  TEST_DATA = data;
-  const questionList = Array.isArray(data.questions) ? data.questions : [];
-  const prepared = prepareQuestionState(questionList);
-
-  QUESTIONS = prepared.questions;
-  indexMap = prepared.indexMap;
-  optionMap = prepared.optionMap;
+function setupSession(data) {
+  SESSION = data;
+  QUESTIONS = new Array(Math.max(0, Number(data.total) || 0));
+  storeQuestions(data.questions);
 
   userAnswers = {};
   currentQuestionIndex = 0;
   clearResult();
-  initHiddenInputs(questionList.length);
+  initHiddenInputs(data.session_id);
   initQuestionShell();
 }
 
-function prepareQuestionState(questionList) {
-  const withShuffledOptions = questionList.map((question, origIdx) => {
-    const options = Array.isArray(question.options) ? question.options : [];
-    const order = options.map((_, idx) => idx);
-    shuffleInPlace(order);
-
-    const shuffledOptions = order.map(idx => options[idx]);
-    const correctIndex = order.indexOf(question.correct_index);
-
-    return {
-      ...question,
-      options: shuffledOptions,
-      correct_index: correctIndex,
-      __origIdx: origIdx,
-      __optionMap: order
-    };
+function storeQuestions(questions) {
+  (Array.isArray(questions) ? questions : []).forEach(q => {
+    if (Number.isInteger(q.position) && q.position >= 0 && q.position < QUESTIONS.length) {
+      QUESTIONS[q.position] = q;
+    }
   });
+}
 
-  shuffleInPlace(withShuffledOptions);
-
-  const mapQ = withShuffledOptions.map(q => q.__origIdx);
-  const mapOpt = withShuffledOptions.map(q => q.__optionMap);
-  const sanitizedQuestions = withShuffledOptions.map(({ __origIdx, __optionMap, ...rest }) => rest);
+function loadQuestionPage(position) {
+  const pageSize = SESSION.page_size || 50;
+  const offset = Math.floor(position / pageSize) * pageSize;
+  if (QUESTIONS[position]) {
+    return Promise.resolve();
+  }
+  if (!pageRequests[offset]) {
+    const url = `/api/sessions/${encodeURIComponent(SESSION.session_id)}/questions?offset=${offset}&limit=${pageSize}`;
+    pageRequests[offset] = fetch(url)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(
+            response.status === 404 ? "This test session has expired. Reload the page to start again." : "Failed to load questions."
+          );
+        }
+        return response.json();
+      })
+      .then(data => storeQuestions(data.questions))
+      .finally(() => {
+        delete pageRequests[offset];
+      });
+  }
+  return pageRequests[offset];
+}
 
-  return {
-    questions: sanitizedQuestions,
-    indexMap: mapQ,
-    optionMap: mapOpt
-  };
+function prefetchQuestions(position) {
+  // Fetch the next page a few questions before it's needed.
+  const ahead = position + 10;
+  if (ahead < QUESTIONS.length && !QUESTIONS[ahead]) {
+    loadQuestionPage(ahead).catch(() => {});
+  }
 }
 
-function shuffleInPlace(arr) {
-  for (let i = arr.length - 1; i > 0; i--) {
-    const j = Math.floor(Math.random() * (i + 1));
-    [arr[i], arr[j]] = [arr[j], arr[i]];
+function showQuestion(position) {
+  currentQuestionIndex = position;
+  if (QUESTIONS[position]) {
+    renderQuestion();
+    return;
   }
-  return arr;
+  setLoadingState(true);
+  setControlsDisabled(true);
+  loadQuestionPage(position)
+    .then(() => {
+      if (currentQuestionIndex !== position) return;
+      setControlsDisabled(false);
+      renderQuestion();
+    })
+    .catch(err => showFatalError(err.message || "Unable to load questions."));
 }
 
-function initHiddenInputs(count) {
+function initHiddenInputs(sessionId) {
   const hidden = document.getElementById("hidden-answers");
   hidden.innerHTML = "";
-  for (let i = 0; i < count; i++) {
-    const input = document.createElement("input");
-    input.type = "hidden";
-    input.name = `q${i}`;
-    input.id = `hidden_q${i}`;
-    hidden.appendChild(input);
-  }
+  const input = document.createElement("input");
+  input.type = "hidden";
+  input.name = "session";
+  input.value = sessionId;
+  hidden.appendChild(input);
 }
 
-function syncHiddenFor(shuffledIdx) {
-  if (indexMap[shuffledIdx] === undefined) return;
-
-  const origQ = indexMap[shuffledIdx];
-  const hidden = document.getElementById(`hidden_q${origQ}`);
-  if (!hidden) return;
-
-  const shuffledOpt = userAnswers[shuffledIdx];
-  if (shuffledOpt === undefined || shuffledOpt === null || shuffledOpt === "") {
-    hidden.value = "";
-    return;
+function syncHiddenFor(position) {
+  // Answers are submitted by position and shown option; the server maps them back.
+  let hidden = document.getElementById(`hidden_s${position}`);
+  if (!hidden) {
+    hidden = document.createElement("input");
+    hidden.type = "hidden";
+    hidden.name = `s${position}`;
+    hidden.id = `hidden_s${position}`;
+    document.getElementById("hidden-answers").appendChild(hidden);
   }
-
-  const questionOptionMap = optionMap[shuffledIdx] || [];
-  const origOpt = questionOptionMap[shuffledOpt];
-  hidden.value = origOpt === undefined ? "" : String(origOpt);
+  const selected = userAnswers[position];
+  hidden.value = selected === undefined || selected === null || selected === "" ? "" : String(selected);
 }
 
 function renderQuestion() {
@@ -262,11 +276,12 @@ function renderQuestion() {
 
   if (dom.questionImage) {
     if (question.image) {
-      dom.questionImage.src = `/uploads/${encodeURIComponent(question.image)}`;
+      const originalUrl = `/uploads/${encodeURIComponent(question.image)}`;
+      dom.questionImage.src = uploadedImageUrl(question.image, Math.min(window.innerWidth, 1200));
       dom.questionImage.alt = "Question image";
       dom.questionImage.classList.remove("d-none");
       if (!isTouchDevice()) {
-        dom.questionImage.onclick = () => openImageViewer(dom.questionImage.src, dom.questionImage.alt);
+        dom.questionImage.onclick = () => openImageViewer(originalUrl, dom.questionImage.alt);
       } else {
         dom.questionImage.onclick = null;
       }
@@ -313,6 +328,7 @@ function renderQuestion() {
   updateProgress();
   clearResult();
   setLoadingState(false);
+  prefetchQuestions(currentQuestionIndex);
   requestAnimationFrame(() => {
     dom.questionContent.style.opacity = "1";
   });
@@ -367,7 +383,28 @@ function getSelectedAnswer() {
   return selected ? parseInt(selected.value, 10) : null;
 }
 
-function handleCheck() {
+async function fetchAnswerKey(position, selected) {
+  // Questions arrive without answers; the key is fetched when a question is checked
+  // with an answer picked, and kept on it.
+  const question = QUESTIONS[position];
+  if (question.correct_index === undefined) {
+    const response = await fetch(`/api/sessions/${encodeURIComponent(SESSION.session_id)}/check`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ position, selected })
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      throw new Error(data.error || "Unable to check answer.");
+    }
+    question.correct_index = data.correct_index;
+    question.explanation = data.explanation || "";
+    question.option_order = data.option_order || [];
+  }
+  return question;
+}
+
+async function handleCheck() {
   if (!QUESTIONS.length) return;
   const selected = getSelectedAnswer();
   if (selected === null) {
@@ -375,15 +412,23 @@ function handleCheck() {
     return;
   }
 
-  userAnswers[currentQuestionIndex] = selected;
-  syncHiddenFor(currentQuestionIndex);
+  const position = currentQuestionIndex;
+  userAnswers[position] = selected;
+  syncHiddenFor(position);
 
-  const correctIndex = QUESTIONS[currentQuestionIndex].correct_index;
-  const explanation = QUESTIONS[currentQuestionIndex].explanation || "";
-  showResult(selected === correctIndex, explanation);
+  let question;
+  try {
+    question = await fetchAnswerKey(position, selected);
+  } catch (err) {
+    dom.resultMsg.className = "mt-2 text-warning";
+    dom.resultMsg.textContent = err.message;
+    return;
+  }
+  if (currentQuestionIndex !== position) return;
+  showResult(selected === question.correct_index, question.explanation || "");
 
   if (dom.aiToggle && dom.aiToggle.checked) {
-    requestAiSummary(QUESTIONS[currentQuestionIndex], selected);
+    requestAiSummary(question, selected);
   }
 }
 
@@ -393,12 +438,12 @@ async function requestAiSummary(question, selectedIndex) {
   dom.aiSummary.className = "mt-2 text-info";
   dom.aiSummary.textContent = "Generating AI summary...";
 
+  // The server looks the question up, so the summary (and its cache entry) is the
+  // same however this session shuffled the options.
   const payload = {
-    question: question.question,
-    options: question.options,
-    correct_index: question.correct_index,
-    selected_index: selectedIndex,
-    explanation: question.explanation || ""
+    test_id: SESSION.test_id,
+    question_index: question.index,
+    selected_index: selectedIndex === null ? null : question.option_order[selectedIndex] ?? null
   };
 
   try {
@@ -429,8 +474,8 @@ async function requestAiSummary(question, selectedIndex) {
 
     if (summary) {
       lastAiSummary = summary;
-      lastAiQuestionOrigIdx = indexMap[currentQuestionIndex];
-      lastAiQuestionShuffledIdx = currentQuestionIndex;
+      lastAiQuestionOrigIdx = question.index;
+      lastAiQuestionShuffledIdx = question.position;
       if (dom.appendAiBtn) {
         dom.appendAiBtn.classList.remove("d-none");
       }
@@ -455,8 +500,8 @@ async function requestAiSummary(question, selectedIndex) {
         throw new Error("No summary returned.");
       }
       lastAiSummary = summary;
-      lastAiQuestionOrigIdx = indexMap[currentQuestionIndex];
-      lastAiQuestionShuffledIdx = currentQuestionIndex;
+      lastAiQuestionOrigIdx = question.index;
+      lastAiQuestionShuffledIdx = question.position;
       if (dom.appendAiBtn) {
         dom.appendAiBtn.classList.remove("d-none");
       }
@@ -472,11 +517,21 @@ async function requestAiSummary(question, selectedIndex) {
 function handleManualAiSummary() {
   if (!QUESTIONS.length) return;
   const selected = getSelectedAnswer();
-  requestAiSummary(QUESTIONS[currentQuestionIndex], selected);
+  if (selected === null) {
+    alert("Please select an answer.");
+    return;
+  }
+  fetchAnswerKey(currentQuestionIndex, selected)
+    .then(question => requestAiSummary(question, selected))
+    .catch(err => {
+      if (!dom.aiSummary) return;
+      dom.aiSummary.className = "mt-2 text-warning";
+      dom.aiSummary.textContent = err.message;
+    });
 }
 
 async function handleAppendAiSummary() {
-  if (!TEST_DATA || typeof TEST_DATA.id !== "number") return;
+  if (!SESSION || !SESSION.test_id) return;
   if (!lastAiSummary || lastAiQuestionOrigIdx === null || lastAiQuestionOrigIdx === undefined) return;
   if (!dom.appendAiBtn || !dom.aiSummary) return;
 
@@ -484,7 +539,7 @@ async function handleAppendAiSummary() {
   dom.appendAiBtn.textContent = "Appending...";
 
   try {
-    const response = await fetch(`/api/tests/${TEST_DATA.id}/questions/${lastAiQuestionOrigIdx}/append-explanation`, {
+    const response = await fetch(`/api/tests/${encodeURIComponent(SESSION.test_id)}/questions/${lastAiQuestionOrigIdx}/append-explanation`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ summary: lastAiSummary })
@@ -515,15 +570,13 @@ async function handleAppendAiSummary() {
 
 function handlePrev() {
   if (currentQuestionIndex > 0) {
-    currentQuestionIndex -= 1;
-    renderQuestion();
+    showQuestion(currentQuestionIndex - 1);
   }
 }
 
 function handleNext() {
   if (currentQuestionIndex < QUESTIONS.length - 1) {
-    currentQuestionIndex += 1;
-    renderQuestion();
+    showQuestion(currentQuestionIndex + 1);
     return;
   }
   if (dom.finishBtn) {
@@ -544,17 +597,14 @@ function handleFormSubmit(e) {
     return;
   }
 
-  for (let i = 0; i < QUESTIONS.length; i++) {
-    syncHiddenFor(i);
-  }
-
   let answered = 0;
-  for (let i = 0; i < QUESTIONS.length; i++) {
-    const val = userAnswers[i];
+  Object.keys(userAnswers).forEach(position => {
+    syncHiddenFor(position);
+    const val = userAnswers[position];
     if (val !== undefined && val !== null && val !== "") {
       answered += 1;
     }
-  }
+  });
 
   if (answered < QUESTIONS.length) {
     const confirmSubmit = confirm(
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class AppProcesses:
+    # Runs snippets in fresh interpreters that import app with `workdir` as their
+    # working directory, so they share one data/ folder the way gunicorn workers do.
+    def __init__(self, workdir, backend):
+        self.workdir = workdir
+        self.env = {**os.environ, "PYTHONPATH": ROOT, "STORAGE_BACKEND": backend}
+
+    def start(self, code, *args):
+        return subprocess.Popen(
+            [sys.executable, "-c", "import app\n" + code, *map(str, args)],
+            cwd=self.workdir,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+    def run(self, code, *args):
+        process = self.start(code, *args)
+        out, err = process.communicate(timeout=300)
+        assert process.returncode == 0, err
+        return out
+
+
+@pytest.fixture
+def app_processes(tmp_path):
+    return lambda backend="json": AppProcesses(str(tmp_path), backend)
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # app.py keeps data/ relative to the working directory and sets it up at import,
+    # so the in-process app runs from a scratch directory for the whole session.
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    import app
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def uploads_client(app_module, monkeypatch):
+    # send_from_directory resolves the relative data/ folders against the app's root
+    # path, which is the checkout; this session's data/ is in the working directory.
+    monkeypatch.setattr(app_module.app, "root_path", os.getcwd())
+    return app_module.app.test_client()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ollama_client import AdmissionLimiter, OllamaOverloaded, SingleFlight, StreamFanout
+
+QUESTION = {
+    "question": "Which layer carries frames?",
+    "options": ["Physical", "Data link", "Network"],
+    "correct_index": 1,
+    "selected_index": 0,
+    "explanation": ""
+}
+
+
+def wait_for(check):
+    deadline = time.time() + 5
+    while not check():
+        if time.time() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.01)
+
+
+def test_full_queue_is_rejected_straight_away():
+    limiter = AdmissionLimiter(1, 1, 5)
+    held = limiter.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(limiter.acquire()))
+    waiter.start()
+    wait_for(lambda: limiter.stats()["queue_depth"] == 1)
+
+    start = time.monotonic()
+    with pytest.raises(OllamaOverloaded) as info:
+        limiter.acquire()
+    assert time.monotonic() - start < 1
+    # Nothing has finished yet, so the hint is the default.
+    assert info.value.retry_after == 5
+
+    limiter.release(held)
+    waiter.join()
+    assert len(admitted) == 1
+    stats = limiter.stats()
+    assert (stats["active"], stats["queue_depth"], stats["admitted"], stats["rejected"]) == (1, 0, 2, 1)
+
+
+def test_queued_caller_gives_up_after_max_wait():
+    limiter = AdmissionLimiter(1, 4, 0.05)
+    with limiter.slot():
+        with pytest.raises(OllamaOverloaded) as info:
+            limiter.acquire()
+    assert 1 <= info.value.retry_after <= 60
+    assert limiter.stats()["rejected"] == 1
+    # Background work queues without the limits.
+    with limiter.slot(wait=True):
+        assert limiter.stats()["active"] == 1
+
+
+def test_async_callers_do_not_jump_the_queue():
+    limiter = AdmissionLimiter(1, 2, 5)
+    held = limiter.acquire()
+    waiter = threading.Thread(target=lambda: limiter.release(limiter.acquire()))
+    waiter.start()
+    wait_for(lambda: limiter.stats()["queue_depth"] == 1)
+
+    async def arrive():
+        # Holding the limiter's (re-entrant) lock keeps the woken waiter from taking
+        # the freed slot before the async caller has looked at it.
+        with limiter._cond:
+            limiter.release(held)
+            task = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            jumped = task.done()
+        limiter.release(await task)
+        return jumped
+
+    assert asyncio.run(arrive()) is False
+    waiter.join()
+    assert limiter.stats()["active"] == 0
+
+
+@pytest.fixture
+def busy(app_module, monkeypatch):
+    # A one-slot limiter with no queue, with its slot taken.
+    limiter = AdmissionLimiter(1, 0, 0)
+    monkeypatch.setattr(app_module, "AI_CALLS", SingleFlight(limiter))
+    monkeypatch.setattr(app_module, "AI_STREAMS", StreamFanout(limiter))
+    monkeypatch.setattr(app_module.OLLAMA_CLIENT, "chat", lambda *args: {"message": {"content": "Frames: layer 2."}})
+    held = limiter.acquire()
+    yield limiter, held
+    if limiter.stats()["active"]:
+        limiter.release(held)
+
+
+@pytest.mark.parametrize("path", ["/api/ai-summary", "/api/ai-summary-stream"])
+def test_ai_endpoints_answer_503_with_retry_after(app_module, busy, path):
+    client = app_module.app.test_client()
+    response = client.post(path, json=QUESTION)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert "busy" in response.get_json()["error"]
+
+
+def test_ai_summary_runs_once_a_slot_frees_up(app_module, busy):
+    limiter, held = busy
+    limiter.release(held)
+    response = app_module.app.test_client().post("/api/ai-summary", json={**QUESTION, "selected_index": 2})
+    assert response.get_json() == {"summary": "Frames: layer 2."}
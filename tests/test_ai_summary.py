@@ -0,0 +1,74 @@
+import pytest
+
+QUESTION = {
+    "question": "Which layer routes packets?",
+    "options": ["Physical", "Data link", "Network", "Transport", "Session", "Application"],
+    "correct_index": 2,
+    "explanation": "Routing is a layer 3 job.",
+    "image": ""
+}
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": "ai-summary", "title": "Networks", "questions": [QUESTION]})
+    prompts = []
+
+    def chat(base_url, model, messages, options):
+        prompts.append(messages[1]["content"])
+        return {"message": {"content": "Routers work at layer 3."}}
+
+    monkeypatch.setattr(app_module.OLLAMA_CLIENT, "chat", chat)
+    client = app_module.app.test_client()
+    client.prompts = prompts
+    return client
+
+
+def test_reference_and_inline_requests_share_the_cache(client):
+    # selected_index is counted in the stored option order: 3 is "Transport".
+    first = client.post("/api/ai-summary", json={"test_id": "ai-summary", "question_index": 0, "selected_index": 3})
+    assert first.get_json() == {"summary": "Routers work at layer 3."}
+    assert len(client.prompts) == 1
+    assert "Student selected:\nTransport" in client.prompts[0]
+    assert "1. Physical\n2. Data link\n3. Network" in client.prompts[0]
+
+    # The older inline form of the same question and answer is a cache hit.
+    inline = client.post("/api/ai-summary", json={**QUESTION, "selected_index": 3})
+    assert inline.get_json() == first.get_json()
+    assert len(client.prompts) == 1
+
+
+def test_unknown_question_is_rejected(client):
+    for payload in ({"test_id": "missing", "question_index": 0}, {"test_id": "ai-summary", "question_index": 5}):
+        assert client.post("/api/ai-summary", json=payload).status_code == 404
+        assert client.post("/api/ai-summary-stream", json=payload).status_code == 404
+    assert not client.prompts
+
+
+def summary_request(client, seed, selected_option):
+    # The request test.js sends after checking the question in a session with `seed`,
+    # with the shown option whose text is `selected_option` picked.
+    session = client.post("/api/tests/ai-summary/sessions", json={"seed": seed}).get_json()
+    shown = session["questions"][0]
+    selected = shown["options"].index(selected_option)
+    check = client.post(
+        f"/api/sessions/{session['session_id']}/check", json={"position": 0, "selected": selected}
+    ).get_json()
+    assert shown["options"][check["correct_index"]] == "Network"
+    return {
+        "test_id": session["test_id"],
+        "question_index": shown["index"],
+        "selected_index": check["option_order"][selected]
+    }, shown["options"]
+
+
+def test_session_shuffle_does_not_change_the_request(client):
+    first, first_order = summary_request(client, "seed-a", "Session")
+    second, second_order = summary_request(client, "seed-b", "Session")
+    assert first_order != second_order
+    assert first == second == {"test_id": "ai-summary", "question_index": 0, "selected_index": 4}
+
+    client.post("/api/ai-summary", json=first)
+    client.post("/api/ai-summary", json=second)
+    assert len(client.prompts) == 1
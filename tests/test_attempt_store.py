@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+
+def legacy_attempt(token, test_id="t1"):
+    # An attempt as stored before snapshots: full answers inline.
+    return {
+        "id": token,
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "test_id": test_id,
+        "test_title": "Legacy",
+        "score": 1,
+        "total": 1,
+        "answers": [{
+            "question": "2 + 2?", "options": ["3", "4"], "selected": 1, "correct": 1,
+            "is_correct": True, "explanation": "", "image": ""
+        }]
+    }
+
+
+@pytest.fixture
+def jsonl_store(app_module, tmp_path):
+    def open_store():
+        return app_module.AttemptLog(
+            str(tmp_path / "attempts.jsonl"), str(tmp_path / "attempts.index.jsonl"), 100, 10,
+            app_module.SnapshotStore(str(tmp_path / "snapshots"))
+        )
+    return open_store
+
+
+@pytest.fixture
+def sqlite_store(app_module, tmp_path):
+    db = app_module.SqliteDatabase(str(tmp_path / "suvuu.db"))
+    return app_module.SqliteAttemptStore(db, 100, app_module.SqliteSnapshotStore(db))
+
+
+def insert_legacy_row(store, record):
+    store.db.connect().execute(
+        "INSERT INTO attempts (id, created_at, test_id, test_title, score, total, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (record["id"], record["created_at"], str(record["test_id"]), record["test_title"], record["score"],
+         record["total"], json.dumps(record))
+    )
+
+
+def test_jsonl_positional_test_ids_become_stable(app_module, jsonl_store, tmp_path):
+    journal = tmp_path / "attempts.jsonl"
+    journal.write_bytes(b"".join(
+        app_module.encode_log_line(a)
+        for a in (legacy_attempt("a1", 1), legacy_attempt("a2", "abc"), legacy_attempt("a3", 7))
+    ))
+    store = jsonl_store()
+    store.ensure_index()
+    store.migrate_test_ids(["abc", "def"])
+    assert [store.get(t)["test_id"] for t in ("a1", "a2", "a3")] == ["def", "abc", 7]
+    assert [a["test_id"] for a in store.page(test_id="def")[0]] == ["def"]
+    assert [json.loads(line)["test_id"] for line in journal.read_bytes().splitlines()] == ["def", "abc", 7]
+    assert (tmp_path / "attempts.jsonl.version").read_text().strip() == "1"
+
+    # A restarted worker neither rescans nor rewrites the journal.
+    migrated = journal.read_bytes()
+    restarted = jsonl_store()
+    restarted.ensure_index()
+    restarted._rewrite = lambda **kwargs: pytest.fail("journal rewritten again")
+    restarted.migrate_test_ids(["xyz", "abc"])
+    assert journal.read_bytes() == migrated
+
+
+def test_sqlite_positional_test_ids_become_stable(sqlite_store):
+    for attempt in (legacy_attempt("a1", 1), legacy_attempt("a2", "abc"), legacy_attempt("a3", 7)):
+        sqlite_store.append(attempt)
+    sqlite_store.migrate_test_ids(["abc", "def"])
+    assert [sqlite_store.get(t)["test_id"] for t in ("a1", "a2", "a3")] == ["def", "abc", 7]
+    assert [a["id"] for a in sqlite_store.page(test_id="def")[0]] == ["a1"]
+    assert sqlite_store.db.connect().execute("PRAGMA user_version").fetchone()[0] == 1
+
+
+def test_attempts_json_migration_resets_the_marker(app_processes, tmp_path):
+    # attempts.json turning up after the journal was marked migrated (a restored
+    # backup) still gets its positional test ids rewritten.
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "data.json").write_text(json.dumps({"tests": [
+        {"id": "abc", "title": "A", "questions": []}, {"id": "def", "title": "B", "questions": []}
+    ]}))
+    (data / "attempts.json").write_text(json.dumps({"attempts": [legacy_attempt("a1", 1)]}))
+    (data / "attempts.jsonl.version").write_text("1\n")
+    out = app_processes().run("print(app.get_attempt_by_token('a1')['test_id'])")
+    assert out.strip() == "def"
+
+
+def test_jsonl_compact_legacy_runs_once(app_module, jsonl_store, tmp_path):
+    journal = tmp_path / "attempts.jsonl"
+    journal.write_bytes(app_module.encode_log_line(legacy_attempt("a1")))
+    store = jsonl_store()
+    store.ensure_index()
+    store.migrate_test_ids([])
+    store.compact_legacy()
+    assert app_module.FULL_ANSWERS_MARKER not in journal.read_bytes()
+    assert store.get("a1")["answers"][0]["question"] == "2 + 2?"
+    assert (tmp_path / "attempts.jsonl.version").read_text().strip() == "2"
+
+    # A restarted worker neither rescans nor rewrites the journal.
+    compacted = journal.read_bytes()
+    restarted = jsonl_store()
+    restarted.ensure_index()
+    restarted._rewrite = lambda **kwargs: pytest.fail("journal rewritten again")
+    restarted.migrate_test_ids([])
+    restarted.compact_legacy()
+    assert journal.read_bytes() == compacted
+
+
+def test_sqlite_compact_legacy_runs_once(sqlite_store):
+    insert_legacy_row(sqlite_store, legacy_attempt("a1"))
+    sqlite_store.migrate_test_ids([])
+    sqlite_store.compact_legacy()
+    conn = sqlite_store.db.connect()
+    assert conn.execute("SELECT snapshot FROM attempts WHERE id = 'a1'").fetchone()[0]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+
+    # Rows are no longer selected on later startups.
+    insert_legacy_row(sqlite_store, legacy_attempt("a2"))
+    sqlite_store.compact_legacy()
+    assert conn.execute("SELECT snapshot FROM attempts WHERE id = 'a2'").fetchone()[0] is None
+
+
+def test_attempts_json_migration_resets_the_compaction_marker(app_processes, tmp_path):
+    # attempts.json turning up after the journal was marked compacted (a restored
+    # backup) still gets its full answers compacted.
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "attempts.json").write_text(json.dumps({"attempts": [legacy_attempt("a1")]}))
+    (data / "attempts.jsonl.version").write_text("2\n")
+    out = app_processes().run("print(app.get_attempt_by_token('a1')['answers'][0]['question'])")
+    assert out.strip() == "2 + 2?"
+    assert b'"snapshot"' in (data / "attempts.jsonl").read_bytes()
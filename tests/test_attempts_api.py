@@ -0,0 +1,62 @@
+import pytest
+
+
+def attempt(token, test_id, created_at, score=1):
+    return {
+        "id": token,
+        "created_at": created_at,
+        "test_id": test_id,
+        "test_title": f"Test {test_id}",
+        "score": score,
+        "total": 2,
+        "answers": []
+    }
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    client.delete("/api/attempts")
+    # Ten attempts, one per day from May 1st, alternating between two tests.
+    for day in range(1, 11):
+        test_id = "alpha" if day % 2 else "beta"
+        app_module.persist_attempt(attempt(f"a{day}", test_id, f"2024-05-{day:02d}T12:00:00+00:00"))
+    yield client
+    client.delete("/api/attempts")
+
+
+def ids(response):
+    assert response.status_code == 200, response.data
+    return [a["id"] for a in response.get_json()["attempts"]]
+
+
+def test_pages_follow_the_cursor(client):
+    first = client.get("/api/attempts?limit=4").get_json()
+    assert [a["id"] for a in first["attempts"]] == ["a10", "a9", "a8", "a7"]
+    assert first["has_more"] and first["next_before"] == "a7"
+    assert first["attempts"][0]["percent"] == 50.0
+
+    second = client.get(f"/api/attempts?limit=4&before={first['next_before']}").get_json()
+    assert [a["id"] for a in second["attempts"]] == ["a6", "a5", "a4", "a3"]
+    last = client.get(f"/api/attempts?limit=4&before={second['next_before']}").get_json()
+    assert [a["id"] for a in last["attempts"]] == ["a2", "a1"]
+    assert not last["has_more"] and last["next_before"] is None
+
+
+def test_filters_by_test_and_date(client):
+    assert ids(client.get("/api/attempts?test_id=alpha")) == ["a9", "a7", "a5", "a3", "a1"]
+    # A date used as "to" includes that whole day.
+    assert ids(client.get("/api/attempts?from=2024-05-03&to=2024-05-05")) == ["a5", "a4", "a3"]
+    assert ids(client.get("/api/attempts?test_id=beta&from=2024-05-05T00:00:00Z&limit=2")) == ["a10", "a8"]
+    assert ids(client.get("/api/attempts?test_id=beta&limit=2&before=a8")) == ["a6", "a4"]
+
+
+def test_bad_cursor_and_dates_are_rejected(client):
+    assert client.get("/api/attempts?before=missing").status_code == 400
+    assert client.get("/api/attempts?from=yesterday").status_code == 400
+
+
+def test_deleted_attempts_leave_the_listing(client):
+    assert client.delete("/api/attempts/a9").status_code == 200
+    assert ids(client.get("/api/attempts?limit=3")) == ["a10", "a8", "a7"]
+    assert client.get("/api/attempts?before=a9").status_code == 400
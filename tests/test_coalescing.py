@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from ollama_client import AsyncStreamFanout, OllamaError, OllamaUnavailable, SingleFlight, StreamFanout
+
+
+def wait_for(check):
+    deadline = time.time() + 5
+    while not check():
+        if time.time() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.01)
+
+
+def run_threads(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return {"summary": "shared"}
+
+    threads, results = run_threads(5, lambda: flight.do("key", fn))
+    # Every caller is waiting on the one running call before it finishes.
+    wait_for(lambda: flight.stats()["shared"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"summary": "shared"}] * 5
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "shared": 4}
+
+    # Once it finished, the next call for the key runs again.
+    assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise OllamaUnavailable("down")
+
+    def call():
+        try:
+            flight.do("key", fn)
+        except OllamaUnavailable as exc:
+            return str(exc)
+
+    threads, results = run_threads(3, call)
+    wait_for(lambda: flight.stats()["shared"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["down"] * 3
+
+
+class ScriptedResponse:
+    # Streams NDJSON lines, holding back everything after the first until `gate` opens.
+    def __init__(self, chunks, gate):
+        self.lines = [json.dumps(chunk) for chunk in chunks]
+        self.gate = gate
+
+    def iter_lines(self, decode_unicode=False):
+        for idx, line in enumerate(self.lines):
+            if idx == 1:
+                self.gate.wait(5)
+            yield line
+
+    def close(self):
+        pass
+
+
+def fanout_opener(chunks, gate, opened):
+    def opener():
+        opened.append(1)
+        return ScriptedResponse(chunks, gate)
+    return opener
+
+
+def test_stream_fanout_shares_one_upstream():
+    fanout = StreamFanout()
+    gate = threading.Event()
+    opened, completed = [], []
+    chunks = [{"message": {"content": "Par"}}, {"message": {"content": "is"}}, {"done": True}]
+    opener = fanout_opener(chunks, gate, opened)
+
+    first = fanout.join("key", opener, completed.append)
+    assert next(first) == "Par"
+    # A late joiner replays the text so far, then follows the live stream.
+    second = fanout.join("key", opener, completed.append)
+    gate.set()
+    assert "Par" + "".join(first) == "Paris"
+    assert "".join(second) == "Paris"
+
+    assert len(opened) == 1
+    wait_for(lambda: fanout.stats()["in_flight"] == 0)
+    assert completed == ["Paris"]
+    assert fanout.stats() == {"in_flight": 0, "streams": 1, "shared": 1}
+
+
+def test_stream_fanout_skips_on_complete_for_a_cut_off_stream():
+    fanout = StreamFanout()
+    gate = threading.Event()
+    gate.set()
+    completed = []
+    chunks = [{"message": {"content": "Par"}}, {"message": {"content": "is"}}]
+    stream = fanout.join("key", fanout_opener(chunks, gate, []), completed.append)
+    assert "".join(stream) == "Paris"
+    wait_for(lambda: fanout.stats()["in_flight"] == 0)
+    assert completed == []
+
+
+def test_stream_fanout_raises_the_opener_error():
+    fanout = StreamFanout()
+
+    def opener():
+        raise OllamaUnavailable("down")
+
+    with pytest.raises(OllamaUnavailable):
+        fanout.join("key", opener)
+    wait_for(lambda: fanout.stats()["in_flight"] == 0)
+
+
+def test_stream_fanouts_turn_other_failures_into_ollama_errors():
+    # A bug in the opener must not look like an empty, finished stream.
+    def opener():
+        raise RuntimeError("boom")
+
+    async def async_opener():
+        raise RuntimeError("boom")
+
+    fanout = StreamFanout()
+    with pytest.raises(OllamaError):
+        fanout.join("key", opener)
+    wait_for(lambda: fanout.stats()["in_flight"] == 0)
+
+    async def join_async():
+        fanout = AsyncStreamFanout()
+        with pytest.raises(OllamaError):
+            await fanout.join("key", async_opener)
+        assert fanout.stats()["in_flight"] == 0
+
+    asyncio.run(join_async())
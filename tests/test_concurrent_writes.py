@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+PROCESSES = 4
+THREADS = 3
+ROUNDS = 8
+WRITES = PROCESSES * THREADS * ROUNDS
+
+SETUP = """
+with app.DATA_STORE.lock():
+    app.DATA_STORE.put({"id": "shared", "title": "Shared", "questions": [
+        {"question": "seed", "options": ["a", "b"], "correct_index": 0, "explanation": "", "image": ""}
+    ]})
+"""
+
+# Each thread appends questions to the shared test (read-modify-write of the test),
+# creates tests of its own and submits attempts, all through the routes.
+WRITER = """
+import sys
+import threading
+
+worker = sys.argv[1]
+rounds = int(sys.argv[2])
+errors = []
+
+def run(thread):
+    client = app.app.test_client()
+    try:
+        for i in range(rounds):
+            tag = f"{worker}-{thread}-{i}"
+            r = client.post("/api/tests/shared/ai-import-question/commit",
+                            json={"question": tag, "options": ["a", "b"], "correct_index": 0})
+            assert r.status_code == 200, r.data
+            r = client.post("/new", data={"title": tag, "question_0": "q", "option_0_0": "a",
+                                          "option_1_0": "b", "correct_0": "0"})
+            assert r.status_code == 302, r.data
+            r = client.post("/take/shared", data={"q0": "0"})
+            assert r.status_code == 302, r.data
+    except BaseException as exc:
+        errors.append(repr(exc))
+
+threads = [threading.Thread(target=run, args=(t,)) for t in range(int(sys.argv[3]))]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+if errors:
+    sys.exit("\\n".join(errors))
+"""
+
+REPORT = """
+import json
+print(json.dumps({
+    "shared": [q["question"] for q in app.get_test("shared")["questions"]],
+    "titles": [s["title"] for s in app.DATA_STORE.summaries()],
+    "attempts": [a["test_id"] for a in app.ATTEMPT_LOG.page(limit=100000)[0]]
+}))
+"""
+
+
+def read_jsonl(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.endswith(b"\n")
+    return [json.loads(line) for line in data.splitlines()]
+
+
+@pytest.mark.parametrize("backend", ["json", "sharded", "sqlite"])
+def test_parallel_writers_lose_nothing(app_processes, tmp_path, backend):
+    apps = app_processes(backend)
+    apps.run(SETUP)
+    writers = [apps.start(WRITER, worker, ROUNDS, THREADS) for worker in range(PROCESSES)]
+    for process in writers:
+        _, err = process.communicate(timeout=300)
+        assert process.returncode == 0, err
+
+    report = json.loads(apps.run(REPORT))
+    tags = {f"{w}-{t}-{i}" for w in range(PROCESSES) for t in range(THREADS) for i in range(ROUNDS)}
+    assert len(report["shared"]) == WRITES + 1
+    assert set(report["shared"]) == tags | {"seed"}
+    assert sorted(report["titles"]) == sorted(tags | {"Shared"})
+    assert report["attempts"] == ["shared"] * WRITES
+
+    # The files themselves parse cleanly: no torn or interleaved writes.
+    data_dir = os.path.join(tmp_path, "data")
+    if backend == "json":
+        with open(os.path.join(data_dir, "data.json"), "r", encoding="utf-8") as f:
+            tests = json.load(f)["tests"]
+        assert len(tests) == WRITES + 1
+    elif backend == "sharded":
+        with open(os.path.join(data_dir, "tests", "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)["tests"]
+        assert len(manifest) == WRITES + 1
+        for entry in manifest:
+            with open(os.path.join(data_dir, "tests", f"{entry['id']}.json"), "r", encoding="utf-8") as f:
+                assert json.load(f)["title"] == entry["title"]
+    if backend != "sqlite":
+        attempts = read_jsonl(os.path.join(data_dir, "attempts.jsonl"))
+        assert len(attempts) == WRITES
+        assert len({a["id"] for a in attempts}) == WRITES
+        index = read_jsonl(os.path.join(data_dir, "attempts.index.jsonl"))
+        assert [e["id"] for e in index] == [a["id"] for a in attempts]
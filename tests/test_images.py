@@ -0,0 +1,222 @@
+import io
+import json
+import os
+import zipfile
+from uuid import uuid4
+
+import pytest
+
+
+def upload(app_module, data, ext="png"):
+    name = f"{uuid4().hex}.{ext}"
+    with open(os.path.join(app_module.UPLOAD_FOLDER, name), "wb") as f:
+        f.write(data)
+    return name
+
+
+def question(text, image=""):
+    return {"question": text, "options": ["a", "b"], "correct_index": 0, "explanation": "", "image": image}
+
+
+def editor_form(text, **fields):
+    return {"title": "Edited", "question_0": text, "option_0_0": "a", "option_1_0": "b", "correct_0": "0", **fields}
+
+
+@pytest.fixture
+def client(uploads_client):
+    return uploads_client
+
+
+def test_editor_deletes_images_no_longer_used(app_module, client):
+    uploads = app_module.UPLOAD_FOLDER
+    shared = upload(app_module, b"shared")
+    solo = upload(app_module, b"solo")
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": "edit-a", "title": "A", "questions": [question("1", shared), question("2", solo)]})
+        app_module.DATA_STORE.put({"id": "edit-b", "title": "B", "questions": [question("1", shared)]})
+
+    # Dropping question 2 removes its image; the shared one is still used by B.
+    response = client.post("/edit/edit-a", data=editor_form("1", existing_image_0=shared, remove_image_0="on"))
+    assert response.status_code == 302
+    assert app_module.get_test("edit-a")["questions"][0]["image"] == ""
+    assert not os.path.exists(os.path.join(uploads, solo))
+    assert os.path.exists(os.path.join(uploads, shared))
+
+    # Replacing B's image removes the last reference to it.
+    response = client.post(
+        "/edit/edit-b",
+        data=editor_form("1", existing_image_0=shared, image_0=(io.BytesIO(b"new"), "new.png")),
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 302
+    replaced = app_module.get_test("edit-b")["questions"][0]["image"]
+    assert replaced not in ("", shared)
+    assert os.path.exists(os.path.join(uploads, replaced))
+    assert not os.path.exists(os.path.join(uploads, shared))
+
+
+def test_deleting_a_test_keeps_shared_images(app_module, client):
+    uploads = app_module.UPLOAD_FOLDER
+    shared = upload(app_module, b"kept")
+    solo = upload(app_module, b"gone")
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": "del-a", "title": "A", "questions": [question("1", shared), question("2", solo)]})
+        app_module.DATA_STORE.put({"id": "del-b", "title": "B", "questions": [question("1", shared)]})
+    client.get("/delete/del-a")
+    assert not app_module.DATA_STORE.has("del-a")
+    assert not os.path.exists(os.path.join(uploads, solo))
+    assert os.path.exists(os.path.join(uploads, shared))
+
+
+def test_editor_uploads_are_stored_by_content(app_module, client):
+    names = []
+    for test_id in ("same-a", "same-b"):
+        with app_module.DATA_STORE.lock():
+            app_module.DATA_STORE.put({"id": test_id, "title": test_id, "questions": []})
+        response = client.post(
+            f"/edit/{test_id}",
+            data=editor_form("1", image_0=(io.BytesIO(b"same bytes"), "Scan.PNG")),
+            content_type="multipart/form-data"
+        )
+        assert response.status_code == 302
+        names.append(app_module.get_test(test_id)["questions"][0]["image"])
+    assert names[0] == names[1]
+    assert app_module.IMMUTABLE_IMAGE_RE.match(names[0]) and names[0].endswith(".png")
+    assert not [n for n in os.listdir(app_module.UPLOAD_FOLDER) if n.startswith(".tmp-")]
+
+
+STORES = {
+    "json": lambda app_module, tmp_path: app_module.DataStore(str(tmp_path / "data.json"), str(tmp_path / "data.meta.json")),
+    "sharded": lambda app_module, tmp_path: app_module.ShardedDataStore(str(tmp_path)),
+    "sqlite": lambda app_module, tmp_path: app_module.SqliteDataStore(app_module.SqliteDatabase(str(tmp_path / "t.db")))
+}
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_stores_index_the_images_tests_use(app_module, tmp_path, kind):
+    store = STORES[kind](app_module, tmp_path)
+    store.put({"id": "a", "title": "A", "questions": [question("1", "shared.png"), question("2", "a.png")]})
+    store.put({"id": "b", "title": "B", "questions": [question("1", "shared.png")]})
+    assert store.images_in_use(["shared.png", "a.png", "other.png"]) == {"shared.png", "a.png"}
+
+    store.put({"id": "a", "title": "A", "questions": [question("1", "shared.png")]})
+    assert store.images_in_use(["shared.png", "a.png"]) == {"shared.png"}
+    store.delete("b")
+    store.replace_all({"tests": []})
+    assert store.images_in_use(["shared.png", "a.png"]) == set()
+
+
+def test_summaries_without_images_are_filled_in(app_module, tmp_path):
+    store = app_module.DataStore(str(tmp_path / "data.json"), str(tmp_path / "data.meta.json"))
+    store.put({"id": "a", "title": "A", "questions": [question("1", "old.png")]})
+    with open(tmp_path / "data.meta.json") as f:
+        meta = json.load(f)
+    del meta["tests"][0]["images"]
+    updated_at = meta["tests"][0]["updated_at"]
+    with open(tmp_path / "data.meta.json", "w") as f:
+        json.dump(meta, f)
+
+    # A new process reads the sidecar written before summaries named their images.
+    store = app_module.DataStore(str(tmp_path / "data.json"), str(tmp_path / "data.meta.json"))
+    assert store.images_in_use(["old.png"]) == {"old.png"}
+    assert store.summaries()[0]["updated_at"] == updated_at
+
+
+def upload_count(app_module):
+    return len([name for name in os.listdir(app_module.UPLOAD_FOLDER) if not name.startswith(".")])
+
+
+def import_zip(client, data):
+    response = client.post("/import", data={"file": (io.BytesIO(data), "backup.zip")}, content_type="multipart/form-data")
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def backup_zip(tests, images):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("data.json", json.dumps({"tests": tests}))
+        for name, data in images.items():
+            zf.writestr(f"uploads/{name}", data)
+    return buffer.getvalue()
+
+
+def test_export_import_round_trip_keeps_uploads(app_module, client):
+    editor_image = upload(app_module, b"editor upload")
+    with app_module.DATA_STORE.lock():
+        content_image = app_module.store_image_bytes(b"ai import", "scan.png")
+        app_module.DATA_STORE.put({"id": "trip", "title": "Round trip", "questions": [
+            question("1", editor_image), question("2", content_image), question("3", content_image)
+        ]})
+    before = upload_count(app_module)
+    backup = client.get("/export").data
+
+    for _ in range(2):
+        result = import_zip(client, backup)
+        assert result["added"] == 0 and result["updated"] >= 1
+        assert upload_count(app_module) == before
+    images = [q["image"] for q in app_module.get_test("trip")["questions"]]
+    assert images == [editor_image, content_image, content_image]
+
+
+def test_import_deletes_images_of_replaced_tests(app_module, client):
+    import_zip(client, backup_zip([{"title": "Replaced", "questions": [question("1", "old.png")]}], {"old.png": b"old"}))
+    old = next(t for t in app_module.get_tests() if t["title"] == "Replaced")["questions"][0]["image"]
+    assert os.path.exists(os.path.join(app_module.UPLOAD_FOLDER, old))
+
+    import_zip(client, backup_zip([{"title": "Replaced", "questions": [question("1", "new.png")]}], {"new.png": b"new"}))
+    new = next(t for t in app_module.get_tests() if t["title"] == "Replaced")["questions"][0]["image"]
+    assert new != old
+    assert os.path.exists(os.path.join(app_module.UPLOAD_FOLDER, new))
+    assert not os.path.exists(os.path.join(app_module.UPLOAD_FOLDER, old))
+
+
+def image_bytes(width, height, fmt="PNG", **options):
+    from PIL import Image
+    img = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def served_size(response):
+    from PIL import Image
+    with Image.open(io.BytesIO(response.data)) as img:
+        return img.size
+
+
+def test_resized_variants_are_created_once(app_module, client):
+    name = upload(app_module, image_bytes(1200, 600))
+    response = client.get(f"/uploads/{name}?w=300")
+    assert response.status_code == 200
+    # Widths round up to the next of THUMBNAIL_WIDTHS.
+    assert served_size(response) == (480, 240)
+    assert response.mimetype == "image/webp"
+    variant = os.path.join(app_module.THUMBNAIL_FOLDER, f"{name}.480.webp")
+    mtime = os.path.getmtime(variant)
+
+    assert client.get(f"/uploads/{name}?w=480").data == response.data
+    assert os.path.getmtime(variant) == mtime
+    # Never scaled up, and without ?w= the original is served.
+    assert served_size(client.get(f"/uploads/{name}?w=5000")) == (1200, 600)
+    assert served_size(client.get(f"/uploads/{name}")) == (1200, 600)
+
+
+def test_originals_are_kept_when_resizing_does_not_help(app_module, client):
+    # A heavily compressed JPEG only grows as WebP; a GIF may be animated.
+    for data, ext in ((image_bytes(500, 500, "JPEG", quality=5), "jpg"), (image_bytes(600, 300, "GIF"), "gif")):
+        name = upload(app_module, data, ext)
+        assert client.get(f"/uploads/{name}?w=480").data == data
+
+
+def test_deleting_a_test_removes_its_variants(app_module, client):
+    name = upload(app_module, image_bytes(1000, 500))
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": "thumbs", "title": "Thumbs", "questions": [question("1", name)]})
+    client.get(f"/uploads/{name}?w=480")
+    client.get(f"/uploads/{name}?w=960")
+    assert [n for n in os.listdir(app_module.THUMBNAIL_FOLDER) if n.startswith(name)]
+
+    client.get("/delete/thumbs")
+    assert not os.path.exists(os.path.join(app_module.UPLOAD_FOLDER, name))
+    assert not [n for n in os.listdir(app_module.THUMBNAIL_FOLDER) if n.startswith(name)]
@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+def fake_extract(image_bytes, ollama_url, ollama_model):
+    # Stands in for the two Ollama passes: the "image" holds the question text.
+    text = image_bytes.decode()
+    if text == "unreadable":
+        return None, "Could not read a question.", 422
+    return {"question": text, "options": ["a", "b"], "correct_index": 1, "explanation": ""}, None, None
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "extract_question_from_image", fake_extract)
+    return app_module.app.test_client()
+
+
+def put(app_module, test_id):
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": test_id, "title": test_id, "questions": []})
+
+
+def submit(client, test_id, images, **form):
+    files = [(io.BytesIO(data), name) for name, data in images]
+    response = client.post(
+        f"/api/tests/{test_id}/ai-import-jobs", data={"images": files, **form}, content_type="multipart/form-data"
+    )
+    assert response.status_code == 202, response.data
+    return response.get_json()
+
+
+def finished(client, job_id):
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        job = client.get(f"/api/ai-import-jobs/{job_id}").get_json()
+        if job["status"] != "running":
+            return job
+        time.sleep(0.05)
+    pytest.fail("import job did not finish")
+
+
+def test_job_appends_questions_in_upload_order(app_module, client):
+    put(app_module, "jobs-a")
+    job = submit(client, "jobs-a", [
+        ("1.png", b"first"), ("2.png", b"unreadable"), ("notes.txt", b"text"), ("3.png", b"second")
+    ])
+    assert job["total"] == 4
+    done = finished(client, job["id"])
+    assert done["status"] == "done"
+    assert (done["completed"], done["failed"], done["added"]) == (4, 2, 2)
+    assert [item["status"] for item in done["items"]] == ["done", "failed", "failed", "done"]
+
+    questions = app_module.get_test("jobs-a")["questions"]
+    assert [q["question"] for q in questions] == ["first", "second"]
+    for q in questions:
+        assert os.path.exists(os.path.join(app_module.UPLOAD_FOLDER, q["image"]))
+    assert not os.path.exists(os.path.join(app_module.AI_IMPORT_JOBS_FOLDER, job["id"]))
+
+    # The event stream of a finished job is its final snapshot.
+    events = client.get(f"/api/ai-import-jobs/{job['id']}/events").data.decode().splitlines()
+    assert json.loads(events[-1])["status"] == "done"
+
+
+def test_job_without_attached_images(app_module, client):
+    put(app_module, "jobs-b")
+    job = submit(client, "jobs-b", [("1.png", b"plain")], attach_source_image="off")
+    assert finished(client, job["id"])["added"] == 1
+    assert app_module.get_test("jobs-b")["questions"][0]["image"] == ""
+
+
+def test_job_for_a_deleted_test_fails_and_cleans_up(app_module, client, monkeypatch):
+    put(app_module, "jobs-c")
+
+    def extract_then_delete(image_bytes, ollama_url, ollama_model):
+        with app_module.DATA_STORE.lock():
+            app_module.DATA_STORE.delete("jobs-c")
+        return fake_extract(image_bytes, ollama_url, ollama_model)
+
+    monkeypatch.setattr(app_module, "extract_question_from_image", extract_then_delete)
+    before = set(os.listdir(app_module.UPLOAD_FOLDER))
+    job = submit(client, "jobs-c", [("1.png", b"orphan")])
+    done = finished(client, job["id"])
+    assert done["status"] == "failed" and done["error"] == "Test not found"
+    assert done["added"] == 0
+    attached = set(os.listdir(app_module.UPLOAD_FOLDER)) - before
+    assert not attached
+
+
+def test_other_workers_read_the_status_file(app_module, client):
+    put(app_module, "jobs-d")
+    job = submit(client, "jobs-d", [("1.png", b"shared")])
+    done = finished(client, job["id"])
+
+    # A second ImportJobs over the same folder stands in for another worker process.
+    other = app_module.ImportJobs(app_module.AI_IMPORT_JOBS_FOLDER, 1, 60)
+    assert other.snapshot(job["id"]) == done
+    snapshot, version = other.wait(job["id"], None, 1)
+    assert snapshot == done and version is not None
+    assert other.snapshot("0" * 32) is None
+    assert other.snapshot("../data") is None
+
+
+def test_running_job_of_a_dead_process_reports_failed(app_module):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    job_id = "ab" * 16
+    with open(os.path.join(app_module.AI_IMPORT_JOBS_FOLDER, f"{job_id}.json"), "w") as f:
+        json.dump({"job": {"id": job_id, "status": "running", "items": []}, "version": 3, "pid": dead.pid}, f)
+    snapshot = app_module.IMPORT_JOBS.snapshot(job_id)
+    assert snapshot["status"] == "failed"
+    assert "interrupted" in snapshot["error"]
+
+
+def test_unknown_job_and_test(client):
+    assert client.get("/api/ai-import-jobs/missing").status_code == 404
+    assert client.post("/api/tests/missing/ai-import-jobs").status_code == 404
@@ -0,0 +1,49 @@
+import time
+
+
+def test_evicts_least_recently_used_entry(app_module):
+    cache = app_module.LRUCache(2, 1024)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_total_bytes(app_module):
+    cache = app_module.LRUCache(10, 10)
+    cache.set("a", b"aaaa")
+    cache.set("b", b"bbbb")
+    cache.set("c", b"cccc")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 8
+
+    # A value larger than the whole budget is not stored, and doesn't flush the rest.
+    cache.set("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.get("b") == b"bbbb" and cache.get("c") == b"cccc"
+
+    # Replacing an entry accounts for its new size only.
+    cache.set("b", b"bb")
+    assert cache.stats()["bytes"] == 6
+
+
+def test_entries_expire_after_ttl(app_module):
+    cache = app_module.LRUCache(10, 1024, ttl=0.05)
+    cache.set("a", b"1")
+    assert cache.get("a") == b"1"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_pop_and_clear(app_module):
+    cache = app_module.LRUCache(10, 1024)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.pop("a") == b"1"
+    assert cache.pop("a", "gone") == "gone"
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ollama_client import (
+    AsyncOllamaClient, OllamaBadStatus, OllamaClient, OllamaUnavailable, aiter_stream_text, iter_stream_text
+)
+
+ANSWER = {"message": {"role": "assistant", "content": "Paris"}, "done": True}
+STREAM = [{"message": {"content": "Par"}}, {"message": {"content": "is"}}, {"done": True}]
+
+
+class StubOllama(ThreadingHTTPServer):
+    # Answers each request with the next step of `plan`: "ok", an HTTP status code,
+    # "reset" (drop the connection with a RST), "slow" (answer after a delay),
+    # "stream" / "cut" (NDJSON stream with / without the final done chunk).
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.plan = []
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({"path": self.path, "port": self.client_address[1], "body": body})
+        step = self.server.plan.pop(0) if self.server.plan else "ok"
+        if step == "reset":
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+            return
+        if step == "slow":
+            time.sleep(1)
+        if isinstance(step, int):
+            self.send(step, {"error": "stub"})
+        elif step in ("stream", "cut"):
+            chunks = STREAM if step == "stream" else STREAM[:-1]
+            self.send(200, None, b"".join(json.dumps(c).encode() + b"\n" for c in chunks))
+        else:
+            self.send(200, ANSWER)
+
+    def send(self, status, payload, data=None):
+        data = json.dumps(payload).encode() if data is None else data
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def chat(kind, url, count=1, **kwargs):
+    # Makes `count` chat calls on one client and returns the answers, or raises.
+    kwargs.setdefault("backoff", 0)
+    if kind == "sync":
+        client = OllamaClient(**kwargs)
+        return [client.chat(url, "m", [], {})["message"]["content"] for _ in range(count)]
+
+    async def run():
+        client = AsyncOllamaClient(**kwargs)
+        try:
+            return [(await client.chat(url, "m", [], {}))["message"]["content"] for _ in range(count)]
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def stream(kind, url):
+    # Returns (text, complete) for one streamed chat.
+    if kind == "sync":
+        response = OllamaClient(backoff=0).open_chat_stream(url, "m", [], {})
+        return "".join(iter_stream_text(response)), response.complete
+
+    async def run():
+        client = AsyncOllamaClient(backoff=0)
+        try:
+            response = await client.open_chat_stream(url, "m", [], {})
+            return "".join([delta async for delta in aiter_stream_text(response)]), response.complete
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+KINDS = pytest.mark.parametrize("kind", ["sync", "async"])
+
+
+@KINDS
+def test_answer_and_request_body(stub, kind):
+    assert chat(kind, stub.url) == ["Paris"]
+    assert stub.requests[0]["path"] == "/api/chat"
+    assert stub.requests[0]["body"]["stream"] is False
+
+
+@KINDS
+def test_connection_reset_is_retried(stub, kind):
+    stub.plan = ["reset", "reset", "ok"]
+    assert chat(kind, stub.url, retries=2) == ["Paris"]
+    assert len(stub.requests) == 3
+
+
+@KINDS
+def test_connection_reset_gives_up_after_retries(stub, kind):
+    stub.plan = ["reset"] * 3
+    with pytest.raises(OllamaUnavailable):
+        chat(kind, stub.url, retries=1)
+    assert len(stub.requests) == 2
+
+
+@KINDS
+def test_server_error_is_retried(stub, kind):
+    stub.plan = [503, 500, "ok"]
+    assert chat(kind, stub.url, retries=2) == ["Paris"]
+    assert len(stub.requests) == 3
+
+
+@KINDS
+def test_server_error_reported_after_retries(stub, kind):
+    stub.plan = [502] * 3
+    with pytest.raises(OllamaBadStatus) as info:
+        chat(kind, stub.url, retries=2)
+    assert info.value.status_code == 502
+    assert len(stub.requests) == 3
+
+
+@KINDS
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_error_is_not_retried(stub, kind, status):
+    stub.plan = [status]
+    with pytest.raises(OllamaBadStatus) as info:
+        chat(kind, stub.url, retries=2)
+    assert info.value.status_code == status
+    assert "stub" in info.value.text
+    assert len(stub.requests) == 1
+
+
+@KINDS
+def test_connections_are_pooled(stub, kind):
+    assert chat(kind, stub.url, count=3) == ["Paris"] * 3
+    assert len({r["port"] for r in stub.requests}) == 1
+
+
+@KINDS
+def test_read_timeout_is_not_retried(stub, kind):
+    stub.plan = ["slow"]
+    with pytest.raises(OllamaUnavailable):
+        chat(kind, stub.url, read_timeout=0.2, retries=2)
+    assert len(stub.requests) == 1
+
+
+@KINDS
+def test_connection_refused(kind):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    with pytest.raises(OllamaUnavailable):
+        chat(kind, url, retries=1)
+
+
+@KINDS
+def test_stream(stub, kind):
+    stub.plan = ["stream"]
+    assert stream(kind, stub.url) == ("Paris", True)
+    assert stub.requests[0]["body"]["stream"] is True
+
+
+@KINDS
+def test_cut_off_stream_is_incomplete(stub, kind):
+    stub.plan = ["cut"]
+    assert stream(kind, stub.url) == ("Paris", False)
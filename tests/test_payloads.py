@@ -0,0 +1,102 @@
+import gzip
+
+import pytest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def question(text, explanation=""):
+    return {"question": text, "options": ["yes", "no"], "correct_index": 0, "explanation": explanation, "image": ""}
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def put(app_module, test):
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put(test)
+
+
+def test_large_json_is_compressed(app_module, client):
+    put(app_module, {"id": "big", "title": "Big", "questions": [question(f"Question {i}?") for i in range(100)]})
+    plain = client.get("/api/tests/big", headers={"Accept-Encoding": "identity"})
+    assert plain.content_encoding is None and len(plain.data) > app_module.JSON_COMPRESS_MIN_BYTES
+    assert "Accept-Encoding" in plain.headers["Vary"]
+    content_hash = plain.get_etag()[0]
+
+    zipped = client.get("/api/tests/big", headers={"Accept-Encoding": "gzip"})
+    assert zipped.content_encoding == "gzip"
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.get_etag()[0] == f"{content_hash}-gzip"
+    again = client.get("/api/tests/big", headers={"Accept-Encoding": "gzip", "If-None-Match": zipped.headers["ETag"]})
+    assert again.status_code == 304
+
+    if brotli is not None:
+        br = client.get("/api/tests/big", headers={"Accept-Encoding": "gzip, br"})
+        assert br.content_encoding == "br" and brotli.decompress(br.data) == plain.data
+
+
+def test_small_json_is_sent_as_is(app_module, client):
+    put(app_module, {"id": "small", "title": "Small", "questions": [question("Only?")]})
+    response = client.get("/api/tests/small", headers={"Accept-Encoding": "gzip"})
+    assert response.content_encoding is None
+    assert response.get_json()["title"] == "Small"
+
+
+def test_versioned_test_urls(app_module, client):
+    put(app_module, {"id": "snap", "title": "Snap", "questions": [question("1?")]})
+    content_hash = client.get("/api/tests/snap?answers=1").get_etag()[0]
+    pinned = client.get(f"/api/tests/snap?v={content_hash}&answers=1")
+    assert pinned.cache_control.immutable and pinned.cache_control.private
+    assert client.get("/api/tests/snap?v=0000").status_code == 409
+
+
+def test_answers_only_when_asked_for(app_module, client):
+    put(app_module, {"id": "key", "title": "Key", "questions": [question("1?", "Because.")]})
+    plain = client.get("/api/tests/key")
+    assert plain.get_json()["questions"] == [{"question": "1?", "options": ["yes", "no"], "image": ""}]
+    full = client.get("/api/tests/key?answers=1")
+    assert full.get_json()["questions"][0]["explanation"] == "Because."
+    assert full.get_json()["questions"][0]["correct_index"] == 0
+    assert plain.get_etag()[0] != full.get_etag()[0]
+
+    # A pinned snapshot is named by the full body either way.
+    pinned = client.get(f"/api/tests/key?v={full.get_etag()[0]}")
+    assert pinned.status_code == 200 and "correct_index" not in pinned.get_json()["questions"][0]
+
+
+def test_normalized_results_reference_unchanged_questions(app_module, client):
+    questions = [question("Same?", "Kept."), question("Edited?")]
+    put(app_module, {"id": "norm", "title": "Norm", "questions": questions})
+    answers = [
+        {**{k: q[k] for k in ("question", "options", "explanation", "image")},
+         "selected": 1, "correct": 0, "is_correct": False}
+        for q in questions
+    ]
+    app_module.persist_attempt({
+        "id": "norm-attempt",
+        "created_at": "2024-05-01T12:00:00+00:00",
+        "test_id": "norm",
+        "test_title": "Norm",
+        "score": 0,
+        "total": 2,
+        "answers": answers
+    })
+    put(app_module, {"id": "norm", "title": "Norm", "questions": [questions[0], question("Edited since?")]})
+
+    full = client.get("/api/results/norm-attempt").get_json()
+    assert full["answers"] == answers
+
+    normalized = client.get("/api/results/norm-attempt?normalized=1").get_json()
+    assert normalized["test_version"] == client.get("/api/tests/norm?answers=1").get_etag()[0]
+    assert normalized["answers"][0] == {"question_index": 0, "selected": 1, "correct": 0, "is_correct": False}
+    # The edited question no longer matches, so its answer stays inline.
+    assert normalized["answers"][1] == answers[1]
+    assert {k: v for k, v in normalized.items() if k not in ("answers", "test_version")} == {
+        k: v for k, v in full.items() if k != "answers"
+    }
@@ -0,0 +1,44 @@
+import pytest
+
+
+def question(text, correct_index=0):
+    return {"question": text, "options": ["a", "b", "c"], "correct_index": correct_index,
+            "explanation": f"Why {text}", "image": ""}
+
+
+@pytest.fixture
+def session(app_module):
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put({"id": "sessions", "title": "Sessions", "questions": [
+            question(f"Q{i}", i % 3) for i in range(5)
+        ]})
+    client = app_module.app.test_client()
+    response = client.post("/api/tests/sessions/sessions", json={"seed": "fixed"})
+    assert response.status_code == 201
+    return client, response.get_json()
+
+
+def test_questions_arrive_without_answers(session):
+    client, created = session
+    assert created["total"] == 5
+    for q in created["questions"]:
+        assert set(q) == {"position", "index", "question", "options", "image"}
+    # The same seed gives the same order.
+    again = client.post("/api/tests/sessions/sessions", json={"seed": "fixed"}).get_json()
+    assert again["questions"] == created["questions"]
+
+
+def test_check_requires_a_selected_answer(session):
+    client, created = session
+    url = f"/api/sessions/{created['session_id']}/check"
+    for payload in ({"position": 0}, {"position": 0, "selected": None}, {"position": 0, "selected": 3},
+                    {"position": 0, "selected": True}):
+        response = client.post(url, json=payload)
+        assert response.status_code == 400
+        assert set(response.get_json()) == {"error"}
+
+    shown = created["questions"][0]
+    check = client.post(url, json={"position": 0, "selected": 1}).get_json()
+    assert shown["options"][check["correct_index"]] == "abc"[shown["index"] % 3]
+    assert check["is_correct"] == (check["correct_index"] == 1)
+    assert check["explanation"] == f"Why {shown['question']}"
@@ -0,0 +1,94 @@
+import gzip
+import os
+import re
+from uuid import uuid4
+
+import pytest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def static_bytes(app_module, filename):
+    with open(os.path.join(app_module.STATIC_FOLDER, filename), "rb") as f:
+        return f.read()
+
+
+def test_pages_link_versioned_static_urls(app_module, client):
+    page = client.get("/").data.decode()
+    url = re.search(r'src="(/static/index\.js\?v=[0-9a-f]{12})"', page).group(1)
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert response.data == static_bytes(app_module, "index.js")
+    assert response.cache_control.immutable and response.cache_control.max_age == app_module.IMMUTABLE_MAX_AGE
+
+    # Without the version (or with a stale one) the browser has to revalidate.
+    for path in ("/static/index.js", "/static/index.js?v=000000000000"):
+        assert client.get(path).cache_control.no_cache
+
+
+def test_static_files_revalidate_with_304(client):
+    first = client.get("/static/test.js", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["ETag"]
+    again = client.get("/static/test.js", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+
+
+def test_static_encoding_negotiation(app_module, client):
+    body = static_bytes(app_module, "test.js")
+    plain = client.get("/static/test.js", headers={"Accept-Encoding": "identity"})
+    assert plain.content_encoding is None and plain.data == body
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    zipped = client.get("/static/test.js", headers={"Accept-Encoding": "gzip"})
+    assert zipped.content_encoding == "gzip" and gzip.decompress(zipped.data) == body
+    refused = client.get("/static/test.js", headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert refused.content_encoding == "gzip"
+    # Each encoding has its own ETag.
+    assert plain.headers["ETag"] != zipped.headers["ETag"]
+
+    preferred = client.get("/static/test.js", headers={"Accept-Encoding": "gzip, br"})
+    if brotli is None:
+        assert preferred.content_encoding == "gzip"
+    else:
+        assert preferred.content_encoding == "br" and brotli.decompress(preferred.data) == body
+
+
+def test_static_range_requests(app_module, client):
+    body = static_bytes(app_module, "test.js")
+    response = client.get("/static/test.js", headers={"Accept-Encoding": "identity", "Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.data == body[10:20]
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(body)}"
+
+
+def upload(app_module, name, data):
+    with open(os.path.join(app_module.UPLOAD_FOLDER, name), "wb") as f:
+        f.write(data)
+
+
+def test_app_named_uploads_are_immutable(app_module, uploads_client):
+    name = f"{uuid4().hex}.png"
+    upload(app_module, name, b"0123456789" * 100)
+    response = uploads_client.get(f"/uploads/{name}")
+    assert response.headers["ETag"] == f'"{name}"'
+    assert response.cache_control.immutable and response.cache_control.max_age == app_module.IMMUTABLE_MAX_AGE
+
+    again = uploads_client.get(f"/uploads/{name}", headers={"If-None-Match": f'"{name}"'})
+    assert again.status_code == 304
+    part = uploads_client.get(f"/uploads/{name}", headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206 and part.data == b"0123456789"
+
+
+def test_other_uploads_revalidate(app_module, uploads_client):
+    upload(app_module, "photo.png", b"not app named")
+    response = uploads_client.get("/uploads/photo.png")
+    assert not response.cache_control.immutable
+    again = uploads_client.get("/uploads/photo.png", headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
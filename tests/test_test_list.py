@@ -0,0 +1,56 @@
+import pytest
+
+
+def question(text, image=""):
+    return {"question": text, "options": ["a", "b"], "correct_index": 0, "explanation": "", "image": image}
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def put(app_module, test):
+    with app_module.DATA_STORE.lock():
+        app_module.DATA_STORE.put(test)
+
+
+def listed(client, test_id):
+    return next(t for t in client.get("/api/tests").get_json()["tests"] if t["id"] == test_id)
+
+
+def test_list_answers_if_none_match_with_304(app_module, client):
+    put(app_module, {"id": "etag-a", "title": "A", "questions": [question("1")]})
+    first = client.get("/api/tests")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get("/api/tests", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    # Any write changes the list, and with it the ETag.
+    put(app_module, {"id": "etag-a", "title": "A renamed", "questions": [question("1")]})
+    changed = client.get("/api/tests", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_summaries_carry_write_time_metadata(app_module, client):
+    put(app_module, {"id": "meta-a", "title": "Meta", "questions": [question("1"), question("2", "x.png")]})
+    summary = listed(client, "meta-a")
+    assert summary["title"] == "Meta"
+    assert summary["question_count"] == 2
+    assert summary["has_images"] is True
+    assert "questions" not in summary and "images" not in summary
+
+    # Saving identical content keeps updated_at; changing it moves the hash.
+    put(app_module, {"id": "meta-a", "title": "Meta", "questions": [question("1"), question("2", "x.png")]})
+    same = listed(client, "meta-a")
+    assert same["updated_at"] == summary["updated_at"]
+    assert same["content_hash"] == summary["content_hash"]
+    put(app_module, {"id": "meta-a", "title": "Meta", "questions": [question("1")]})
+    edited = listed(client, "meta-a")
+    assert edited["content_hash"] != summary["content_hash"]
+    assert edited["question_count"] == 1 and edited["has_images"] is False
@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Production entry point. `python wsgi.py` starts the server chosen by SERVER:
+#   gunicorn  - multi-process, configured by gunicorn.conf.py (Linux/macOS, default)
+#   waitress  - single process, WAITRESS_THREADS threads (works on Windows)
+#   asgi      - uvicorn running asgi.py, WEB_CONCURRENCY processes
+#   dev       - Flask's development server, as `python app.py`
+# WSGI servers can also load `wsgi:app` directly. Run from the project directory;
+# the data folder is relative to it. The app is only imported where it is served
+# from this process: gunicorn and uvicorn load it in their own workers.
+SERVER = os.getenv("SERVER", "gunicorn" if os.name == "posix" else "waitress").strip().lower()
+PORT = int(os.getenv("PORT", "5000"))
+
+
+def main():
+    if SERVER == "gunicorn":
+        # exec so gunicorn's master receives signals (SIGHUP, SIGTERM) directly.
+        os.execvp("gunicorn", ["gunicorn", "--config", "gunicorn.conf.py", "wsgi:app"])
+    elif SERVER == "waitress":
+        from waitress import serve
+        from app import create_app
+        serve(create_app(), host="0.0.0.0", port=PORT, threads=int(os.getenv("WAITRESS_THREADS", "16")))
+    elif SERVER == "asgi":
+        os.execvp("uvicorn", [
+            "uvicorn", "asgi:application",
+            "--host", "0.0.0.0",
+            "--port", str(PORT),
+            "--workers", os.getenv("WEB_CONCURRENCY", "1")
+        ])
+    elif SERVER == "dev":
+        from app import create_app
+        create_app().run(host="0.0.0.0", port=PORT)
+    else:
+        sys.exit(f"Unknown SERVER {SERVER!r}; use gunicorn, waitress, asgi or dev.")
+
+
+if __name__ == "__main__":
+    main()
+else:
+    from app import create_app
+    app = create_app()